@@ -1,4 +1,20 @@
+import sys
+
+
+def intern_value(value):
+    """
+    Interne les chaînes : les artistes, albums, genres et styles se répètent des milliers
+    de fois dans une bibliothèque, une seule copie de chaque valeur est alors gardée.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 class IqueMusicTag:
+    __slots__ = ('artiste', 'titre', 'artiste_display', 'artiste_remix', 'artiste_ft', 'artiste_all', 'annee',
+                 'style', 'genre', 'disk', 'track', 'album', 'artiste_album', 'images_path')
+
     def __init__(
         self,
         artiste=None,
@@ -34,19 +50,19 @@ class IqueMusicTag:
         :param artiste_album: Artiste de l'album.
         :param images_path: Liste des chemins d'images associées.
         """
-        self.artiste = artiste
+        self.artiste = intern_value(artiste)
         self.titre = titre
-        self.artiste_display = artiste_display
-        self.artiste_remix = artiste_remix
-        self.artiste_ft = artiste_ft
-        self.artiste_all = artiste_all
-        self.annee = annee
-        self.style = style
-        self.genre = genre
+        self.artiste_display = intern_value(artiste_display)
+        self.artiste_remix = intern_value(artiste_remix)
+        self.artiste_ft = intern_value(artiste_ft)
+        self.artiste_all = intern_value(artiste_all)
+        self.annee = intern_value(annee)
+        self.style = intern_value(style)
+        self.genre = intern_value(genre)
         self.disk = disk
         self.track = track
-        self.album = album
-        self.artiste_album = artiste_album
+        self.album = intern_value(album)
+        self.artiste_album = intern_value(artiste_album)
         self.images_path = images_path
 
     def get(self, key):
@@ -0,0 +1,132 @@
+"""
+Recherche groupée par album (case "Par album" de la recherche de toute la liste).
+
+Les pistes d'un même album (mêmes tags Album et ArtisteAlbum) sont recherchées ensemble :
+l'album est cherché une seule fois sur chaque source (metadata_providers.query_album), puis
+chaque fichier est associé localement à une piste de l'album, numéros de disque et de piste
+compris. Pour un album de 12 pistes : une recherche par source au lieu de 12.
+
+Les pistes d'un dossier sans tag Album forment aussi un groupe : la première est recherchée
+seule, puis les autres fichiers sont associés, sans requête, aux pistes des sorties où elle a
+été trouvée (gardées par le cache des sorties, voir release_cache). Les fichiers absents de
+l'album trouvé sont recherchés piste par piste.
+"""
+import difflib
+import re
+from collections import Counter
+
+from metadata_providers import PROVIDERS, query_album, query_providers
+from release_cache import get_release_cache
+from search_index import normalize_text
+
+# Une piste seule n'est pas un groupe : elle est recherchée comme d'habitude
+GROUP_MIN_TRACKS = 2
+
+# Ressemblance minimale entre le titre d'un fichier et celui d'une piste de l'album
+TITLE_CUTOFF = 0.6
+
+
+def parse_number(value):
+    """
+    Numéro de disque ou de piste d'un tag ("3", "3/12", 3) -> 3 ; None s'il n'y en a pas.
+    """
+    if value is None:
+        return None
+    match = re.match(r'\s*(\d+)', str(value))
+    return int(match.group(1)) if match else None
+
+
+def group_pistes(pistes):
+    """
+    Regroupe les pistes par album, ou par dossier pour celles sans tag Album. À appeler
+    sur le fil de l'interface (lit les pistes).
+
+    Returns:
+        tuple: (jobs, groups). jobs : tuples (piste, artiste, titre) des pistes seules ;
+            groups : tuples (artiste de l'album, album, liste de (piste, artiste, titre,
+            disque, piste)), album vide pour un groupe de dossier.
+    """
+    grouped = {}
+    for piste in pistes:
+        artiste, titre = piste.get_search_terms()
+        if piste.Album:
+            key = ('album', normalize_text(piste.ArtisteAlbum), normalize_text(piste.Album))
+        else:
+            key = ('dossier', piste.get_folder())
+        grouped.setdefault(key, []).append((piste, artiste, titre, parse_number(piste.Disk), parse_number(piste.Track)))
+
+    jobs = []
+    groups = []
+    for tracks in grouped.values():
+        if len(tracks) < GROUP_MIN_TRACKS:
+            jobs.extend(track[:3] for track in tracks)
+            continue
+        first = tracks[0][0]
+        # Sans artiste de l'album, celui qui revient le plus souvent
+        artiste_album = first.ArtisteAlbum or Counter(track[1] for track in tracks).most_common(1)[0][0]
+        groups.append((artiste_album, first.Album or '', tracks))
+    return jobs, groups
+
+
+def match_entry(tags, titre, disk, track):
+    """
+    Retourne la piste de l'album (IqueMusicTag) qui correspond au fichier, ou None.
+    Parmi les titres ressemblants, celle qui a les mêmes numéros de disque et de piste
+    que le fichier est préférée (un même titre peut être sur deux disques).
+    """
+    titles = [normalize_text(tag.get('titre')) for tag in tags]
+    matches = difflib.get_close_matches(normalize_text(titre), titles, n=3, cutoff=TITLE_CUTOFF)
+    # Toutes les pistes de chaque titre trouvé, du plus au moins ressemblant
+    candidates = [tag for title in dict.fromkeys(matches) for tag, tag_title in zip(tags, titles) if tag_title == title]
+    for tag in candidates:
+        if (track is not None and parse_number(tag.get('track')) == track
+                and (disk is None or tag.get('disk') is None or parse_number(tag.get('disk')) == disk)):
+            return tag
+    return candidates[0] if candidates else None
+
+
+def folder_tracklists(artiste, titre):
+    """
+    Pistes des sorties où la première piste d'un groupe de dossier vient d'être trouvée,
+    source par source (les sorties restent dans le cache des sorties : aucune requête).
+
+    Returns:
+        dict: {nom de la source: liste d'IqueMusicTag de la sortie}, dans l'ordre de PROVIDERS.
+    """
+    cache = get_release_cache()
+    tracklists = {}
+    for name in PROVIDERS:
+        # Les sorties sont rangées sous le nom de la source en minuscules ('discogs', 'itunes', 'deezer')
+        found = cache.find_release(name.lower(), artiste, titre)
+        if found is not None:
+            tracklists[name] = found[0]
+    return tracklists
+
+
+def lookup_group(artiste_album, album, tracks):
+    """
+    Recherche un groupe de pistes (voir group_pistes), sur un fil de recherche.
+
+    Returns:
+        tuple: (matched, unmatched). matched : tuples (piste, liste d'IqueMusicTag trouvés,
+            source par source) ; unmatched : tuples (piste, artiste, titre) à rechercher
+            piste par piste.
+    """
+    matched = []
+    if album:
+        tracklists = query_album(artiste_album, album)
+    else:
+        piste, artiste, titre = tracks[0][:3]
+        matched.append((piste, query_providers(artiste, titre)))
+        tracks = tracks[1:]
+        tracklists = folder_tracklists(artiste, titre)
+
+    unmatched = []
+    for piste, artiste, titre, disk, track in tracks:
+        tracks_info = [tag for tag in (match_entry(tags, titre, disk, track) for tags in tracklists.values())
+                       if tag is not None]
+        if tracks_info:
+            matched.append((piste, tracks_info))
+        else:
+            unmatched.append((piste, artiste, titre))
+    return matched, unmatched
@@ -1,7 +1,9 @@
-import requests
+from http_session import http_get
 import re
 from datetime import datetime
 from IqueMusicTag import IqueMusicTag
+from provider_cache import cached_lookup
+from release_cache import get_release_cache
 
 
 def map_apple_to_discogs_genre(apple_genre):
@@ -105,7 +107,7 @@ def get_apple_music_artworks(artist, album, num_results=1):
 
     try:
         # Effectuer la requête à l'API
-        response = requests.get(base_url, params=params)
+        response = http_get(base_url, params=params)
         response.raise_for_status()  # Vérifier si la requête a réussi
 
         # Analyser la réponse JSON
@@ -152,7 +154,7 @@ def get_song_artworks(artist, track, num_results=1):
 
     try:
         # Effectuer la requête à l'API
-        response = requests.get(base_url, params=params)
+        response = http_get(base_url, params=params)
         response.raise_for_status()  # Vérifier si la requête a réussi
 
         # Analyser la réponse JSON
@@ -176,6 +178,99 @@ def get_song_artworks(artist, track, num_results=1):
         print(f"Erreur : {e}")
         return []
 
+def make_itunes_tag(track_info):
+    """
+    Construit l'IqueMusicTag d'une piste décrite par l'API iTunes (recherche ou album).
+    """
+    track_name = track_info.get("trackName", "")
+    # Extraction des crédits supplémentaires
+    contributors = []
+
+    if "feat." in track_name:
+        track_name, featuring = extract_feat_artists_and_title(track_name)
+        #featuring = track_name.split("feat.")[1].split(")")[0].strip().title()
+    else:
+        featuring = ""
+    if "remix" in track_name:
+        remixer = track_name.split("remix")[0].strip()
+    else:
+        remixer = ""
+
+    main_artist = extract_all_artists(track_info.get("artistName", ""))
+    contributors.extend(main_artist)
+    if "collectionArtistName" in track_info:
+        contributors.append(track_info.get("collectionArtistName", ""))
+    # Ajouter les featuring et remixeurs aux contributeurs
+    contributors.extend(featuring)
+    contributors.extend(remixer)
+
+    # Enlever les doublons
+    contributors = list(set(filter(None, contributors)))
+
+    release_date = track_info.get("releaseDate")
+    annee = datetime.strptime(release_date, "%Y-%m-%dT%H:%M:%SZ").year if release_date else None
+
+    tag = IqueMusicTag(
+        artiste=track_info.get("artistName", ""),
+        titre=track_name,
+        artiste_display=track_info.get("artistName", ""),
+        artiste_remix=';'.join(remixer),
+        artiste_ft=';'.join(featuring),
+        artiste_all=';'.join(contributors),
+        annee=annee,
+        style=track_info.get("primaryGenreName"),
+        genre=map_apple_to_discogs_genre(track_info.get("primaryGenreName")),
+        disk=track_info.get("discNumber"),
+        track=track_info.get("trackNumber"),
+        album=track_info.get("collectionName"),
+        artiste_album=None,
+        images_path=track_info.get("artworkUrl100").replace("100x100", "3000x3000") if track_info.get(
+            "artworkUrl100") else None
+    )
+    return tag
+
+
+def get_itunes_album_tracks(collection_id):
+    """
+    Retourne l'IqueMusicTag de chacune des pistes d'un album iTunes.
+    """
+    response = http_get("https://itunes.apple.com/lookup", params={"id": collection_id, "entity": "song"})
+    response.raise_for_status()
+    # Le premier résultat est l'album lui-même
+    return [make_itunes_tag(track_info) for track_info in response.json()["results"]
+            if track_info.get("wrapperType") == "track"]
+
+
+@cached_lookup('itunes_album')
+def get_itunes_album_details(artist, album):
+    """
+    Cherche un album via l'API iTunes et retourne l'IqueMusicTag de chacune de ses pistes
+    (liste vide si l'album n'est pas trouvé).
+
+    Arguments :
+    - artist (str) : Artiste de l'album.
+    - album (str) : Titre de l'album.
+    """
+    params = {
+        "term": f"{artist} {album}",
+        "media": "music",
+        "entity": "album",
+        "limit": 1
+    }
+    response = http_get("https://itunes.apple.com/search", params=params)
+    response.raise_for_status()
+
+    data = response.json()
+    if data["resultCount"] == 0:
+        return []
+    collection_id = data["results"][0]["collectionId"]
+    cache = get_release_cache()
+    tags = cache.get_release('itunes', collection_id, lambda: get_itunes_album_tracks(collection_id))
+    cache.mark_matched('itunes', collection_id)
+    return tags
+
+
+@cached_lookup('itunes')
 def get_itunes_track_details(artist, track, num_results=1):
     """
     Récupère des informations détaillées sur une ou plusieurs pistes musicales via l'API iTunes.
@@ -188,6 +283,11 @@ def get_itunes_track_details(artist, track, num_results=1):
     Retourne :
     - Une liste contenant les détails des pistes.
     """
+    # Piste d'un album déjà chargé pendant la session : aucune requête
+    tags = get_release_cache().find_track('itunes', artist, track, num_results)
+    if tags:
+        return tags
+
     base_url = "https://itunes.apple.com/search"
     params = {
         "term": f"{artist} {track}",
@@ -196,71 +296,29 @@ def get_itunes_track_details(artist, track, num_results=1):
         "limit": num_results
     }
 
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
+    response = http_get(base_url, params=params)
+    response.raise_for_status()
 
-        data = response.json()
-        if data["resultCount"] == 0:
-            print("Aucun morceau trouvé.")
-            return []
-
-        # Extraire les détails pour chaque piste
-        tags = []
-        for track_info in data["results"]:
-            track_name = track_info.get("trackName", "")
-            # Extraction des crédits supplémentaires
-            contributors = []
-
-            if "feat." in track_name:
-                track_name, featuring = extract_feat_artists_and_title(track_name)
-                #featuring = track_name.split("feat.")[1].split(")")[0].strip().title()
-            else:
-                featuring = ""
-            if "remix" in track_name:
-                remixer = track_name.split("remix")[0].strip()
-            else:
-                remixer = ""
-
-            main_artist = extract_all_artists(track_info.get("artistName", ""))
-            contributors.extend(main_artist)
-            if "collectionArtistName" in track_info:
-                contributors.append(track_info.get("collectionArtistName", ""))
-            # Ajouter les featuring et remixeurs aux contributeurs
-            contributors.extend(featuring)
-            contributors.extend(remixer)
-
-            # Enlever les doublons
-            contributors = list(set(filter(None, contributors)))
-
-            release_date = track_info.get("releaseDate")
-            annee = datetime.strptime(release_date, "%Y-%m-%dT%H:%M:%SZ").year if release_date else None
-
-            tag = IqueMusicTag(
-                artiste=track_info.get("artistName", ""),
-                titre=track_name,
-                artiste_display=track_info.get("artistName", ""),
-                artiste_remix=';'.join(remixer),
-                artiste_ft=';'.join(featuring),
-                artiste_all=';'.join(contributors),
-                annee=annee,
-                style=track_info.get("primaryGenreName"),
-                genre=map_apple_to_discogs_genre(track_info.get("primaryGenreName")),
-                disk=track_info.get("discNumber"),
-                track=track_info.get("trackNumber"),
-                album=track_info.get("collectionName"),
-                artiste_album=None,
-                images_path=track_info.get("artworkUrl100").replace("100x100", "3000x3000") if track_info.get(
-                    "artworkUrl100") else None
-            )
-
-            tags.append(tag)
-
-        return tags
-
-    except Exception as e:
+    data = response.json()
+    if data["resultCount"] == 0:
+        print("Aucun morceau trouvé.")
         return []
 
+    # Extraire les détails pour chaque piste
+    tags = [make_itunes_tag(track_info) for track_info in data["results"]]
+
+    # L'album du premier résultat est chargé : les autres pistes de l'album y seront trouvées sans requête
+    first = data["results"][0]
+    if first.get("collectionId") and first.get("trackCount", 0) > 1:
+        try:
+            get_release_cache().get_release('itunes', first["collectionId"],
+                                            lambda: get_itunes_album_tracks(first["collectionId"]))
+            # Le premier résultat est une piste de cet album
+            get_release_cache().mark_matched('itunes', first["collectionId"])
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'album {first.get('collectionName')} : {e}")
+
+    return tags
 # Exemple d'utilisation
 if __name__ == '__main__':
     artist_name = "Mollono.Bass Kuoko"
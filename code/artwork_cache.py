@@ -0,0 +1,186 @@
+"""
+Cache LRU des images décodées (pochettes en taille réelle et vignettes), borné en mémoire.
+
+Les pistes ne gardent que les octets de leur image (ou sa position dans le fichier) :
+les QPixmap ne sont créés qu'à l'affichage et vivent dans ce cache, dont le budget se
+règle par la variable d'environnement ARTWORK_CACHE_MB (fichier .env).
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QImageReader, QPixmap
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTWORK_CACHE_MB = int(os.getenv("ARTWORK_CACHE_MB", "128"))
+
+# Dimensions d'images gardées sans l'image décodée (voir get_image_size)
+IMAGE_SIZES = 4096
+
+
+def pixmap_cost(pixmap):
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+def create_image_reader(image_data):
+    """
+    Retourne un QImageReader sur les octets de l'image, et le QBuffer qu'il lit (à garder
+    en vie tant que le lecteur sert).
+    """
+    buffer = QBuffer()
+    buffer.setData(QByteArray(bytes(image_data)))
+    buffer.open(QIODevice.ReadOnly)
+    return QImageReader(buffer), buffer
+
+
+class ArtworkCache:
+    def __init__(self, budget_mb=ARTWORK_CACHE_MB):
+        """
+        :param budget_mb: Mémoire maximale occupée par les images décodées, en Mo.
+        """
+        self.budget = budget_mb * 1024 * 1024
+        self.pixmaps = OrderedDict()
+        self.sizes = OrderedDict()  # empreinte -> (largeur, hauteur), la plus récente en dernier
+        self.used = 0
+
+    def set_budget_mb(self, budget_mb):
+        self.budget = budget_mb * 1024 * 1024
+        self.evict()
+
+    def clear(self):
+        self.pixmaps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def evict(self):
+        while self.used > self.budget and self.pixmaps:
+            (artwork_hash, _), pixmap = self.pixmaps.popitem(last=False)
+            self.used = self.used - pixmap_cost(pixmap)
+            # Les dimensions partent avec l'image (relues sans décodage si besoin)
+            self.sizes.pop(artwork_hash, None)
+
+    def put_size(self, artwork_hash, size):
+        self.sizes[artwork_hash] = (size.width(), size.height())
+        self.sizes.move_to_end(artwork_hash)
+        while len(self.sizes) > IMAGE_SIZES:
+            self.sizes.popitem(last=False)
+
+    def put(self, key, pixmap):
+        if key in self.pixmaps:
+            self.used = self.used - pixmap_cost(self.pixmaps.pop(key))
+        self.pixmaps[key] = pixmap
+        self.used = self.used + pixmap_cost(pixmap)
+        self.evict()
+
+    def get_pixmap(self, artwork_hash, load_image_data):
+        """
+        Retourne l'image en taille réelle.
+
+        Args:
+            artwork_hash (str): Empreinte de l'image, clé du cache.
+            load_image_data (callable): Retourne les octets de l'image ; appelé seulement si
+                l'image n'est pas en cache.
+        """
+        key = (artwork_hash, None)
+        if key in self.pixmaps:
+            self.pixmaps.move_to_end(key)
+            return self.pixmaps[key]
+
+        image_data = load_image_data()
+        if not image_data:
+            return None
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(bytes(image_data)):
+            return None
+        self.put(key, pixmap)
+        return pixmap
+
+    def get_thumbnail(self, artwork_hash, load_image_data, size):
+        """
+        Retourne une vignette d'au plus size x size, décodée directement à cette taille.
+        """
+        key = (artwork_hash, size)
+        if key in self.pixmaps:
+            self.pixmaps.move_to_end(key)
+            return self.pixmaps[key]
+
+        image_data = load_image_data()
+        if not image_data:
+            return None
+        reader, buffer = create_image_reader(image_data)
+        original_size = reader.size()
+        if original_size.isValid():
+            self.put_size(artwork_hash, original_size)
+            reader.setScaledSize(original_size.scaled(size, size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return None
+        pixmap = QPixmap.fromImage(image)
+        self.put(key, pixmap)
+        return pixmap
+
+    def get_image_size(self, artwork_hash, load_image_data):
+        """
+        Retourne les dimensions (largeur, hauteur) de l'image sans la décoder.
+        """
+        if artwork_hash not in self.sizes:
+            image_data = load_image_data()
+            if not image_data:
+                return None
+            reader, buffer = create_image_reader(image_data)
+            original_size = reader.size()
+            if not original_size.isValid():
+                return None
+            self.put_size(artwork_hash, original_size)
+        else:
+            self.sizes.move_to_end(artwork_hash)
+        return self.sizes[artwork_hash]
+
+
+artwork_cache = ArtworkCache()
+
+
+def pixmap_content_hash(pixmap):
+    """
+    Empreinte des pixels d'une image : deux QPixmap identiques ont la même, même s'ils
+    viennent de deux copies différentes.
+    """
+    image = pixmap.toImage()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return hashlib.sha1(bits.asstring()).hexdigest() + f"-{image.width()}x{image.height()}-{image.format()}"
+
+
+class ArtworkEncoder:
+    def __init__(self, image_format='JPEG'):
+        """
+        Encode les images qui n'ont pas d'octets d'origine (QPixmap seul, par exemple collé
+        depuis le presse-papier) pour les écrire dans les tags. À utiliser le temps d'une
+        sauvegarde : une même image (même contenu) n'est encodée qu'une fois, même partagée
+        par toutes les pistes d'un album.
+        """
+        self.image_format = image_format
+        self.mime = 'image/' + image_format.lower()
+        self.keys = {}      # QPixmap.cacheKey() -> empreinte du contenu
+        self.encoded = {}   # empreinte du contenu -> octets encodés
+        self.encodings = 0
+
+    def encode(self, pixmap):
+        """
+        Retourne (octets, type MIME) de l'image.
+        """
+        key = self.keys.get(pixmap.cacheKey())
+        if key is None:
+            key = pixmap_content_hash(pixmap)
+            self.keys[pixmap.cacheKey()] = key
+        if key not in self.encoded:
+            buffer = QBuffer()
+            buffer.open(QIODevice.ReadWrite)
+            pixmap.save(buffer, self.image_format)
+            self.encoded[key] = buffer.data().data()
+            self.encodings = self.encodings + 1
+        return self.encoded[key], self.mime
@@ -0,0 +1,157 @@
+"""
+Normalisation des pochettes avant de les écrire dans les tags : dimensions et poids
+plafonnés, format JPEG ou PNG.
+
+Les images venant d'internet peuvent être énormes (iTunes en 3000x3000, Apple Music en
+10000x10000) : écrites telles quelles dans chaque MP3, elles alourdissent les fichiers et
+ralentissent toutes les lectures et écritures suivantes.
+
+Une image déjà dans les limites est gardée telle quelle (mêmes octets). Les réglages se
+font par variables d'environnement (fichier .env) :
+    ARTWORK_MAX_SIZE       plus grande dimension, en pixels
+    ARTWORK_MAX_KB         poids maximal, en Kio
+    ARTWORK_FORMAT         JPEG, PNG, ou auto (PNG seulement pour une image transparente)
+    ARTWORK_JPEG_QUALITY   qualité JPEG de départ
+
+La normalisation utilise QImage (pas QPixmap) : elle peut tourner sur les fils d'écriture.
+"""
+import os
+import threading
+from concurrent.futures import Future
+
+from PyQt5.QtCore import Qt, QBuffer, QIODevice
+from PyQt5.QtGui import QImage
+
+from dotenv import load_dotenv
+
+from artwork_cache import create_image_reader
+from tag_reader import guess_image_mime, image_hash
+
+load_dotenv()
+
+ARTWORK_MAX_SIZE = int(os.getenv("ARTWORK_MAX_SIZE", "1400"))
+ARTWORK_MAX_KB = int(os.getenv("ARTWORK_MAX_KB", "500"))
+ARTWORK_FORMAT = os.getenv("ARTWORK_FORMAT", "auto").upper()
+ARTWORK_JPEG_QUALITY = int(os.getenv("ARTWORK_JPEG_QUALITY", "90"))
+
+# En dessous, on ne réduit plus la qualité JPEG ni les dimensions pour tenir dans le poids maximal
+MIN_JPEG_QUALITY = 60
+MIN_SIZE = 300
+
+
+def encode_image(image, image_format, quality=-1):
+    buffer = QBuffer()
+    buffer.open(QIODevice.ReadWrite)
+    image.save(buffer, image_format, quality)
+    return buffer.data().data()
+
+
+def normalize_artwork(image_data, image_mime=None, max_size=ARTWORK_MAX_SIZE, max_bytes=ARTWORK_MAX_KB * 1024,
+                      image_format=ARTWORK_FORMAT, quality=ARTWORK_JPEG_QUALITY):
+    """
+    Ramène une image dans les limites de dimensions, de poids et de format.
+
+    Args:
+        image_data (bytes): Octets de l'image.
+        image_mime (str): Type MIME connu, sinon deviné d'après les octets.
+
+    Returns:
+        tuple: (octets, type MIME). Les octets d'origine si l'image est déjà conforme ou
+            ne peut pas être décodée.
+    """
+    image_mime = image_mime or guess_image_mime(image_data)
+    reader, buffer = create_image_reader(image_data)
+    size = reader.size()
+    if not size.isValid():
+        return image_data, image_mime
+
+    wanted_mime = None if image_format == 'AUTO' else 'image/' + image_format.lower()
+    format_ok = image_mime in ('image/jpeg', 'image/png') and wanted_mime in (None, image_mime)
+    size_ok = size.width() <= max_size and size.height() <= max_size
+    if format_ok and size_ok and len(image_data) <= max_bytes:
+        return image_data, image_mime
+
+    # Décodage directement à la taille cible (rapide pour un JPEG)
+    if not size_ok:
+        reader.setScaledSize(size.scaled(max_size, max_size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image_data, image_mime
+
+    if wanted_mime is None:
+        wanted_mime = 'image/png' if image.hasAlphaChannel() else 'image/jpeg'
+
+    if wanted_mime == 'image/png':
+        data = encode_image(image, 'PNG')
+    else:
+        if image.hasAlphaChannel():
+            image = image.convertToFormat(QImage.Format_RGB32)
+        data = encode_image(image, 'JPEG', quality)
+        # Trop lourd : qualité réduite, puis dimensions réduites
+        while len(data) > max_bytes and quality > MIN_JPEG_QUALITY:
+            quality = quality - 10
+            data = encode_image(image, 'JPEG', quality)
+        while len(data) > max_bytes and max(image.width(), image.height()) * 0.8 >= MIN_SIZE:
+            image = image.scaled(int(image.width() * 0.8), int(image.height() * 0.8),
+                                 Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            data = encode_image(image, 'JPEG', quality)
+
+    # Une image conforme en tout sauf le poids n'est remplacée que si on a gagné de la place
+    if format_ok and size_ok and len(data) >= len(image_data):
+        return image_data, image_mime
+    return data, wanted_mime
+
+
+class ArtworkNormalizer:
+    def __init__(self, **settings):
+        """
+        Normalise les pochettes d'une sauvegarde, depuis plusieurs fils : une même image
+        (même contenu) n'est normalisée qu'une fois, même partagée par tout un album.
+
+        :param settings: Réglages passés à normalize_artwork (max_size, max_bytes, ...).
+        """
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.results = {}       # empreinte des octets d'origine -> Future (octets, type MIME), octets None si inchangée
+        self.count = 0          # images traitées
+        self.changed = 0        # images remplacées
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def normalize(self, image_data, image_mime=None):
+        """
+        Retourne (octets, type MIME) de l'image normalisée ; les octets d'origine (le même
+        objet) si l'image est déjà conforme.
+        """
+        key = image_hash(image_data)
+        with self.lock:
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = self.results[key] = Future()
+        if owner:
+            try:
+                data, mime = normalize_artwork(image_data, image_mime, **self.settings)
+                future.set_result((None if data is image_data else data, mime))
+            except Exception as e:
+                future.set_exception(e)
+        data, mime = future.result()
+        with self.lock:
+            self.count = self.count + 1
+            self.bytes_before = self.bytes_before + len(image_data)
+            if data is None:
+                self.bytes_after = self.bytes_after + len(image_data)
+            else:
+                self.bytes_after = self.bytes_after + len(data)
+                self.changed = self.changed + 1
+        if data is None:
+            # Image déjà conforme : les octets d'origine, tels quels
+            return image_data, mime
+        return data, mime
+
+    def summary(self):
+        with self.lock:
+            saved = self.bytes_before - self.bytes_after
+            return (f"{self.count} image(s) vérifiée(s), {self.changed} normalisée(s) : "
+                    f"{self.bytes_before / 1024:.0f} Kio -> {self.bytes_after / 1024:.0f} Kio "
+                    f"({saved / 1024:.0f} Kio gagnés)")
@@ -1,15 +1,15 @@
-import requests
 from bs4 import BeautifulSoup
 import time
 import logging
 import random
 
+from http_session import BROWSER_USER_AGENT, http_get
+
 def search_beatport_track(title):
     search_url = f'https://www.beatport.com/search?q={title.replace(" ", "+")}'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    headers = {'User-Agent': BROWSER_USER_AGENT}
 
-    response = requests.get(search_url, headers=headers)
+    response = http_get(search_url, headers=headers)
 
     if response.status_code == 200:
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -29,12 +29,11 @@ def search_beatport_track(title):
 
 def search_beatport_track2(title, delay=2, max_retries=3):
     search_url = f'https://www.beatport.com/search?q={title.replace(" ", "+")}'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    headers = {'User-Agent': BROWSER_USER_AGENT}
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(search_url, headers=headers)
+            response = http_get(search_url, headers=headers)
             time.sleep(delay + random.uniform(0, 2))
 
             if response.status_code == 200:
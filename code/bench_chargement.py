@@ -0,0 +1,62 @@
+"""
+Compare le chargement des tags d'un dossier : boucle série (comportement historique de
+clickMethodParcourir) contre le pool de processus, pour 1 à N coeurs.
+
+Usage : python bench_chargement.py <dossier> [nb_max_processus]
+"""
+import os
+import sys
+import time
+
+from parallel_loading import iter_tag_records_parallel
+from tag_reader import get_file_type, read_tag_records
+
+
+def list_audio_files(path):
+    files = []
+    for file_name in os.listdir(path):
+        file_type = get_file_type(file_name)
+        if file_type is not None:
+            files.append((file_name, path, file_type))
+    return files
+
+
+def bench_serial(files):
+    start = time.perf_counter()
+    records = read_tag_records(files)
+    return time.perf_counter() - start, len(records)
+
+
+def bench_parallel(files, max_workers):
+    start = time.perf_counter()
+    count = 0
+    first_batch = None
+    for records in iter_tag_records_parallel(files, max_workers=max_workers):
+        if first_batch is None:
+            first_batch = time.perf_counter() - start
+        count = count + len(records)
+    return time.perf_counter() - start, first_batch, count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    files = list_audio_files(sys.argv[1])
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    print(f"{len(files)} fichiers audio")
+    if not files:
+        sys.exit(0)
+
+    serial_time, count = bench_serial(files)
+    print(f"Série          : {serial_time:8.2f} s ({count / serial_time:8.1f} fichiers/s)")
+
+    workers = 1
+    while True:
+        parallel_time, first_batch, count = bench_parallel(files, workers)
+        print(f"{workers:3d} processus   : {parallel_time:8.2f} s ({count / parallel_time:8.1f} fichiers/s, "
+              f"x{serial_time / parallel_time:.2f}, 1er paquet à {first_batch:.2f} s)")
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
@@ -0,0 +1,112 @@
+"""
+Mesure la mémoire occupée par piste sur une bibliothèque synthétique : ancienne
+représentation (attributs dans un __dict__, chaînes non partagées) contre MusiqueFile et
+IqueMusicTag actuels (__slots__, chaînes répétées internées).
+
+Usage : python bench_memoire.py [nb_pistes]
+"""
+import sys
+import tracemalloc
+
+from IqueMusicTag import IqueMusicTag
+from singleRT import Mp3File
+from tag_reader import TAG_FIELDS
+
+
+class LegacyMusiqueFile:
+    """Piste telle que représentée avant __slots__ : un __dict__ par instance."""
+    def __init__(self, old_file_name, path):
+        self.audio_file = None
+        self.metadata = None
+        self.old_file_name = old_file_name
+        self.old_file_name_with_path = path + r'\\' + old_file_name
+        self.file_type = 'mp3'
+        for field in TAG_FIELDS:
+            setattr(self, field, None)
+        self.Image = None
+        self.tracks_info = []
+
+
+class LegacyIqueMusicTag:
+    """Résultat de recherche tel que représenté avant __slots__."""
+    def __init__(self, **kwargs):
+        for key in IqueMusicTag.__slots__:
+            setattr(self, key, kwargs.get(key))
+
+
+def synthetic_record(i):
+    # Chaînes recréées à chaque piste, comme après lecture des tags d'un fichier
+    artist = 'Artiste numéro %d' % (i % 2000)
+    album = 'Album %d de %s' % (i % 8000, artist)
+    return {
+        'Titre': 'Titre du morceau %d' % i,
+        'Artiste': artist,
+        'ArtisteDisplay': 'Artiste numéro %d' % (i % 2000),
+        'ArtisteRemix': '',
+        'ArtisteFt': 'Invité %d' % (i % 300) if i % 5 == 0 else '',
+        'ArtisteAll': 'Artiste numéro %d' % (i % 2000),
+        'Annee': str(1970 + i % 55),
+        'Style': 'Style %d' % (i % 150),
+        'Genre': ['Electronic', 'Rock', 'Pop', 'Hip Hop', 'Jazz'][i % 5],
+        'Disk': str(1 + i % 2),
+        'Track': str(1 + i % 14),
+        'Album': album,
+        'ArtisteAlbum': 'Artiste numéro %d' % (i % 2000),
+        'image_data': None,
+        'image_offset': 4096,
+        'image_length': 250000,
+        'artwork_hash': '%040x' % (i % 8000),
+    }
+
+
+def build_legacy(count):
+    pistes = []
+    for i in range(count):
+        piste = LegacyMusiqueFile('fichier %d.mp3' % i, r'C:\Musique')
+        for field, value in synthetic_record(i).items():
+            setattr(piste, field, value)
+        pistes.append(piste)
+    return pistes
+
+
+def build_current(count):
+    pistes = []
+    for i in range(count):
+        piste = Mp3File('fichier %d.mp3' % i, r'C:\Musique')
+        piste.set_data_from_record(synthetic_record(i))
+        pistes.append(piste)
+    return pistes
+
+
+def build_tags(tag_class, count):
+    tags = []
+    for i in range(count):
+        record = synthetic_record(i)
+        tags.append(tag_class(artiste=record['Artiste'], titre=record['Titre'],
+                              artiste_display=record['ArtisteDisplay'], artiste_all=record['ArtisteAll'],
+                              annee=record['Annee'], style=record['Style'], genre=record['Genre'],
+                              album=record['Album'], artiste_album=record['ArtisteAlbum']))
+    return tags
+
+
+def measure(build, *args):
+    tracemalloc.start()
+    objects = build(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f"{count} pistes synthétiques")
+    for name, legacy, current in [
+        ('MusiqueFile', (build_legacy, count), (build_current, count)),
+        ('IqueMusicTag', (build_tags, LegacyIqueMusicTag, count), (build_tags, IqueMusicTag, count)),
+    ]:
+        before = measure(*legacy)
+        after = measure(*current)
+        print(f"{name:13s} avant : {before / count:7.0f} octets/piste   après : {after / count:7.0f} octets/piste"
+              f"   ({100 * (before - after) / before:.0f} % de moins)")
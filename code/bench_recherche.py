@@ -0,0 +1,34 @@
+"""
+Mesure le temps de construction de l'index de recherche et le temps de quelques
+requêtes sur une bibliothèque synthétique.
+
+Usage : python bench_recherche.py [nb_pistes]
+"""
+import sys
+import time
+
+from bench_memoire import build_current
+from search_index import SearchIndex
+
+REQUETES = ['artiste', 'Numéro 42', 'titre du morceau 1234', 'album 77', 'invite 12', 'morceua 4321', 'da', 'xyz']
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    pistes = build_current(count)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add_many(pistes)
+    print(f"{count} pistes indexées en {time.perf_counter() - start:.2f} s, {len(index.postings)} n-grammes")
+
+    for requete in REQUETES:
+        start = time.perf_counter()
+        result = index.search(requete)
+        print(f"{requete!r:28s} {len(result):7d} pistes  {1000 * (time.perf_counter() - start):6.2f} ms")
+
+    piste = pistes[0]
+    piste.Titre = 'Zanzibar'
+    start = time.perf_counter()
+    index.update(piste)
+    print(f"Mise à jour d'une piste : {1000 * (time.perf_counter() - start):.2f} ms")
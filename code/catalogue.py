@@ -0,0 +1,134 @@
+"""
+Catalogue des pistes chargées, avec des index par artiste, artiste de l'album, album,
+genre, style, année, dossier et présence d'image.
+
+Chaque index associe une valeur (normalisée : espaces retirés, casse ignorée) à l'ensemble
+des pistes qui l'ont ; une requête est l'intersection de quelques ensembles, sans parcourir
+la liste des pistes.
+
+Exemples :
+    catalogue.query(album='Parachutes', image=False)   # pistes de l'album sans image
+    catalogue.query(genre='')                          # pistes sans genre
+"""
+
+
+def normalize_key(value):
+    if value is None:
+        return ''
+    return str(value).strip().casefold()
+
+
+def year_key(value):
+    return normalize_key(value)[:4]
+
+
+# Nom de l'index -> fonction qui calcule la clé d'une piste
+CATALOG_INDEXES = {
+    'artiste': lambda piste: normalize_key(piste.ArtisteDisplay),
+    'artiste_album': lambda piste: normalize_key(piste.ArtisteAlbum),
+    'album': lambda piste: normalize_key(piste.Album),
+    'genre': lambda piste: normalize_key(piste.Genre),
+    'style': lambda piste: normalize_key(piste.Style),
+    'annee': lambda piste: year_key(piste.Annee),
+    'dossier': lambda piste: normalize_key(piste.get_folder()),
+    'image': lambda piste: piste.has_image(),
+}
+
+# Normalisation appliquée aux valeurs recherchées
+QUERY_KEYS = {name: normalize_key for name in CATALOG_INDEXES}
+QUERY_KEYS['annee'] = year_key
+QUERY_KEYS['image'] = bool
+
+
+class TrackCatalog:
+    def __init__(self):
+        self.indexes = {name: {} for name in CATALOG_INDEXES}
+        self.keys = {}  # piste -> {nom de l'index: clé}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, piste):
+        if piste in self.keys:
+            self.update(piste)
+            return
+        keys = {name: compute(piste) for name, compute in CATALOG_INDEXES.items()}
+        self.keys[piste] = keys
+        for name, key in keys.items():
+            self.indexes[name].setdefault(key, set()).add(piste)
+
+    def add_many(self, pistes):
+        for piste in pistes:
+            self.add(piste)
+
+    def remove(self, piste):
+        keys = self.keys.pop(piste, None)
+        if keys is None:
+            return
+        for name, key in keys.items():
+            self.discard(name, key, piste)
+
+    def clear(self):
+        self.indexes = {name: {} for name in CATALOG_INDEXES}
+        self.keys = {}
+
+    def discard(self, name, key, piste):
+        pistes = self.indexes[name].get(key)
+        if pistes is not None:
+            pistes.discard(piste)
+            if not pistes:
+                del self.indexes[name][key]
+
+    def update(self, piste):
+        """
+        Réindexe une piste après modification de ses champs (édition, sauvegarde).
+        Seuls les index dont la clé a changé sont touchés.
+        """
+        keys = self.keys.get(piste)
+        if keys is None:
+            self.add(piste)
+            return
+        for name, compute in CATALOG_INDEXES.items():
+            key = compute(piste)
+            if key != keys[name]:
+                self.discard(name, keys[name], piste)
+                self.indexes[name].setdefault(key, set()).add(piste)
+                keys[name] = key
+
+    def query(self, **criteria):
+        """
+        Retourne l'ensemble des pistes qui vérifient tous les critères.
+
+        Args:
+            **criteria: nom de l'index=valeur, par exemple album='Parachutes', genre='',
+                image=False. Sans critère, toutes les pistes.
+
+        Returns:
+            set: Les pistes correspondantes.
+        """
+        if not criteria:
+            return set(self.keys)
+        candidates = []
+        for name, value in criteria.items():
+            if name not in self.indexes:
+                raise KeyError(f"Index inconnu : {name}")
+            candidates.append(self.indexes[name].get(QUERY_KEYS[name](value), set()))
+        # Intersection en partant du plus petit ensemble (le résultat est toujours une copie)
+        candidates.sort(key=len)
+        if len(candidates) == 1:
+            return set(candidates[0])
+        return candidates[0].intersection(*candidates[1:])
+
+    def missing_artwork(self, **criteria):
+        return self.query(image=False, **criteria)
+
+    def empty(self, name, **criteria):
+        """Pistes dont le champ indexé `name` est vide."""
+        criteria[name] = ''
+        return self.query(**criteria)
+
+    def values(self, name):
+        """
+        Retourne les valeurs présentes dans un index avec leur nombre de pistes.
+        """
+        return {key: len(pistes) for key, pistes in self.indexes[name].items()}
@@ -1,5 +1,7 @@
-import requests
+from http_session import http_get
 from IqueMusicTag import IqueMusicTag
+from provider_cache import cached_lookup
+from release_cache import get_release_cache
 
 def get_deezer_artworks(artist, track, num_results=1):
     """
@@ -19,7 +21,7 @@ def get_deezer_artworks(artist, track, num_results=1):
     }
 
     try:
-        response = requests.get(base_url, params=params)
+        response = http_get(base_url, params=params)
         response.raise_for_status()
 
         data = response.json()
@@ -40,6 +42,88 @@ def get_deezer_artworks(artist, track, num_results=1):
         return []
 
 
+def check_deezer_error(data):
+    """
+    Deezer signale ses erreurs (quota dépassé, ...) avec un statut 200 et un corps
+    {"error": {...}} : elles sont levées, pour ne pas être prises pour une réponse vide.
+    """
+    if "error" in data:
+        error = data["error"]
+        raise ValueError(error.get("message", error) if isinstance(error, dict) else error)
+
+
+def make_deezer_tag(track_info):
+    """
+    Construit l'IqueMusicTag d'une piste décrite par l'API Deezer.
+    """
+    contributors = [contributor["name"] for contributor in track_info.get("contributors", [])]
+    contributors.append(track_info.get("artist", {}).get("name", ""))
+    contributors = list(set(filter(None, contributors)))
+
+    tag = IqueMusicTag(
+        artiste=track_info.get("artist", {}).get("name", ""),
+        titre=track_info.get("title", ""),
+        artiste_display=track_info.get("artist", {}).get("name", ""),
+        artiste_remix="",
+        artiste_ft=", ".join(contributors),
+        artiste_all=';'.join(contributors),
+        annee=int(track_info.get("release_date", "0000")[:4]) if track_info.get("release_date") else None,
+        style=track_info.get("genre_id", None),
+        genre=track_info.get("genre_id", None),
+        disk=None,
+        track=track_info.get("track_position", None),
+        album=track_info.get("album", {}).get("title", ""),
+        artiste_album=track_info.get("album", {}).get("artist", {}).get("name", ""),
+        images_path=track_info.get("album", {}).get("cover_big", None)
+    )
+    return tag
+
+
+def get_deezer_album_tracks(album_id):
+    """
+    Retourne l'IqueMusicTag de chacune des pistes d'un album Deezer.
+    """
+    response = http_get(f"https://api.deezer.com/album/{album_id}")
+    response.raise_for_status()
+    album = response.json()
+    check_deezer_error(album)
+    # Les pistes de l'album ne répètent pas les informations de l'album : elles y sont ajoutées
+    album_info = {"id": album.get("id"), "title": album.get("title"), "cover_big": album.get("cover_big"),
+                  "artist": album.get("artist") or {}}
+    return [make_deezer_tag(dict(track_info, album=album_info, release_date=album.get("release_date"),
+                                 genre_id=album.get("genre_id"), track_position=position))
+            for position, track_info in enumerate(album.get("tracks", {}).get("data", []), 1)]
+
+
+@cached_lookup('deezer_album')
+def get_deezer_album_details(artist, album):
+    """
+    Cherche un album via l'API Deezer et retourne l'IqueMusicTag de chacune de ses pistes
+    (liste vide si l'album n'est pas trouvé).
+
+    Arguments :
+    - artist (str) : Artiste de l'album.
+    - album (str) : Titre de l'album.
+    """
+    params = {
+        "q": f"artist:'{artist}' album:'{album}'" if artist else f"album:'{album}'",
+        "limit": 1
+    }
+    response = http_get("https://api.deezer.com/search/album", params=params)
+    response.raise_for_status()
+
+    data = response.json()
+    check_deezer_error(data)
+    if not data.get("data"):
+        return []
+    album_id = data["data"][0]["id"]
+    cache = get_release_cache()
+    tags = cache.get_release('deezer', album_id, lambda: get_deezer_album_tracks(album_id))
+    cache.mark_matched('deezer', album_id)
+    return tags
+
+
+@cached_lookup('deezer')
 def get_deezer_track_details(artist, track, num_results=1):
     """
     Récupère des informations détaillées sur une ou plusieurs pistes musicales via l'API Deezer.
@@ -52,52 +136,39 @@ def get_deezer_track_details(artist, track, num_results=1):
     Retourne :
     - Une liste contenant les détails des pistes.
     """
+    # Piste d'un album déjà chargé pendant la session : aucune requête
+    tags = get_release_cache().find_track('deezer', artist, track, num_results)
+    if tags:
+        return tags
+
     base_url = "https://api.deezer.com/search"
     params = {
         "q": f"artist:'{artist}' track:'{track}'",
         "limit": num_results
     }
 
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-
-        data = response.json()
-        if data.get("total", 0) == 0:
-            print("Aucun morceau trouvé sur Deezer.")
-            return []
+    response = http_get(base_url, params=params)
+    response.raise_for_status()
 
-        tags = []
-        for track_info in data.get("data", []):
-            contributors = [contributor["name"] for contributor in track_info.get("contributors", [])]
-            contributors.append(track_info.get("artist", {}).get("name", ""))
-            contributors = list(set(filter(None, contributors)))
-
-            tag = IqueMusicTag(
-                artiste=track_info.get("artist", {}).get("name", ""),
-                titre=track_info.get("title", ""),
-                artiste_display=track_info.get("artist", {}).get("name", ""),
-                artiste_remix="",
-                artiste_ft=", ".join(contributors),
-                artiste_all=';'.join(contributors),
-                annee=int(track_info.get("release_date", "0000")[:4]) if track_info.get("release_date") else None,
-                style=track_info.get("genre_id", None),
-                genre=track_info.get("genre_id", None),
-                disk=None,
-                track=track_info.get("track_position", None),
-                album=track_info.get("album", {}).get("title", ""),
-                artiste_album=track_info.get("album", {}).get("artist", {}).get("name", ""),
-                images_path=track_info.get("album", {}).get("cover_big", None)
-            )
-
-            tags.append(tag)
+    data = response.json()
+    check_deezer_error(data)
+    if data.get("total", 0) == 0:
+        print("Aucun morceau trouvé sur Deezer.")
+        return []
 
-        return tags
+    tags = [make_deezer_tag(track_info) for track_info in data.get("data", [])]
 
-    except Exception as e:
-        print(f"Erreur lors de la récupération des données Deezer : {e}")
-        return []
+    # L'album du premier résultat est chargé : les autres pistes de l'album y seront trouvées sans requête
+    album_id = data["data"][0].get("album", {}).get("id") if data.get("data") else None
+    if album_id:
+        try:
+            get_release_cache().get_release('deezer', album_id, lambda: get_deezer_album_tracks(album_id))
+            # Le premier résultat est une piste de cet album
+            get_release_cache().mark_matched('deezer', album_id)
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'album Deezer {album_id} : {e}")
 
+    return tags
 # Exemple d'utilisation
 if __name__ == '__main__':
     artist_name = "Gala"
@@ -1,6 +1,18 @@
+import difflib
+import itertools
 import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import discogs_client
 from IqueMusicTag import IqueMusicTag
+from http_session import DEFAULT_TIMEOUT, USER_AGENT
+from provider_cache import cached_lookup
+from release_cache import get_release_cache, match_track
+from search_index import normalize_text
 
 from dotenv import load_dotenv
 
@@ -10,196 +22,407 @@ load_dotenv()
 # Récupérer le token depuis l'environnement
 my_discogs_user_token = os.getenv("DISCOGS_USER_TOKEN")
 
+# Limite de l'API Discogs : 60 requêtes par minute avec un token (un peu de marge)
+DISCOGS_RATE_LIMIT = 55
+
+# Releases chargées en même temps pour une recherche
+DISCOGS_FETCH_WORKERS = 4
+
+# Résultats de recherche classés (une page de l'API : reçue en une requête)
+DISCOGS_SEARCH_HITS = 50
+
+# Nombre maximal de releases chargées par recherche, parmi les mieux classées
+DISCOGS_MAX_CANDIDATES = 12
+
+# Position d'une piste sur un album à plusieurs disques : "2-05", "2.05", "CD2-5"
+DISC_POSITION = re.compile(r'^(?:CD|DVD|Disc)?\s*(\d+)\s*[-.]\s*(\d+)$', re.IGNORECASE)
+
+# Un résultat d'un autre artiste n'est pas chargé (les compilations sont gardées)
+DISCOGS_MIN_ARTIST_SCORE = 0.5
+
+# Les compilations passent après les sorties de l'artiste
+COMPILATION_PENALTY = 0.25
+
 def clean_artist_name(artist_name):
     import re
     clean_name = re.sub(r'\s\(\d+\)$', '', artist_name)
     return clean_name
 
-def search_track_in_tracklist(song, discogs_tracks):
-    import difflib
-    # Trouver la meilleure correspondance
-    tracks = []
-
-    search_song = song
-
-    # Construire la liste des titres formatés avec artistes
-    for discogs_track in discogs_tracks:
-        track = ""
-        # On verifie que ce n'est pas un separateur (titre de cd par exemple)
-        if discogs_track.data['type_'] != 'index':
-            try:
-                for artist in discogs_track.data['artists']:
-                    track = track + artist['name']
-                    track = track + " "
-                track = track + "- "
-            except KeyError:
-                search_song = song.split("-", 1)[1].strip()
-
-            track = track + discogs_track.title
+def get_discogs_client():
+    """
+    Retourne le client Discogs partagé par tout le processus (créé au premier appel).
+    """
+    global discogs_client_instance
+    with discogs_client_lock:
+        if discogs_client_instance is None:
+            discogs_client_instance = discogs_client.Client(USER_AGENT, user_token=my_discogs_user_token)
+            # Sans délai, une requête sans réponse bloquerait un fil indéfiniment
+            discogs_client_instance.set_timeout(*DEFAULT_TIMEOUT)
+        return discogs_client_instance
+
+
+def get_release_executor():
+    global release_executor
+    with discogs_client_lock:
+        if release_executor is None:
+            release_executor = ThreadPoolExecutor(max_workers=DISCOGS_FETCH_WORKERS,
+                                                  thread_name_prefix='discogs_release')
+        return release_executor
+
+
+class RateLimiter:
+    def __init__(self, max_calls, period):
+        """
+        Au plus `max_calls` appels par fenêtre glissante de `period` secondes, tous fils confondus.
+        """
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Attend qu'un appel soit permis, puis le compte.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.period:
+                    self.calls.popleft()
+                if len(self.calls) < self.max_calls:
+                    self.calls.append(now)
+                    return
+                delay = self.calls[0] + self.period - now
+            time.sleep(delay)
+
+
+discogs_client_instance = None
+release_executor = None
+discogs_client_lock = threading.Lock()
+rate_limiter = RateLimiter(DISCOGS_RATE_LIMIT, 60)
+
+# Recherches de pistes faites, releases examinées (classement), releases qu'il aurait fallu
+# examiner dans l'ordre de la recherche pour les mêmes résultats, releases chargées depuis
+# Discogs (voir discogs_summary)
+lookup_stats = {'lookups': 0, 'examined': 0, 'in_order': 0, 'fetched': 0}
+lookup_stats_lock = threading.Lock()
+
+
+def similarity(a, b):
+    a = normalize_text(a)
+    b = normalize_text(b)
+    if a and b and (a in b or b in a):
+        # "Artiste" dans "Artiste feat. Autre", titre d'un single dans "Titre (Remixes)"
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def rank_search_hits(hits, searched_song):
+    """
+    Classe les résultats de la recherche, du plus au moins prometteur, avec les seules
+    données de la recherche (titre "Artiste - Titre" et année, sans charger la release).
+    Les résultats d'un autre artiste sont écartés.
 
-        tracks.append(track)
+    Retourne les identifiants des releases à charger, dans l'ordre.
+    """
+    artiste, titre = split_searched_song(searched_song)
+
+    ranked = []
+    for position, hit in enumerate(hits):
+        hit_artist, _, hit_title = hit.data.get('title', '').partition(' - ')
+        hit_artist = clean_artist_name(hit_artist)
+        compilation = normalize_text(hit_artist) == 'various' or 'Compilation' in hit.data.get('format', [])
+        if not artiste:
+            artist_score = 1.0
+        elif normalize_text(hit_artist) == 'various':
+            artist_score = DISCOGS_MIN_ARTIST_SCORE
+        else:
+            artist_score = similarity(artiste, hit_artist)
+            if artist_score < DISCOGS_MIN_ARTIST_SCORE:
+                continue
+        score = artist_score + similarity(titre, hit_title) - (COMPILATION_PENALTY if compilation else 0)
+        try:
+            year = int(hit.data.get('year'))
+        except (TypeError, ValueError):
+            year = 9999
+        # À score égal, la sortie la plus ancienne (l'originale plutôt qu'une réédition)
+        ranked.append((-score, year, position, hit.data['id']))
+    ranked.sort()
+    return [release_id for _, _, _, release_id in ranked]
+
+
+def discogs_summary():
+    with lookup_stats_lock:
+        lookups = lookup_stats['lookups']
+        examined = lookup_stats['examined']
+        in_order = lookup_stats['in_order']
+        fetched = lookup_stats['fetched']
+    if not lookups:
+        return "Discogs : aucune recherche"
+    return (f"Discogs : {lookups} recherche(s), {examined} release(s) examinée(s) contre {in_order} dans l'ordre "
+            f"de la recherche ({(in_order - examined) / lookups:.1f} évitée(s) par recherche), "
+            f"{fetched} chargée(s) depuis Discogs")
+
+
+def split_searched_song(searched_song):
+    """
+    "Artiste - Titre" -> (artiste, titre) ; artiste vide s'il n'y a pas de séparateur.
+    """
+    if ' - ' in searched_song:
+        artiste, titre = searched_song.split(' - ', 1)
+        return artiste, titre
+    return '', searched_song
 
-    matches = difflib.get_close_matches(search_song, tracks, n=1,
-                                        cutoff=0.6)  # n=1 pour obtenir la meilleure correspondance
 
-    # Retourner l'objet `discogs_track` correspondant à la meilleure correspondance
-    if matches:
-        best_match = matches[0]
-        match_index = tracks.index(best_match)  # Trouver l'index de la correspondance
-        return discogs_tracks[match_index]  # Retourner l'objet `discogs_track` correspondant
+def load_release_tags(release_id):
+    """
+    Charge une release et retourne l'IqueMusicTag de chacune de ses pistes.
+    """
+    rate_limiter.acquire()
+    release = get_discogs_client().release(release_id)
+    # Chargement complet ici, pas à la première lecture d'un attribut
+    release.refresh()
+    with lookup_stats_lock:
+        lookup_stats['fetched'] = lookup_stats['fetched'] + 1
+    tags = []
+    number = 0
+    disk = None
+    for track in release.tracklist:
+        # Les séparateurs (titres de CD, ...) ne sont pas des pistes
+        if track.data.get('type_') != 'track':
+            continue
+        match = DISC_POSITION.match(track.data.get('position', '').strip())
+        if match:
+            disk, number = int(match.group(1)), int(match.group(2))
+        else:
+            # "A1", "B2" (faces d'un vinyle) ou "1", "2" : numérotation à la suite
+            number = number + 1
+        tags.append(make_track_tag(release, track, disk, number))
+    return tags
+
+
+def fetch_release_tag(release_id, artiste, titre):
+    """
+    Retourne (sur un fil du pool) l'IqueMusicTag de la piste recherchée dans une release,
+    ou None si elle n'y est pas. La release est reprise du cache des sorties si possible.
+    """
+    tracks = get_release_cache().get_release('discogs', release_id, lambda: load_release_tags(release_id))
+    return match_track(tracks, artiste, titre)
 
 
-    # Si aucune correspondance n'est trouvée
-    return None
+def make_track_tag(release, track, disk=None, number=None):
+    """
+    Construit l'IqueMusicTag d'une piste d'une release chargée.
+    """
+    # Gestion de artiste
 
+    # Savoir le type d'extraction
+    songArt = []
+    songRmx = []
+    songFt = []
+    songAll = []
 
+    # main artist
+    mainartist = ''
+    try:
+        for artist in track.data['artists']:
+            mainartist = mainartist + clean_artist_name(artist['name'])
+            if (artist['join'] != ''): mainartist = mainartist + ' ' + artist['join'] + ' '
+            if (clean_artist_name(artist['name']) in songAll) == False:
+                songAll.append(clean_artist_name(artist['name']))
+    except KeyError:
+        for artist in release.data['artists']:
+            mainartist = mainartist + clean_artist_name(artist['name'])
+            if (artist['join'] != ''): mainartist = mainartist + ' ' + artist['join'] + ' '
+            if (clean_artist_name(artist['name']) in songAll) == False:
+                songAll.append(clean_artist_name(artist['name']))
+
+    if mainartist == '':
+        mainartist = clean_artist_name(release.artists[0].name)
+    if not (songAll):
+        songAll.append(clean_artist_name(release.artists[0].name))
+
+    # Credits - aditional artists
+    try:
+        for artist in track.data['extraartists']:
+            if artist['role'] == 'Featuring' and (artist['name'] in songFt) == False:
+                songFt.append(clean_artist_name(artist['name']))
+            elif artist['role'] == 'Remix' and (artist['name'] in songRmx) == False:
+                songRmx.append(clean_artist_name(artist['name']))
+
+            if (clean_artist_name(artist['name']) in songAll) == False:
+                songAll.append(clean_artist_name(artist['name']))
+    except:
+        pass
+
+    # Featuring
+    participant = ''
+    numParticipant = 0
+    for artists in songFt:
+        if numParticipant > 0: participant = participant + ';'
+        participant = participant + artists
+        numParticipant = numParticipant + 1
+    featuring = participant
+
+    # Remix
+    participant = ''
+    numParticipant = 0
+    for artists in songRmx:
+        if numParticipant > 0: participant = participant + ';'
+        participant = participant + artists
+        numParticipant = numParticipant + 1
+    remixer = participant
+
+    # All credit
+    participant = ''
+    numParticipant = 0
+    for artists in songAll:
+        if numParticipant > 0: participant = participant + ';'
+        participant = participant + artists
+        numParticipant = numParticipant + 1
+
+    # Album Artiste
+    if release.artists[0].name == 'Various':
+        album_artist = 'Various Artists'
+    else:
+        album_artist = clean_artist_name(release.artists[0].name)
+
+    # Style
+    listdesStyles = ''
+    numStyle = 0
+    try:
+        for styleZik in release.styles:
+            if numStyle > 0: listdesStyles = listdesStyles + ';'
+            listdesStyles = listdesStyles + styleZik
+            numStyle = numStyle + 1
+    except:
+        listdesStyles = ''
+
+    #CoverArt
+    uri = None
+    for image in release.images:
+        if image['type'] == 'primary':
+            uri = image['uri']
+            break
+
+    # Si aucune image 'primary' n'est trouvée, prendre la première image disponible
+    if uri is None and release.images:
+        uri = release.images[0]['uri']
+
+    tag = IqueMusicTag(
+        artiste=mainartist,
+        titre=track.title,
+        artiste_display=mainartist,
+        artiste_remix=remixer,
+        artiste_ft=featuring,
+        artiste_all=participant,
+        annee=str(release.year),
+        style=listdesStyles,
+        genre=release.genres[0],
+        disk=disk,
+        track=number,
+        album=release.title,
+        artiste_album=album_artist,
+        images_path=uri,
+    )
+    return tag
+
+
+@cached_lookup('discogs')
 def get_discogs_track_details(searched_song, num_results=1):
     """
     Récupère des informations détaillées sur une ou plusieurs pistes musicales via l'API discogs.
 
+    Les résultats de la recherche sont d'abord classés sans être chargés (voir
+    rank_search_hits) ; seules les DISCOGS_MAX_CANDIDATES releases les mieux classées sont
+    chargées, DISCOGS_FETCH_WORKERS à la fois, dans la limite de DISCOGS_RATE_LIMIT
+    requêtes par minute. Les releases sont gardées dans le cache des sorties (voir
+    release_cache) : pour un seul résultat demandé, une piste d'une release où une autre
+    piste a déjà été trouvée pendant la session est trouvée sans requête.
+
     Arguments :
-    - artist (str) : Nom de l'artiste.
-    - track (str) : Nom de la piste.
+    - searched_song (str) : "Artiste - Titre" recherché.
     - num_results (int) : Nombre de résultats souhaités.
 
     Retourne :
-    - Une liste contenant les détails des pistes.
+    - Une liste contenant les détails des pistes, des releases les mieux classées aux moins bien classées.
     """
+    artiste, titre = split_searched_song(searched_song)
+    # Piste d'un album déjà chargé pendant la session : aucune requête
+    tags = get_release_cache().find_track('discogs', artiste, titre, num_results)
+    if tags:
+        return tags
 
-    try:
-        d = discogs_client.Client('ExampleApplication/0.1', user_token=my_discogs_user_token)
-        releases = d.search(searched_song, type='release')
-
-        i = 0
-        tags = []
-        for intermediate_release in releases:
-
-            d = discogs_client.Client('ExampleApplication/0.1', user_token=my_discogs_user_token)
-            release = d.release(intermediate_release.id)
-
-            track = search_track_in_tracklist(searched_song, release.tracklist)
-
-            if track is None:
+    rate_limiter.acquire()
+    releases = get_discogs_client().search(searched_song, type='release')
+    # La première page de résultats est chargée ici
+    hits = list(itertools.islice(releases, DISCOGS_SEARCH_HITS))
+    candidates = rank_search_hits(hits, searched_song)[:DISCOGS_MAX_CANDIDATES]
+
+    executor = get_release_executor()
+    tags = []
+    matched_ids = []
+    examined = 0
+    error = None
+    # Par vagues : on s'arrête dès que les releases les mieux classées suffisent
+    for index in range(0, len(candidates), DISCOGS_FETCH_WORKERS):
+        wave = candidates[index:index + DISCOGS_FETCH_WORKERS]
+        futures = [executor.submit(fetch_release_tag, release_id, artiste, titre) for release_id in wave]
+        examined = examined + len(wave)
+        for release_id, future in zip(wave, futures):
+            try:
+                tag = future.result()
+            except Exception as e:
+                # Release introuvable, hors délai ou incomplète : les autres releases restent valables
+                print(f"Discogs : release {release_id} ignorée pour {searched_song} : {e}")
+                error = e
                 continue
+            if tag is not None and len(tags) < num_results:
+                tags.append(tag)
+                matched_ids.append(release_id)
+                # Seules les releases retenues servent aux pistes suivantes (voir release_cache)
+                get_release_cache().mark_matched('discogs', release_id)
+        if len(tags) == num_results:
+            break
+
+    # Sans classement, les releases étaient examinées dans l'ordre de la recherche jusqu'à en
+    # trouver assez : au plus jusqu'à la dernière de celles retenues, toutes sinon
+    in_order = min(len(hits), DISCOGS_MAX_CANDIDATES)
+    if len(tags) == num_results:
+        positions = {hit.data['id']: position for position, hit in enumerate(hits)}
+        in_order = min(in_order, max(positions[release_id] for release_id in matched_ids) + 1)
+    with lookup_stats_lock:
+        lookup_stats['lookups'] = lookup_stats['lookups'] + 1
+        lookup_stats['examined'] = lookup_stats['examined'] + examined
+        lookup_stats['in_order'] = lookup_stats['in_order'] + in_order
+    if not tags and error is not None:
+        # Rien trouvé à cause des erreurs : la réponse vide ne doit pas être gardée dans le cache
+        raise error
+    return tags
+
+
+@cached_lookup('discogs_album')
+def get_discogs_album_tracks(artist, album):
+    """
+    Cherche un album sur Discogs et retourne l'IqueMusicTag de chacune de ses pistes (liste
+    vide si l'album n'est pas trouvé). Seule la release la mieux classée est chargée.
 
-            # Gestion de artiste
-
-            # Savoir le type d'extraction
-            songArt = []
-            songRmx = []
-            songFt = []
-            songAll = []
-
-            # main artist
-            mainartist = ''
-            try:
-                for artist in track.data['artists']:
-                    mainartist = mainartist + clean_artist_name(artist['name'])
-                    if (artist['join'] != ''): mainartist = mainartist + ' ' + artist['join'] + ' '
-                    if (clean_artist_name(artist['name']) in songAll) == False:
-                        songAll.append(clean_artist_name(artist['name']))
-            except KeyError:
-                for artist in release.data['artists']:
-                    mainartist = mainartist + clean_artist_name(artist['name'])
-                    if (artist['join'] != ''): mainartist = mainartist + ' ' + artist['join'] + ' '
-                    if (clean_artist_name(artist['name']) in songAll) == False:
-                        songAll.append(clean_artist_name(artist['name']))
-
-            if mainartist == '':
-                mainartist = clean_artist_name(release.artists[0].name)
-            if not (songAll):
-                songAll.append(clean_artist_name(release.artists[0].name))
-
-            # Credits - aditional artists
-            try:
-                for artist in track.data['extraartists']:
-                    if artist['role'] == 'Featuring' and (artist['name'] in songFt) == False:
-                        songFt.append(clean_artist_name(artist['name']))
-                    elif artist['role'] == 'Remix' and (artist['name'] in songRmx) == False:
-                        songRmx.append(clean_artist_name(artist['name']))
-
-                    if (clean_artist_name(artist['name']) in songAll) == False:
-                        songAll.append(clean_artist_name(artist['name']))
-            except:
-                pass
-
-            # Featuring
-            participant = ''
-            numParticipant = 0
-            for artists in songFt:
-                if numParticipant > 0: participant = participant + ';'
-                participant = participant + artists
-                numParticipant = numParticipant + 1
-            featuring = participant
-
-            # Remix
-            participant = ''
-            numParticipant = 0
-            for artists in songRmx:
-                if numParticipant > 0: participant = participant + ';'
-                participant = participant + artists
-                numParticipant = numParticipant + 1
-            remixer = participant
-
-            # All credit
-            participant = ''
-            numParticipant = 0
-            for artists in songAll:
-                if numParticipant > 0: participant = participant + ';'
-                participant = participant + artists
-                numParticipant = numParticipant + 1
-
-            # Album Artiste
-            if release.artists[0].name == 'Various':
-                album_artist = 'Various Artists'
-            else:
-                album_artist = clean_artist_name(release.artists[0].name)
-
-            # Style
-            listdesStyles = ''
-            numStyle = 0
-            try:
-                for styleZik in release.styles:
-                    if numStyle > 0: listdesStyles = listdesStyles + ';'
-                    listdesStyles = listdesStyles + styleZik
-                    numStyle = numStyle + 1
-            except:
-                listdesStyles = ''
-
-            #CoverArt
-            uri = None
-            for image in release.images:
-                if image['type'] == 'primary':
-                    uri = image['uri']
-                    break
-
-            # Si aucune image 'primary' n'est trouvée, prendre la première image disponible
-            if uri is None and release.images:
-                uri = release.images[0]['uri']
-
-            tag = IqueMusicTag(
-                artiste=mainartist,
-                titre=track.title,
-                artiste_display=mainartist,
-                artiste_remix=remixer,
-                artiste_ft=featuring,
-                artiste_all=participant,
-                annee=str(release.year),
-                style=listdesStyles,
-                genre=release.genres[0],
-                #disk=track_info.get("discNumber"),
-                #track=track_info.get("trackNumber"),
-                album=release.title,
-                artiste_album=album_artist,
-                images_path=uri,
-            )
-            tags.append(tag)
-            i = i + 1
-            if i == num_results:
-                break
-        return tags
-    except Exception as e:
+    Arguments :
+    - artist (str) : Artiste de l'album.
+    - album (str) : Titre de l'album.
+    """
+    searched_album = artist + " - " + album if artist else album
+    rate_limiter.acquire()
+    releases = get_discogs_client().search(searched_album, type='release')
+    hits = list(itertools.islice(releases, DISCOGS_SEARCH_HITS))
+    candidates = rank_search_hits(hits, searched_album)
+    if not candidates:
         return []
+    cache = get_release_cache()
+    tags = cache.get_release('discogs', candidates[0], lambda: load_release_tags(candidates[0]))
+    cache.mark_matched('discogs', candidates[0])
+    return tags
+
 
 # Exemple d'utilisation
 if __name__ == '__main__':
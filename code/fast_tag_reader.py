@@ -0,0 +1,282 @@
+"""
+Lecture rapide des tags : le fichier est projeté en mémoire (mmap) et seule la zone des
+tags est décodée (tag ID3v2 en début de MP3, blocs METADATA_BLOCK en début de FLAC).
+Les données audio ne sont jamais lues.
+
+Les images (APIC / PICTURE) sont renvoyées sous forme de memoryview sur la projection,
+sans copie. Tout cas non géré ici (ID3v2.2, désynchronisation, frames compressées ou
+chiffrées, tag ID3 devant un FLAC, ...) fait renvoyer None : l'appelant repasse alors
+par mutagen.
+"""
+import mmap
+import struct
+
+from tag_reader import ID3_FRAMES, TXXX_DESCS, VORBIS_KEYS, new_record
+
+
+class UnsupportedTag(Exception):
+    """Le tag sort du cas simple géré par la lecture rapide."""
+
+
+ID3_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+FLAC_VORBIS_COMMENT = 4
+FLAC_PICTURE = 6
+
+
+def synchsafe_int(data):
+    if any(byte & 0x80 for byte in data):
+        raise UnsupportedTag("entier synchsafe invalide")
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def find_terminator(data, encoding):
+    """
+    Retourne la position du caractère nul qui termine une chaîne, -1 s'il n'y en a pas.
+    """
+    if encoding in (1, 2):
+        # Terminateur UTF-16 : deux octets nuls alignés
+        end = data.find(b'\x00\x00')
+        while end != -1 and end % 2 == 1:
+            end = data.find(b'\x00\x00', end + 1)
+        return end
+    return data.find(b'\x00')
+
+
+def split_encoded(data, encoding):
+    """
+    Sépare une chaîne terminée par un caractère nul du reste des données.
+
+    Returns:
+        tuple: (chaîne décodée, données restantes)
+    """
+    end = find_terminator(data, encoding)
+    if end == -1:
+        return data.decode(ID3_ENCODINGS[encoding]), b''
+    terminator_length = 2 if encoding in (1, 2) else 1
+    return data[:end].decode(ID3_ENCODINGS[encoding]), data[end + terminator_length:]
+
+
+def decode_text_frame(data):
+    encoding = data[0]
+    if encoding not in ID3_ENCODINGS:
+        raise UnsupportedTag("encodage inconnu")
+    # Les valeurs multiples (ID3v2.4) sont séparées par un caractère nul : on garde la première
+    text, _ = split_encoded(bytes(data[1:]), encoding)
+    return text
+
+
+def decode_txxx_frame(data):
+    encoding = data[0]
+    if encoding not in ID3_ENCODINGS:
+        raise UnsupportedTag("encodage inconnu")
+    desc, rest = split_encoded(bytes(data[1:]), encoding)
+    text, _ = split_encoded(rest, encoding)
+    return desc, text
+
+
+def apic_data_offset(data):
+    """
+    Retourne la position des données image dans le contenu d'une frame APIC.
+    """
+    encoding = data[0]
+    if encoding not in ID3_ENCODINGS:
+        raise UnsupportedTag("encodage inconnu")
+    mime_end = bytes(data[1:256]).find(b'\x00')
+    if mime_end == -1:
+        raise UnsupportedTag("type MIME APIC invalide")
+    # Encodage, type MIME, type d'image, puis description terminée par un nul
+    desc_start = 1 + mime_end + 1 + 1
+    desc_end = find_terminator(bytes(data[desc_start:desc_start + 1024]), encoding)
+    if desc_end == -1:
+        raise UnsupportedTag("description APIC invalide")
+    return desc_start + desc_end + (2 if encoding in (1, 2) else 1)
+
+
+def iter_id3_frames(mm):
+    """
+    Parcourt les frames du tag ID3v2 en début de fichier.
+
+    Yields:
+        tuple: (identifiant de frame, position du contenu dans le fichier, memoryview sur le contenu)
+    """
+    header = mm[:10]
+    if len(header) < 10 or header[:3] != b'ID3':
+        raise UnsupportedTag("pas de tag ID3v2 en début de fichier")
+    version = header[3]
+    flags = header[5]
+    if version not in (3, 4):
+        raise UnsupportedTag("version ID3v2.%d" % version)
+    if flags & 0x80:
+        raise UnsupportedTag("tag désynchronisé")
+
+    tag_end = 10 + synchsafe_int(header[6:10])
+    if tag_end > len(mm):
+        raise UnsupportedTag("tag tronqué")
+
+    view = memoryview(mm)
+    offset = 10
+    if flags & 0x40:
+        # En-tête étendu : taille hors champ en v2.3, taille complète (synchsafe) en v2.4
+        if version == 3:
+            offset = offset + 4 + struct.unpack('>I', mm[offset:offset + 4])[0]
+        else:
+            offset = offset + synchsafe_int(mm[offset:offset + 4])
+
+    while offset + 10 <= tag_end:
+        frame_header = mm[offset:offset + 10]
+        frame_id = frame_header[:4]
+        if frame_id[0] == 0:
+            break  # Début du padding
+        if not all(48 <= c <= 57 or 65 <= c <= 90 for c in frame_id):
+            raise UnsupportedTag("identifiant de frame invalide")
+        if version == 4:
+            size = synchsafe_int(frame_header[4:8])
+        else:
+            size = struct.unpack('>I', frame_header[4:8])[0]
+        frame_flags = frame_header[9]
+        start = offset + 10
+        end = start + size
+        if end > tag_end:
+            raise UnsupportedTag("frame tronquée")
+
+        if version == 4:
+            if frame_flags & 0x0E:
+                raise UnsupportedTag("frame compressée, chiffrée ou désynchronisée")
+            if frame_flags & 0x40:
+                start = start + 1  # Groupe
+            if frame_flags & 0x01:
+                start = start + 4  # Indicateur de longueur
+        else:
+            if frame_flags & 0xC0:
+                raise UnsupportedTag("frame compressée ou chiffrée")
+            if frame_flags & 0x20:
+                start = start + 1  # Groupe
+
+        if start < end:
+            yield frame_id.decode('ascii'), start, view[start:end]
+        offset = end
+
+
+def read_id3_record(mm):
+    record = new_record()
+    frames_to_fields = {frame_id: field for field, frame_id in ID3_FRAMES.items()}
+    descs_to_fields = {desc: field for field, desc in TXXX_DESCS.items()}
+    found = set()
+    year = None
+    date = None
+
+    for frame_id, start, data in iter_id3_frames(mm):
+        if frame_id in frames_to_fields and frame_id not in found:
+            record[frames_to_fields[frame_id]] = decode_text_frame(data)
+            found.add(frame_id)
+        elif frame_id == 'TXXX':
+            desc, text = decode_txxx_frame(data)
+            if desc in descs_to_fields:
+                record[descs_to_fields[desc]] = text
+        elif frame_id == 'APIC' and record['image_data'] is None:
+            image_start = apic_data_offset(data)
+            record['image_data'] = data[image_start:]
+            record['image_offset'] = start + image_start
+            record['image_length'] = len(data) - image_start
+        elif frame_id == 'TYER':
+            year = decode_text_frame(data)
+        elif frame_id == 'TDAT':
+            date = decode_text_frame(data)
+
+    # ID3v2.3 : l'année est dans TYER (+ TDAT au format JJMM), comme mutagen on la présente en TDRC
+    if 'TDRC' not in found and year:
+        record['Annee'] = year
+        if date and len(date) == 4 and date.isdigit():
+            record['Annee'] = year + '-' + date[2:] + '-' + date[:2]
+
+    record['ArtisteDisplay'] = record['Artiste']
+    return record
+
+
+def read_flac_record(mm):
+    if mm[:4] != b'fLaC':
+        raise UnsupportedTag("pas de signature fLaC en début de fichier")
+
+    record = new_record()
+    keys_to_fields = {key: field for field, key in VORBIS_KEYS.items()}
+    found = set()
+    view = memoryview(mm)
+    offset = 4
+    last = False
+    while not last:
+        block_header = mm[offset:offset + 4]
+        if len(block_header) < 4:
+            raise UnsupportedTag("bloc FLAC tronqué")
+        last = bool(block_header[0] & 0x80)
+        block_type = block_header[0] & 0x7F
+        size = int.from_bytes(block_header[1:4], 'big')
+        start = offset + 4
+        end = start + size
+        if end > len(mm):
+            raise UnsupportedTag("bloc FLAC tronqué")
+
+        if block_type == FLAC_VORBIS_COMMENT:
+            position = start
+            vendor_length = struct.unpack('<I', mm[position:position + 4])[0]
+            position = position + 4 + vendor_length
+            count = struct.unpack('<I', mm[position:position + 4])[0]
+            position = position + 4
+            for _ in range(count):
+                length = struct.unpack('<I', mm[position:position + 4])[0]
+                position = position + 4
+                comment = mm[position:position + length].decode('utf-8')
+                position = position + length
+                key, _, value = comment.partition('=')
+                field = keys_to_fields.get(key.lower())
+                if field is not None and field not in found:
+                    record[field] = value
+                    found.add(field)
+            if position > end:
+                raise UnsupportedTag("bloc VORBIS_COMMENT invalide")
+        elif block_type == FLAC_PICTURE and record['image_data'] is None:
+            position = start + 4
+            mime_length = struct.unpack('>I', mm[position:position + 4])[0]
+            position = position + 4 + mime_length
+            desc_length = struct.unpack('>I', mm[position:position + 4])[0]
+            position = position + 4 + desc_length + 16
+            data_length = struct.unpack('>I', mm[position:position + 4])[0]
+            position = position + 4
+            if position + data_length > end:
+                raise UnsupportedTag("bloc PICTURE invalide")
+            record['image_data'] = view[position:position + data_length]
+            record['image_offset'] = position
+            record['image_length'] = data_length
+        elif block_type == 127:
+            raise UnsupportedTag("bloc FLAC invalide")
+        offset = end
+
+    record['ArtisteDisplay'] = record['Artiste']
+    return record
+
+
+def read_tag_record_fast(file_path, file_type):
+    """
+    Lit les tags en ne décodant que la zone de tags du fichier.
+
+    Args:
+        file_path (str): Chemin complet du fichier.
+        file_type (str): 'mp3' ou 'flac'.
+
+    Returns:
+        dict | None: Enregistrement comme tag_reader.read_tag_record ('image_data' est une
+        memoryview sur la projection du fichier, 'image_offset' et 'image_length' sa position
+        dans le fichier), ou None si le fichier doit passer par mutagen.
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # Fichier vide
+
+    try:
+        if file_type == 'flac':
+            return read_flac_record(mm)
+        return read_id3_record(mm)
+    except (UnsupportedTag, struct.error, IndexError, UnicodeDecodeError, LookupError):
+        return None
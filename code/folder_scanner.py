@@ -0,0 +1,55 @@
+import os
+import time
+
+from tag_reader import get_file_type
+
+
+def scan_audio_files(path, recursive=True):
+    """
+    Parcourt un dossier (et ses sous-dossiers) avec os.scandir et produit les fichiers
+    audio au fur et à mesure qu'ils sont trouvés.
+
+    Args:
+        path (str): Dossier à parcourir.
+        recursive (bool): Descendre dans les sous-dossiers.
+
+    Yields:
+        tuple: (file_name, path du dossier qui le contient, file_type)
+    """
+    pending = [path]
+    while pending:
+        folder = pending.pop()
+        subfolders = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.path)
+                        continue
+                    file_type = get_file_type(entry.name)
+                    if file_type is not None:
+                        yield entry.name, folder, file_type
+        except OSError as e:
+            print(f"Impossible de parcourir {folder} : {e}")
+            continue
+        if recursive:
+            # Pile : on veut traiter les sous-dossiers dans l'ordre alphabétique
+            pending.extend(sorted(subfolders, reverse=True))
+
+
+def iter_chunks(iterable, chunk_size, max_delay=0.05):
+    """
+    Regroupe les éléments par paquets d'au plus `chunk_size`. Un paquet incomplet est
+    produit dès que `max_delay` secondes se sont écoulées depuis le précédent, pour que
+    les premiers résultats d'un parcours lent s'affichent sans attendre.
+    """
+    chunk = []
+    last_flush = time.perf_counter()
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size or time.perf_counter() - last_flush >= max_delay:
+            yield chunk
+            chunk = []
+            last_flush = time.perf_counter()
+    if chunk:
+        yield chunk
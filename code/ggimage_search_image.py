@@ -3,6 +3,8 @@ from bs4 import BeautifulSoup
 import re
 import json
 
+from http_session import BROWSER_USER_AGENT, http_get
+
 
 def google_get_image_urls(query, count):
     try:
@@ -13,9 +15,9 @@ def google_get_image_urls(query, count):
             'ijn': 0  # Page number
         }
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': BROWSER_USER_AGENT
         }
-        response = requests.get(url, params=params, headers=headers)
+        response = http_get(url, params=params, headers=headers)
         response.raise_for_status()  # Raise an HTTPError for bad responses
 
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -0,0 +1,70 @@
+"""
+Client HTTP partagé par les modules de recherche (iTunes, Deezer, Qwant, Google images,
+Beatport, Cover Art Archive).
+
+Une seule session requests pour tout le processus : les connexions (TCP + TLS) vers un
+même hôte sont gardées ouvertes et réutilisées, au lieu d'une nouvelle connexion par
+requête. Chaque requête a un délai par défaut, les réponses compressées (gzip) sont
+acceptées, et toutes les requêtes portent le même User-Agent. Les erreurs passagères
+(connexion refusée, 429, 5xx) sont retentées deux fois.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Délais par défaut (connexion, lecture), en secondes
+DEFAULT_TIMEOUT = (5, 15)
+
+# Connexions gardées ouvertes par hôte : au moins le nombre de recherches simultanées sur une source
+POOL_MAXSIZE = 16
+
+USER_AGENT = 'Ique3Tag/1.0'
+
+# Pour les sites consultés comme un navigateur (pages de résultats Google, Beatport, Qwant)
+BROWSER_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/91.0.4472.124 Safari/537.36')
+
+
+class TimeoutSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        # Un délai est toujours fixé : une source qui ne répond pas ne bloque pas un fil indéfiniment
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+session = None
+session_lock = threading.Lock()
+
+
+def create_session():
+    new_session = TimeoutSession()
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET', 'HEAD'), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    new_session.mount('https://', adapter)
+    new_session.mount('http://', adapter)
+    new_session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Encoding': 'gzip, deflate',
+    })
+    return new_session
+
+
+def get_session():
+    """
+    Retourne la session HTTP partagée (créée au premier appel).
+    """
+    global session
+    with session_lock:
+        if session is None:
+            session = create_session()
+        return session
+
+
+def http_get(url, **kwargs):
+    """
+    requests.get sur la session partagée (mêmes paramètres ; `timeout` par défaut DEFAULT_TIMEOUT).
+    """
+    return get_session().get(url, **kwargs)
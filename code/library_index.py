@@ -0,0 +1,186 @@
+"""
+Index persistant de la bibliothèque (SQLite, dans le dossier cache de l'utilisateur).
+
+Chaque fichier est indexé par son chemin, sa taille et sa date de modification, avec les
+champs lus dans ses tags, l'empreinte (SHA-1) de son image et la position de l'image dans
+le fichier. Les images dont la position n'est pas connue (lecture via mutagen) sont stockées
+une seule fois par empreinte : les pistes d'un même album partagent la même entrée.
+Lors d'un nouveau parcours, seuls les fichiers nouveaux ou modifiés sont relus.
+"""
+import os
+import sqlite3
+
+from tag_reader import TAG_FIELDS
+
+INDEX_DIR = os.path.join(os.getenv('LOCALAPPDATA', os.path.join(os.path.expanduser('~'), '.cache')), 'Ique3Tag')
+INDEX_PATH = os.path.join(INDEX_DIR, 'library_index.sqlite')
+
+# À incrémenter à chaque changement de schéma : l'index est alors reconstruit
+INDEX_VERSION = 2
+
+
+class LibraryIndex:
+    def __init__(self, db_path=INDEX_PATH):
+        """
+        Ouvre (et crée si besoin) l'index de la bibliothèque.
+
+        :param db_path: Chemin du fichier SQLite.
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self.connection.executescript(f"""
+                DROP TABLE IF EXISTS pistes;
+                DROP TABLE IF EXISTS artworks;
+                PRAGMA user_version = {INDEX_VERSION};
+            """)
+        self.indexed_rows = {}
+        self.loaded_folders = set()
+        columns = ', '.join(f'{field} TEXT' for field in TAG_FIELDS)
+        self.connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS pistes (
+                file_path TEXT PRIMARY KEY,
+                folder TEXT,
+                file_name TEXT,
+                file_type TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                {columns},
+                artwork_hash TEXT,
+                image_offset INTEGER,
+                image_length INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS pistes_folder ON pistes (folder);
+            CREATE TABLE IF NOT EXISTS artworks (
+                hash TEXT PRIMARY KEY,
+                data BLOB
+            );
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def split_files(self, files):
+        """
+        Sépare les fichiers déjà indexés et inchangés de ceux qu'il faut relire.
+
+        Args:
+            files (list): Liste de tuples (file_name, path, file_type).
+
+        Returns:
+            tuple: (enregistrements chargés depuis l'index, fichiers à relire)
+        """
+        indexed = self.indexed_rows
+        for path in {path for _, path, _ in files}:
+            # Un dossier est chargé en une seule requête, au premier paquet qui le concerne
+            if path not in self.loaded_folders:
+                self.loaded_folders.add(path)
+                for row in self.connection.execute(
+                        f"SELECT file_path, size, mtime_ns, artwork_hash, image_offset, image_length, "
+                        f"{', '.join(TAG_FIELDS)} FROM pistes WHERE folder = ?", (path,)):
+                    indexed[row[0]] = row
+
+        records = []
+        files_to_parse = []
+        artworks = {}
+        for file_name, path, file_type in files:
+            file_path = path + r'\\' + file_name
+            row = indexed.get(file_path)
+            if row is not None:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    stat = None
+                if stat is not None and row[1] == stat.st_size and row[2] == stat.st_mtime_ns:
+                    record = dict(zip(TAG_FIELDS, row[6:]))
+                    record['artwork_hash'] = row[3]
+                    record['image_offset'] = row[4]
+                    record['image_length'] = row[5]
+                    record['size'] = row[1]
+                    record['mtime_ns'] = row[2]
+                    # L'image est relue dans le fichier à la demande si sa position est connue
+                    record['image_data'] = self.get_artwork(row[3], artworks) if row[4] is None else None
+                    record['file_name'] = file_name
+                    record['path'] = path
+                    record['file_type'] = file_type
+                    record['error'] = None
+                    records.append(record)
+                    continue
+            files_to_parse.append((file_name, path, file_type))
+        return records, files_to_parse
+
+    def get_artwork(self, artwork_hash, artworks):
+        """
+        Retourne les octets d'une image de l'index ; `artworks` sert de cache pour ne
+        charger qu'une fois une image partagée par plusieurs pistes.
+        """
+        if artwork_hash is None:
+            return None
+        if artwork_hash not in artworks:
+            row = self.connection.execute("SELECT data FROM artworks WHERE hash = ?", (artwork_hash,)).fetchone()
+            artworks[artwork_hash] = row[0] if row is not None else None
+        return artworks[artwork_hash]
+
+    def store(self, records):
+        """
+        Enregistre (ou met à jour) des enregistrements produits par tag_reader.read_tag_records
+        (image déjà détachée : empreinte et position, ou octets si la position est inconnue).
+        """
+        rows = []
+        artworks = []
+        for record in records:
+            if record['error'] is not None:
+                continue
+            artwork_hash = record['artwork_hash']
+            if record['image_data']:
+                artworks.append((artwork_hash, record['image_data']))
+            rows.append((record['path'] + r'\\' + record['file_name'], record['path'], record['file_name'],
+                         record['file_type'], record['size'], record['mtime_ns'])
+                        + tuple(record[field] for field in TAG_FIELDS)
+                        + (artwork_hash, record['image_offset'], record['image_length']))
+
+        placeholders = ', '.join('?' * (9 + len(TAG_FIELDS)))
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO artworks (hash, data) VALUES (?, ?)", artworks)
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO pistes (file_path, folder, file_name, file_type, size, mtime_ns, "
+                f"{', '.join(TAG_FIELDS)}, artwork_hash, image_offset, image_length) VALUES ({placeholders})", rows)
+
+    def prune(self, path, file_names):
+        """
+        Supprime de l'index les fichiers du dossier `path` qui n'y sont plus, puis les
+        images qui ne sont plus référencées.
+        """
+        present = {path + r'\\' + file_name for file_name in file_names}
+        stale = [(row[0],) for row in self.connection.execute("SELECT file_path FROM pistes WHERE folder = ?", (path,))
+                 if row[0] not in present]
+        for file_path, in stale:
+            self.indexed_rows.pop(file_path, None)
+        self.delete_pistes(stale)
+
+    def prune_folders(self, root, folders):
+        """
+        Supprime de l'index les fichiers des dossiers sous `root` (compris) où le parcours
+        n'a trouvé aucun fichier audio (dossiers supprimés ou vidés), puis les images qui ne
+        sont plus référencées. Rien n'est supprimé si `root` n'est pas accessible.
+
+        :param folders: Dossiers où le parcours a trouvé des fichiers audio.
+        """
+        if not os.path.isdir(root):
+            return
+        prefix = os.path.join(root, '')
+        stale = [(file_path,) for file_path, folder in self.connection.execute(
+                     "SELECT file_path, folder FROM pistes WHERE folder = ? OR substr(folder, 1, ?) = ?",
+                     (root, len(prefix), prefix))
+                 if folder not in folders]
+        for file_path, in stale:
+            self.indexed_rows.pop(file_path, None)
+        self.delete_pistes(stale)
+
+    def delete_pistes(self, stale):
+        # stale : tuples (file_path,)
+        with self.connection:
+            self.connection.executemany("DELETE FROM pistes WHERE file_path = ?", stale)
+            if stale:
+                self.connection.execute(
+                    "DELETE FROM artworks WHERE hash NOT IN (SELECT artwork_hash FROM pistes WHERE artwork_hash IS NOT NULL)")
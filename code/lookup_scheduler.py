@@ -0,0 +1,138 @@
+"""
+Recherche en tâche de fond des informations de toute une liste de pistes (bouton
+"Rech. Auto. tt Musique").
+
+Plusieurs pistes sont recherchées en même temps (LOOKUP_WORKERS au plus) ; chaque source
+limite en plus ses propres recherches simultanées (voir metadata_providers). L'interface
+n'est jamais bloquée : les résultats et l'avancement arrivent par signaux Qt, traités sur
+le fil de l'interface.
+
+En recherche groupée, un album entier est recherché par une seule tâche (voir album_lookup) ;
+ses pistes non trouvées sont ensuite recherchées une par une.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from album_lookup import lookup_group
+from metadata_providers import query_providers
+
+# Nombre de pistes recherchées en même temps, toutes sources confondues
+LOOKUP_WORKERS = 8
+
+
+class LookupScheduler(QObject):
+    # piste, liste d'IqueMusicTag trouvés
+    track_done = pyqtSignal(object, object)
+    # pistes traitées, nombre total de pistes (groupes compris)
+    progress = pyqtSignal(int, int)
+    # fin de la recherche (toutes les pistes traitées, ou annulation)
+    finished = pyqtSignal()
+
+    def __init__(self, max_workers=LOOKUP_WORKERS, parent=None):
+        """
+        Recherche les informations d'une liste de pistes sur un pool de fils borné.
+
+        Les pistes ne sont pas touchées par les fils : les termes de recherche sont relevés
+        au lancement, et les résultats sont remis par le signal track_done.
+
+        :param max_workers: Nombre de pistes recherchées en même temps.
+        """
+        super().__init__(parent)
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.running = threading.Event()    # effacé pendant une pause
+        self.running.set()
+        self.cancelled = False
+        self.total = 0
+        self.done = 0
+
+    def start(self, jobs, groups=()):
+        """
+        Lance la recherche.
+
+        :param jobs: Liste de tuples (piste, artiste, titre).
+        :param groups: Groupes de pistes recherchés ensemble (voir album_lookup.group_pistes).
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='lookup')
+        self.total = len(jobs) + sum(len(tracks) for _, _, tracks in groups)
+        self.done = 0
+        if not self.total:
+            self.finished.emit()
+            return
+        for artiste_album, album, tracks in groups:
+            self.submit(len(tracks), self.lookup_group, artiste_album, album, tracks)
+        for piste, artiste, titre in jobs:
+            self.submit(1, self.lookup, piste, artiste, titre)
+
+    def submit(self, count, function, *args):
+        # count : nombre de pistes comptées comme traitées à la fin de la tâche, sauf si elle
+        # en retourne un autre
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(functools.partial(self.job_done, count))
+
+    def lookup_group(self, artiste_album, album, tracks):
+        self.running.wait()
+        if self.cancelled:
+            return
+        matched, unmatched = lookup_group(artiste_album, album, tracks)
+        if self.cancelled:
+            return
+        for piste, tracks_info in matched:
+            self.track_done.emit(piste, tracks_info)
+        # Les pistes non trouvées sont confiées à d'autres tâches, qui les compteront
+        submitted = 0
+        for piste, artiste, titre in unmatched:
+            try:
+                self.submit(1, self.lookup, piste, artiste, titre)
+            except RuntimeError:
+                # Recherche annulée pendant ce temps : le pool n'accepte plus de tâche
+                break
+            submitted = submitted + 1
+        return len(tracks) - submitted
+
+    def lookup(self, piste, artiste, titre):
+        # Une pause laisse finir les recherches en cours mais n'en commence pas d'autre
+        self.running.wait()
+        if self.cancelled:
+            return
+        tracks_info = query_providers(artiste, titre)
+        if not self.cancelled:
+            self.track_done.emit(piste, tracks_info)
+
+    def job_done(self, count, future):
+        # Appelé sur le fil de la recherche (ou celui qui annule) : seuls des signaux sont émis
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            count = future.result()
+        with self.lock:
+            self.done = self.done + count
+            done = self.done
+            # Une tâche de groupe qui a confié toutes ses pistes compte 0 : la fin n'est signalée qu'une fois
+            last = count > 0 and done == self.total
+        if count:
+            self.progress.emit(done, self.total)
+        if last:
+            self.executor.shutdown(wait=False)
+            self.finished.emit()
+
+    def is_paused(self):
+        return not self.running.is_set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def cancel(self):
+        """
+        Abandonne les pistes pas encore recherchées ; les recherches en cours se terminent
+        sans donner de résultat.
+        """
+        self.cancelled = True
+        self.running.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
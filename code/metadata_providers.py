@@ -0,0 +1,185 @@
+"""
+Interrogation des bases de données musicales (Discogs, iTunes, Deezer, ...) en parallèle.
+
+Chaque source est enregistrée dans PROVIDERS avec sa fonction de recherche, son délai
+maximal et son nombre de recherches simultanées. query_providers lance toutes les
+recherches en même temps et rassemble les résultats dans l'ordre des sources, dès que la
+plus lente a répondu ou que son délai est dépassé : une recherche dure à peu près le temps
+de la source la plus lente, au lieu de la somme des trois.
+
+Une source peut aussi chercher un album entier (query_album, pour la recherche groupée par
+album, voir album_lookup).
+
+Pour ajouter une source : register_provider('nom', fonction(artiste, titre) -> liste d'IqueMusicTag).
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Provider:
+    def __init__(self, name, lookup, timeout, max_concurrent, album_lookup=None):
+        """
+        Source de données musicales, avec ses propres fils : au plus `max_concurrent`
+        recherches en même temps sur cette source, quel que soit le nombre de pistes
+        recherchées (limite de requêtes des API).
+
+        :param name: Nom affiché dans les messages.
+        :param lookup: Fonction (artiste, titre) -> liste d'IqueMusicTag.
+        :param timeout: Délai maximal d'une recherche, en secondes, compté depuis son début
+            (l'attente d'un fil libre n'est pas comptée).
+        :param max_concurrent: Nombre de recherches en même temps sur cette source.
+        :param album_lookup: Fonction (artiste de l'album, album) -> liste d'IqueMusicTag de
+            toutes les pistes de l'album trouvé (aucune si None).
+        """
+        self.name = name
+        self.lookup = lookup
+        self.album_lookup = album_lookup
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """
+        Lance une recherche (function(*args)) ; retourne (future, liste remplie avec l'heure
+        de début de la recherche).
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                                   thread_name_prefix='provider_' + self.name)
+        started = []
+
+        def run():
+            started.append(time.monotonic())
+            return function(*args)
+
+        return self.executor.submit(run), started
+
+
+PROVIDERS = {}
+
+
+def register_provider(name, lookup, timeout=8.0, max_concurrent=4, album_lookup=None):
+    """
+    Ajoute (ou remplace) une source interrogée par query_providers (et query_album si
+    `album_lookup` est donnée).
+    """
+    PROVIDERS[name] = Provider(name, lookup, timeout, max_concurrent, album_lookup)
+
+
+def gather(names, method, args, description):
+    """
+    Lance la recherche `method` ('lookup' ou 'album_lookup') de chaque source en parallèle
+    et attend les réponses, chacune dans son délai. Retourne {nom de la source: résultat} ;
+    une source en erreur, hors délai ou sans cette recherche n'y est pas.
+    """
+    calls = {}
+    for name in names:
+        function = getattr(PROVIDERS[name], method)
+        if function is not None:
+            future, started = PROVIDERS[name].submit(function, *args)
+            calls[future] = (PROVIDERS[name], started)
+
+    results = {}
+    while calls:
+        done, _ = wait(calls, timeout=0.05, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for future, (provider, started) in list(calls.items()):
+            if future in done:
+                del calls[future]
+                try:
+                    results[provider.name] = future.result()
+                except Exception as e:
+                    print(f"{provider.name} : erreur pour {description} : {e}")
+            elif started and now > started[0] + provider.timeout:
+                # La recherche continue sur son fil, mais on ne l'attend plus
+                del calls[future]
+                print(f"{provider.name} : pas de réponse en {provider.timeout:g} s pour {description}")
+    return results
+
+
+def query_providers(artiste, titre, providers=None):
+    """
+    Interroge les sources en parallèle et rassemble leurs résultats.
+
+    Args:
+        artiste (str): Artiste recherché.
+        titre (str): Titre recherché.
+        providers (list): Noms des sources à interroger (toutes si None).
+
+    Returns:
+        list: Les IqueMusicTag trouvés, source par source dans l'ordre de PROVIDERS. Une source
+            en erreur ou hors délai ne donne aucun résultat.
+    """
+    names = list(PROVIDERS) if providers is None else providers
+    results = gather(names, 'lookup', (artiste, titre), f"{artiste} - {titre}")
+
+    tracks_info = []
+    for name in names:
+        tracks_info.extend(results.get(name, []))
+    return tracks_info
+
+
+def query_album(artiste_album, album, providers=None):
+    """
+    Cherche un album sur les sources en parallèle.
+
+    Args:
+        artiste_album (str): Artiste de l'album.
+        album (str): Titre de l'album.
+        providers (list): Noms des sources à interroger (toutes si None).
+
+    Returns:
+        dict: {nom de la source: liste d'IqueMusicTag de toutes les pistes de l'album}, dans
+            l'ordre de PROVIDERS, pour les sources qui ont trouvé l'album.
+    """
+    names = list(PROVIDERS) if providers is None else providers
+    results = gather(names, 'album_lookup', (artiste_album, album), f"l'album {artiste_album} - {album}")
+    return {name: results[name] for name in names if results.get(name)}
+
+
+def lookup_discogs(artiste, titre):
+    from discogs import get_discogs_track_details
+    return get_discogs_track_details(artiste + " - " + titre, 5)
+
+
+def lookup_itunes(artiste, titre):
+    from apple_music import get_itunes_track_details
+    return get_itunes_track_details(artiste, titre, 5)
+
+
+def lookup_deezer(artiste, titre):
+    from deezer import get_deezer_track_details
+    return get_deezer_track_details(artiste, titre, 3)
+
+
+def lookup_discogs_album(artiste_album, album):
+    from discogs import get_discogs_album_tracks
+    return get_discogs_album_tracks(artiste_album, album)
+
+
+def lookup_itunes_album(artiste_album, album):
+    from apple_music import get_itunes_album_details
+    return get_itunes_album_details(artiste_album, album)
+
+
+def lookup_deezer_album(artiste_album, album):
+    from deezer import get_deezer_album_details
+    return get_deezer_album_details(artiste_album, album)
+
+
+# Discogs charge chaque release trouvée : plus lent que les autres, et limité à 60 requêtes par minute
+register_provider('Discogs', lookup_discogs, timeout=15.0, max_concurrent=2, album_lookup=lookup_discogs_album)
+# L'API de recherche iTunes limite aussi le nombre de requêtes par minute
+register_provider('iTunes', lookup_itunes, timeout=8.0, max_concurrent=3, album_lookup=lookup_itunes_album)
+register_provider('Deezer', lookup_deezer, timeout=8.0, max_concurrent=4, album_lookup=lookup_deezer_album)
+
+
+# Exemple d'utilisation
+if __name__ == '__main__':
+    start = time.perf_counter()
+    for tag in query_providers("Gala", "Freed From desire"):
+        print(f"{tag.get('artiste')} - {tag.get('titre')} ({tag.get('album')}, {tag.get('annee')})")
+    print(f"{time.perf_counter() - start:.2f} s")
@@ -1,5 +1,5 @@
 import musicbrainzngs
-import requests
+from http_session import http_get
 
 # Configurer l'API MusicBrainz
 musicbrainzngs.set_useragent("MonApp", "1.0", "monemail@example.com")
@@ -18,7 +18,7 @@ def get_album_artwork(artist, album):
 
         # Récupérer l'artwork via Cover Art Archive
         cover_art_url = f"https://coverartarchive.org/release/{release_id}/front"
-        response = requests.get(cover_art_url)
+        response = http_get(cover_art_url)
 
         if response.status_code == 200:
             return response.url  # URL de l'image de la pochette
@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tag_reader import read_tag_records
+
+# Nombre de fichiers envoyés à un processus en une seule tâche
+CHUNK_SIZE = 64
+
+# En dessous de ce nombre de fichiers, le démarrage des processus coûte plus qu'il ne rapporte
+PARALLEL_LOADING_THRESHOLD = 200
+
+
+def split_in_chunks(files, chunk_size):
+    return [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+
+def iter_tag_records_parallel(files, max_workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Lit les tags d'une liste de fichiers sur un pool de processus.
+
+    Les fichiers sont découpés en paquets de `chunk_size` ; chaque paquet est lu par un
+    processus et renvoyé dès qu'il est terminé, sans attendre les autres.
+
+    Args:
+        files (list): Liste de tuples (file_name, path, file_type).
+        max_workers (int): Nombre de processus (par défaut : nombre de coeurs).
+        chunk_size (int): Nombre de fichiers par tâche.
+
+    Yields:
+        list: Un paquet d'enregistrements (voir tag_reader.read_tag_records), dans l'ordre de fin.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(read_tag_records, chunk) for chunk in split_in_chunks(files, chunk_size)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+class TagLoadingPipeline:
+    def __init__(self, max_workers=None, chunk_size=CHUNK_SIZE):
+        """
+        Lecture des tags au fil d'un parcours de dossier : les fichiers sont soumis dès
+        qu'ils sont trouvés et les enregistrements récupérés dès qu'ils sont prêts.
+
+        Les premiers fichiers sont lus directement (résultats immédiats, pas de démarrage de
+        processus pour un petit dossier) ; le pool de processus n'est démarré qu'au-delà de
+        PARALLEL_LOADING_THRESHOLD fichiers.
+
+        :param max_workers: Nombre de processus (par défaut : nombre de coeurs).
+        :param chunk_size: Nombre de fichiers par tâche.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.executor = None
+        self.pending = set()
+        self.ready = []
+        self.submitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def submit(self, files):
+        """
+        Soumet une liste de tuples (file_name, path, file_type) à lire.
+        """
+        if not files:
+            return
+        self.submitted = self.submitted + len(files)
+        if self.executor is None:
+            if self.submitted < PARALLEL_LOADING_THRESHOLD or self.max_workers == 1:
+                self.ready.append(read_tag_records(files))
+                return
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        for chunk in split_in_chunks(files, self.chunk_size):
+            self.pending.add(self.executor.submit(read_tag_records, chunk))
+
+    def iter_done(self):
+        """
+        Produit les paquets d'enregistrements déjà prêts, sans attendre les autres.
+        """
+        ready, self.ready = self.ready, []
+        yield from ready
+        done = {future for future in self.pending if future.done()}
+        self.pending = self.pending - done
+        for future in done:
+            yield future.result()
+
+    def iter_remaining(self):
+        """
+        Produit tous les paquets restants, au fur et à mesure qu'ils se terminent.
+        """
+        yield from self.iter_done()
+        pending, self.pending = self.pending, set()
+        for future in as_completed(pending):
+            yield future.result()
@@ -0,0 +1,245 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tag_reader import TAG_FIELDS, read_image_data
+from tag_writing import NeedsRewrite
+from write_journal import JOURNAL_BATCH, fsync_file, read_backup
+
+# Nombre de fichiers écrits en même temps : l'écriture est surtout limitée par le disque,
+# quelques fils suffisent et n'écroulent pas un disque dur ou un partage réseau
+SAVE_WORKERS = 4
+
+# Paquets traités en même temps (pendant qu'un paquet se synchronise, le suivant s'écrit)
+BATCH_WORKERS = 2
+
+# Les fichiers à réécrire en entier passent par une file à part : un seul à la fois, avec
+# une pause entre deux, pour ne pas saturer le disque ou le réseau
+REWRITE_WORKERS = 1
+REWRITE_PAUSE = 0.2
+
+
+def prepare_values(piste, values, normalizer=None):
+    """
+    Normalise l'image à écrire (voir artwork_normalization). Retourne les valeurs à écrire,
+    ou None s'il n'y a finalement rien à écrire.
+
+    Une image (None, None) est celle du fichier : elle est lue ici, sur le fil d'écriture,
+    d'après 'image_file' (octets ou position relevés par prepare_save, sans relire la piste),
+    et n'est réécrite que si la normalisation l'a changée.
+    """
+    if values.get('Image') is not None:
+        image_data, image_mime = values['Image']
+        if image_data is None:
+            # Image du fichier, lue ici plutôt que sur le fil de l'interface
+            file_data, file_path, image_offset, image_length = values['image_file']
+            if file_data is None and image_offset is not None:
+                file_data = read_image_data(file_path, image_offset, image_length)
+            if file_data and normalizer is not None:
+                image_data, image_mime = normalizer.normalize(file_data)
+            if image_data is None or image_data is file_data:
+                # Déjà conforme : rien à réécrire
+                values = {field: value for field, value in values.items() if field != 'Image'}
+            else:
+                values = dict(values, Image=(image_data, image_mime))
+        elif normalizer is not None:
+            values = dict(values, Image=normalizer.normalize(image_data, image_mime))
+    if not any(field in values for field in TAG_FIELDS + ('Image',)):
+        return None
+    return values
+
+
+def write_values(piste, values, allow_rewrite=False):
+    """
+    Écrit des valeurs préparées et retourne l'enregistrement relu, avec 'size' et 'mtime_ns'.
+    """
+    record = piste.write_tag(values, allow_rewrite)
+    # Taille et date après écriture : la piste saura si le fichier change encore (voir tag_diff)
+    stat = os.stat(piste.old_file_name_with_path)
+    record['size'] = stat.st_size
+    record['mtime_ns'] = stat.st_mtime_ns
+    return record
+
+
+def write_batch(jobs, map_function=map, journal=None, normalizer=None, allow_rewrite=False):
+    """
+    Écrit un paquet de pistes en passant par le journal des écritures (voir write_journal) :
+    copies de ce qui va être écrasé et valeurs à écrire enregistrées en une validation,
+    écriture des fichiers, synchronisation de chaque fichier écrit (une fois tout le paquet
+    écrit, en parallèle), puis retrait des entrées en une validation.
+    Un fichier dont l'écriture échoue est aussitôt remis dans son état d'origine.
+
+    Args:
+        jobs (list): Tuples (piste, valeurs préparées par MusiqueFile.prepare_save).
+        map_function: map utilisé à chaque étape (celui d'un pool de fils pour paralléliser).
+        journal (WriteJournal): Journal des écritures (aucun si None).
+
+    Returns:
+        list: Tuples (piste, valeurs, enregistrement relu, erreur), dans l'ordre des pistes.
+            L'enregistrement vaut None si rien n'a été écrit ; l'erreur vaut NeedsRewrite si
+            le tag ne tenait pas (fichier intact).
+    """
+    def prepare(job):
+        piste, values = job
+        try:
+            prepared_values = prepare_values(piste, values, normalizer)
+            if prepared_values is None or journal is None:
+                return prepared_values, None, None
+            backup = read_backup(piste.old_file_name_with_path, piste.file_type, full=allow_rewrite)
+            return prepared_values, backup, None
+        except Exception as e:
+            return None, None, e
+
+    prepared = list(map_function(prepare, jobs))
+    to_write = [index for index, (values, _, error) in enumerate(prepared) if values is not None and error is None]
+    entry_ids = {}
+    if journal is not None and to_write:
+        ids = journal.record([(jobs[index][0], prepared[index][0], prepared[index][1]) for index in to_write])
+        entry_ids = dict(zip(to_write, ids))
+
+    def write(index):
+        piste = jobs[index][0]
+        try:
+            return write_values(piste, prepared[index][0], allow_rewrite), None
+        except NeedsRewrite as e:
+            # Rien n'a été écrit
+            return None, e
+        except Exception as e:
+            if index in entry_ids:
+                try:
+                    journal.rollback(entry_ids.pop(index))
+                except Exception as rollback_error:
+                    # L'entrée reste dans le journal : le fichier sera remis en état au prochain démarrage
+                    print(f"Impossible de remettre en état {piste.old_file_name_with_path} : {rollback_error}")
+            return None, e
+
+    written = dict(zip(to_write, map_function(write, to_write)))
+
+    if journal is not None:
+        # Un fsync par fichier écrit, lancés ensemble après les écritures du paquet ; les
+        # entrées ne sont retirées du journal qu'une fois leur fichier synchronisé
+        def sync(index):
+            try:
+                fsync_file(jobs[index][0].old_file_name_with_path)
+                return True
+            except OSError as e:
+                # L'entrée reste dans le journal
+                print(f"Synchronisation impossible de {jobs[index][0].old_file_name_with_path} : {e}")
+                return False
+
+        to_sync = [index for index, (record, _) in written.items() if record is not None]
+        synced = {index for index, ok in zip(to_sync, map_function(sync, to_sync)) if ok}
+        journal.complete([entry_id for index, entry_id in entry_ids.items()
+                          if index in synced or written[index][0] is None])
+
+    results = []
+    for index, (piste, values) in enumerate(jobs):
+        record, error = written.get(index, (None, prepared[index][2]))
+        results.append((piste, values, record, error))
+    return results
+
+
+class TagSavingPipeline:
+    def __init__(self, max_workers=SAVE_WORKERS, normalizer=None, journal=None, batch_size=JOURNAL_BATCH):
+        """
+        Écriture des tags de plusieurs pistes sur un pool de fils borné, par paquets.
+
+        Les valeurs à écrire sont préparées sur le fil de l'interface (MusiqueFile.prepare_save) ;
+        les fils normalisent les images et exécutent MusiqueFile.write_tag, sans toucher à
+        Qt ni à la piste. Les résultats sont récupérés sur le fil de l'interface, qui les
+        applique aux pistes.
+
+        Chaque paquet passe par le journal des écritures (voir write_batch) : une coupure
+        pendant la sauvegarde ne laisse aucun fichier à moitié écrit.
+
+        Les écritures se font sur place (dans le padding du tag) ; un fichier dont le tag ne
+        tient plus est renvoyé dans la file des réécritures complètes (self.rewritten).
+
+        :param max_workers: Nombre de fichiers écrits en même temps.
+        :param normalizer: ArtworkNormalizer appliqué aux images écrites (aucun si None).
+        :param journal: WriteJournal des écritures (aucun si None).
+        :param batch_size: Nombre de pistes par paquet.
+        """
+        self.normalizer = normalizer
+        self.journal = journal
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+        self.rewrite_executor = ThreadPoolExecutor(max_workers=REWRITE_WORKERS)
+        self.jobs = []      # pistes en attente d'un paquet complet
+        self.pending = {}   # future -> liste de (piste, valeurs)
+        self.cancelled = []
+        self.rewritten = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            # Les paquets commencés vont jusqu'au bout, avec le pool des fils d'écriture
+            self.batch_executor.shutdown(cancel_futures=True)
+            self.rewrite_executor.shutdown(cancel_futures=True)
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+            self.batch_executor = None
+            self.rewrite_executor = None
+
+    def submit(self, piste, values):
+        self.jobs.append((piste, values))
+        if len(self.jobs) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Lance l'écriture des pistes en attente, même si le paquet n'est pas complet.
+        """
+        if self.jobs:
+            jobs, self.jobs = self.jobs, []
+            future = self.batch_executor.submit(write_batch, jobs, self.executor.map, self.journal, self.normalizer)
+            self.pending[future] = jobs
+
+    def rewrite(self, piste, values):
+        results = write_batch([(piste, values)], map, self.journal, self.normalizer, allow_rewrite=True)
+        time.sleep(REWRITE_PAUSE)
+        return results
+
+    def submit_rewrite(self, piste, values):
+        future = self.rewrite_executor.submit(self.rewrite, piste, values)
+        self.pending[future] = [(piste, values)]
+        self.rewritten.append(piste)
+
+    def cancel(self):
+        """
+        Annule les écritures pas encore commencées ; les paquets en cours vont jusqu'au bout
+        (un fichier n'est jamais laissé à moitié écrit).
+        """
+        self.cancelled.extend(piste for piste, _ in self.jobs)
+        self.jobs = []
+        for future, jobs in list(self.pending.items()):
+            if future.cancel():
+                del self.pending[future]
+                self.cancelled.extend(piste for piste, _ in jobs)
+
+    def iter_done(self, timeout=0.05):
+        """
+        Attend au plus `timeout` secondes qu'un paquet se termine, puis produit les
+        écritures terminées : tuples (piste, valeurs, enregistrement relu, erreur).
+        En cas d'erreur, l'enregistrement vaut None. Les fichiers à réécrire en entier ne
+        sont produits qu'une fois la réécriture terminée.
+        """
+        self.flush()
+        done, _ = wait(self.pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            jobs = self.pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(piste, values, None, e) for piste, values in jobs]
+            for piste, values, record, error in results:
+                if isinstance(error, NeedsRewrite):
+                    self.submit_rewrite(piste, values)
+                else:
+                    yield piste, values, record, error
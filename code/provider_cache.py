@@ -0,0 +1,200 @@
+"""
+Cache persistant des réponses des bases de données musicales (SQLite, dans le dossier
+cache de l'utilisateur).
+
+Une réponse est rangée sous le nom de la source et la requête normalisée (minuscules,
+sans accents ni ponctuation, voir search_index.normalize_text) : relancer une recherche
+déjà faite ne refait aucune requête réseau. Les réponses vides sont gardées aussi (moins
+longtemps), pour ne pas redemander sans cesse un titre introuvable.
+
+Chaque source a sa durée de validité (PROVIDER_TTL). Une réponse périmée sert encore quand
+la source ne répond pas (hors connexion). Au-delà de PROVIDER_CACHE_MB, les réponses les
+moins récemment utilisées sont supprimées.
+"""
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from IqueMusicTag import IqueMusicTag
+from library_index import INDEX_DIR
+from search_index import normalize_text
+
+load_dotenv()
+
+CACHE_PATH = os.path.join(INDEX_DIR, 'provider_cache.sqlite')
+
+DAY = 24 * 3600
+
+# Durée de validité d'une réponse, par source (les informations d'une sortie changent rarement)
+PROVIDER_TTL = {
+    'discogs': 30 * DAY,
+    'itunes': 7 * DAY,
+    'deezer': 7 * DAY,
+}
+DEFAULT_TTL = 7 * DAY
+
+# Durée de validité d'une réponse vide (le titre peut être ajouté entre-temps)
+NEGATIVE_TTL = DAY
+
+# Taille maximale des réponses gardées, en Mio ; au-delà, les moins récemment utilisées sont supprimées
+PROVIDER_CACHE_MB = int(os.getenv("PROVIDER_CACHE_MB", "64"))
+
+# La date de dernière utilisation n'est mise à jour qu'au plus une fois par jour (évite une écriture par lecture)
+ACCESS_RESOLUTION = DAY
+
+
+def make_key(args):
+    return ' | '.join(normalize_text(arg) if isinstance(arg, str) else str(arg) for arg in args)
+
+
+def encode_tags(tags):
+    return json.dumps([{slot: tag.get(slot) for slot in IqueMusicTag.__slots__} for tag in tags])
+
+
+def decode_tags(data):
+    return [IqueMusicTag(**values) for values in json.loads(data)]
+
+
+class ProviderCache:
+    def __init__(self, db_path=CACHE_PATH, max_bytes=PROVIDER_CACHE_MB * 1024 * 1024):
+        """
+        Ouvre (et crée si besoin) le cache des réponses. Utilisable depuis plusieurs fils.
+
+        :param db_path: Chemin du fichier SQLite.
+        :param max_bytes: Taille maximale des réponses gardées.
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                provider TEXT,
+                query TEXT,
+                data TEXT,
+                size INTEGER,
+                created REAL,
+                accessed REAL,
+                PRIMARY KEY (provider, query)
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+        """)
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = {}      # source -> réponses servies par le cache
+        self.misses = {}    # source -> requêtes envoyées à la source
+        self.stale = {}     # source -> réponses périmées servies faute de réponse de la source
+
+    def count(self, counter, provider):
+        with self.lock:
+            counter[provider] = counter.get(provider, 0) + 1
+
+    def get(self, provider, query):
+        """
+        Retourne (réponse, périmée) ; réponse None si la requête n'est pas dans le cache.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT data, created, accessed FROM responses WHERE provider = ? AND query = ?",
+                                          (provider, query)).fetchone()
+            if row is None:
+                return None, False
+            data, created, accessed = row
+            if now - accessed > ACCESS_RESOLUTION:
+                with self.connection:
+                    self.connection.execute("UPDATE responses SET accessed = ? WHERE provider = ? AND query = ?",
+                                            (now, provider, query))
+        tags = decode_tags(data)
+        ttl = PROVIDER_TTL.get(provider, DEFAULT_TTL) if tags else NEGATIVE_TTL
+        return tags, now - created > ttl
+
+    def put(self, provider, query, tags):
+        data = encode_tags(tags)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT size FROM responses WHERE provider = ? AND query = ?",
+                                          (provider, query)).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (provider, query, data, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (provider, query, data, len(data), now, now))
+            self.total_bytes = self.total_bytes + len(data) - (row[0] if row is not None else 0)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Appelé sous self.lock : supprime les réponses les moins récemment utilisées jusqu'à 90 % de la taille maximale
+        target = self.max_bytes * 0.9
+        removed = []
+        for provider, query, size in self.connection.execute(
+                "SELECT provider, query, size FROM responses ORDER BY accessed"):
+            if self.total_bytes <= target:
+                break
+            removed.append((provider, query))
+            self.total_bytes = self.total_bytes - size
+        with self.connection:
+            self.connection.executemany("DELETE FROM responses WHERE provider = ? AND query = ?", removed)
+
+    def summary(self):
+        with self.lock:
+            parts = []
+            for provider in sorted(set(self.hits) | set(self.misses) | set(self.stale)):
+                hits = self.hits.get(provider, 0)
+                misses = self.misses.get(provider, 0)
+                stale = self.stale.get(provider, 0)
+                parts.append(f"{provider} : {hits} dans le cache, {misses} requête(s)"
+                             + (f", {stale} réponse(s) périmée(s) servie(s)" if stale else ""))
+        return "Cache des recherches : " + ("; ".join(parts) if parts else "aucune recherche")
+
+
+provider_cache = None
+provider_cache_lock = threading.Lock()
+
+
+def get_provider_cache():
+    """
+    Retourne le cache des réponses partagé (ouvert au premier appel).
+    """
+    global provider_cache
+    with provider_cache_lock:
+        if provider_cache is None:
+            provider_cache = ProviderCache()
+        return provider_cache
+
+
+def cached_lookup(provider):
+    """
+    Décorateur d'une fonction de recherche (arguments -> liste d'IqueMusicTag) : la réponse
+    est reprise du cache si elle est encore valable, sinon demandée à la source et gardée.
+
+    La fonction décorée doit lever une exception en cas d'erreur (réseau, ...) plutôt que
+    retourner une liste vide : une erreur n'est pas gardée, et la réponse périmée éventuelle
+    est retournée à la place (liste vide s'il n'y en a pas).
+    """
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        def lookup(*args, **kwargs):
+            cache = get_provider_cache()
+            query = make_key(args + tuple(value for _, value in sorted(kwargs.items())))
+            tags, stale = cache.get(provider, query)
+            if tags is not None and not stale:
+                cache.count(cache.hits, provider)
+                return tags
+            cache.count(cache.misses, provider)
+            try:
+                result = fetch(*args, **kwargs)
+            except Exception as e:
+                print(f"Erreur lors de la recherche {provider} ({query}) : {e}")
+                if tags is not None:
+                    # Hors connexion : mieux vaut une réponse périmée que rien
+                    cache.count(cache.stale, provider)
+                    return tags
+                return []
+            cache.put(provider, query, result)
+            return result
+        return lookup
+    return decorator
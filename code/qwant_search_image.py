@@ -1,8 +1,10 @@
 import requests
 
+from http_session import BROWSER_USER_AGENT, http_get
+
 def qwant_get_image_urls(query, count):
     try:
-        r = requests.get("https://api.qwant.com/v3/search/images",
+        r = http_get("https://api.qwant.com/v3/search/images",
             params={
                 'count': count,
                 'q': query,
@@ -13,7 +15,7 @@ def qwant_get_image_urls(query, count):
                 'device': 'desktop'
             },
             headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.87 Safari/537.36'
+                'User-Agent': BROWSER_USER_AGENT
             }
         )
 
@@ -0,0 +1,205 @@
+"""
+Cache des sorties (albums) des bases de données musicales : la liste complète des pistes
+d'une sortie, rangée sous son identifiant chez la source (release Discogs, collection
+iTunes, album Deezer).
+
+Quand un dossier contient un album entier, la première piste recherchée charge la sortie ;
+les pistes suivantes sont retrouvées dans cette sortie, sans aucune requête réseau. Seules
+les sorties où une piste a déjà été trouvée servent ainsi (pas les autres releases
+examinées par une recherche, souvent des compilations). Les sorties sont aussi gardées sur
+disque (SQLite, dans le dossier cache de l'utilisateur) pour les sessions suivantes.
+"""
+import difflib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from library_index import INDEX_DIR
+from provider_cache import DEFAULT_TTL, PROVIDER_TTL, decode_tags, encode_tags
+from search_index import normalize_text
+
+CACHE_PATH = os.path.join(INDEX_DIR, 'release_cache.sqlite')
+
+# Sorties gardées en mémoire (celles où une piste a été trouvée sont cherchées avant toute requête)
+SESSION_RELEASES = 64
+
+# Ressemblance minimale pour reprendre une piste d'une sortie déjà chargée sans interroger la
+# source (plus stricte que dans une sortie trouvée par la recherche : on ne cherche pas ailleurs)
+SESSION_MATCH_CUTOFF = 0.8
+
+
+def match_track(tags, artiste, titre, cutoff=0.6):
+    """
+    Retourne l'IqueMusicTag de la liste qui ressemble le plus à "artiste - titre", ou None.
+    """
+    searched = normalize_text(artiste + " - " + titre if artiste else titre)
+    candidates = [normalize_text(f"{tag.get('artiste') or ''} - {tag.get('titre') or ''}"
+                                 if artiste else tag.get('titre')) for tag in tags]
+    matches = difflib.get_close_matches(searched, candidates, n=1, cutoff=cutoff)
+    if matches:
+        return tags[candidates.index(matches[0])]
+    return None
+
+
+class ReleaseCache:
+    def __init__(self, db_path=CACHE_PATH, session_size=SESSION_RELEASES):
+        """
+        Ouvre (et crée si besoin) le cache des sorties. Utilisable depuis plusieurs fils.
+
+        :param db_path: Chemin du fichier SQLite.
+        :param session_size: Nombre de sorties gardées en mémoire.
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.session_size = session_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS releases (
+                    provider TEXT,
+                    release_id TEXT,
+                    data TEXT,
+                    created REAL,
+                    PRIMARY KEY (provider, release_id)
+                )
+            """)
+            # Les sorties trop anciennes seront rechargées : inutile de les garder
+            self.connection.execute("DELETE FROM releases WHERE created < ?",
+                                    (time.time() - max(list(PROVIDER_TTL.values()) + [DEFAULT_TTL]),))
+        self.session = OrderedDict()    # (source, identifiant) -> liste d'IqueMusicTag, la plus récente en dernier
+        self.loading = {}               # (source, identifiant) -> Future des sorties en cours de chargement
+        self.matched = set()            # (source, identifiant) des sorties où une piste a été trouvée
+        self.session_hits = 0           # pistes trouvées dans les sorties de la session
+        self.disk_hits = 0              # sorties reprises du disque
+        self.fetched = 0                # sorties chargées depuis la source
+
+    def remember(self, key, tags):
+        # Appelé sous self.lock
+        self.session[key] = tags
+        self.session.move_to_end(key)
+        while len(self.session) > self.session_size:
+            self.matched.discard(self.session.popitem(last=False)[0])
+
+    def mark_matched(self, provider, release_id):
+        """
+        Note qu'une piste recherchée a été trouvée dans la sortie : les autres pistes
+        pourront y être cherchées par find_track.
+        """
+        with self.lock:
+            if (provider, str(release_id)) in self.session:
+                self.matched.add((provider, str(release_id)))
+
+    def find_track(self, provider, artiste, titre, num_results=1):
+        """
+        Cherche la piste dans les sorties de la source où une piste a déjà été trouvée
+        pendant la session, de la plus récente à la plus ancienne. Retourne une liste
+        d'IqueMusicTag (vide si la piste n'y est pas).
+
+        Une seule piste est retournée, quel que soit `num_results` : la piste de l'album
+        déjà trouvé suffit, sans requête pour les autres résultats.
+        """
+        found = self.find_release(provider, artiste, titre)
+        if found is None:
+            return []
+        with self.lock:
+            self.session_hits = self.session_hits + 1
+        return [found[1]]
+
+    def find_release(self, provider, artiste, titre):
+        """
+        Cherche la piste comme find_track. Retourne (pistes de la sortie, piste trouvée), ou
+        None si elle n'est dans aucune sortie de la source où une piste a été trouvée.
+        """
+        with self.lock:
+            releases = [(key, tags) for key, tags in reversed(self.session.items())
+                        if key[0] == provider and key in self.matched]
+        for key, tags in releases:
+            tag = match_track(tags, artiste, titre, SESSION_MATCH_CUTOFF)
+            if tag is not None:
+                with self.lock:
+                    if key in self.session:
+                        self.session.move_to_end(key)
+                return tags, tag
+        return None
+
+    def get_release(self, provider, release_id, load):
+        """
+        Retourne les pistes d'une sortie : depuis la session, depuis le disque si elles y
+        sont encore valables, sinon par `load()` (requête à la source), puis gardées.
+        Une sortie demandée par plusieurs fils en même temps n'est chargée qu'une fois.
+
+        :param provider: Nom de la source ('discogs', 'itunes', 'deezer').
+        :param release_id: Identifiant de la sortie chez la source.
+        :param load: Fonction sans argument -> liste d'IqueMusicTag de toutes les pistes.
+        """
+        key = (provider, str(release_id))
+        with self.lock:
+            if key in self.session:
+                self.session.move_to_end(key)
+                return self.session[key]
+            future = self.loading.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.loading[key] = future
+        if not owner:
+            # Chargée par un autre fil
+            return future.result()
+
+        try:
+            tags = self.read(key)
+            if tags is None:
+                tags = load()
+                self.write(key, tags)
+                with self.lock:
+                    self.fetched = self.fetched + 1
+            else:
+                with self.lock:
+                    self.disk_hits = self.disk_hits + 1
+        except Exception as e:
+            with self.lock:
+                del self.loading[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.remember(key, tags)
+            del self.loading[key]
+        future.set_result(tags)
+        return tags
+
+    def read(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT data, created FROM releases WHERE provider = ? AND release_id = ?",
+                                          key).fetchone()
+        if row is None or time.time() - row[1] > PROVIDER_TTL.get(key[0], DEFAULT_TTL):
+            return None
+        return decode_tags(row[0])
+
+    def write(self, key, tags):
+        data = encode_tags(tags)
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO releases (provider, release_id, data, created) "
+                                    "VALUES (?, ?, ?, ?)", key + (data, time.time()))
+
+    def summary(self):
+        with self.lock:
+            return (f"Sorties : {self.session_hits} piste(s) trouvée(s) dans les sorties déjà chargées, "
+                    f"{self.fetched} sortie(s) chargée(s), {self.disk_hits} reprise(s) du disque")
+
+
+release_cache = None
+release_cache_lock = threading.Lock()
+
+
+def get_release_cache():
+    """
+    Retourne le cache des sorties partagé (ouvert au premier appel).
+    """
+    global release_cache
+    with release_cache_lock:
+        if release_cache is None:
+            release_cache = ReleaseCache()
+        return release_cache
@@ -0,0 +1,206 @@
+"""
+Index de recherche par trigrammes sur le nom de fichier, le titre, les artistes et l'album
+des pistes chargées, pour filtrer la liste à chaque frappe.
+
+La recherche ignore les accents et la casse. Chaque mot de la requête doit se retrouver
+dans la piste : d'abord tel quel, sinon de façon approchée (assez de trigrammes en commun)
+pour tolérer une faute de frappe ; seules les pistes les plus proches sont gardées.
+
+Les bigrammes et trigrammes de chaque mot sont indexés dans des array d'entiers (4 octets
+par piste) : pour un mot de la requête, seule la plus courte des listes de ses n-grammes
+est parcourue, et chaque candidat est vérifié sur son texte.
+"""
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+# Part minimale des trigrammes d'un mot qu'une piste doit contenir en recherche approchée
+FUZZY_THRESHOLD = 0.5
+
+# Les trigrammes présents dans plus de cette part des pistes n'aident pas à départager
+# les candidats de la recherche approchée : ils sont ignorés
+FUZZY_MAX_POSTING_RATIO = 0.2
+
+# Ligatures que la décomposition Unicode ne sépare pas
+LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae'})
+
+ACCENTS = re.compile('[\u0300-\u036f]')
+SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_text(text):
+    """
+    Minuscules, sans accents, ponctuation remplacée par des espaces.
+    """
+    if not text:
+        return ''
+    text = str(text)
+    if not text.isascii():
+        text = ACCENTS.sub('', unicodedata.normalize('NFKD', text)).translate(LIGATURES)
+    return SEPARATORS.sub(' ', text.casefold()).strip()
+
+
+def word_grams(word):
+    """
+    Les n-grammes qui servent à chercher un mot : ses trigrammes, ou le mot lui-même
+    s'il a deux lettres (un mot d'une lettre n'en a pas).
+    """
+    if len(word) == 2:
+        return {word}
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def text_grams(text):
+    """
+    Bigrammes et trigrammes de chaque mot du texte.
+    """
+    grams = set()
+    for word in text.split():
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def searchable_text(piste):
+    return normalize_text(' '.join(str(value) for value in (
+        piste.get_name_in_list(), piste.Titre, piste.ArtisteAll, piste.Album) if value))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # n-gramme -> array des numéros de pistes
+        self.ids = {}       # piste -> numéro
+        self.pistes = []    # numéro -> piste (None si retirée)
+        self.texts = []     # numéro -> texte normalisé
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, piste):
+        self.update(piste)
+
+    def add_many(self, pistes):
+        for piste in pistes:
+            self.update(piste)
+
+    def remove(self, piste):
+        piste_id = self.ids.pop(piste, None)
+        if piste_id is None:
+            return
+        for gram in text_grams(self.texts[piste_id]):
+            self.discard(gram, piste_id)
+        self.pistes[piste_id] = None
+        self.texts[piste_id] = ''
+
+    def clear(self):
+        self.postings = {}
+        self.ids = {}
+        self.pistes = []
+        self.texts = []
+
+    def discard(self, gram, piste_id):
+        ids = self.postings.get(gram)
+        if ids is not None:
+            ids.remove(piste_id)
+            if not ids:
+                del self.postings[gram]
+
+    def update(self, piste):
+        """
+        Indexe une piste, ou la réindexe après modification (seuls les n-grammes
+        ajoutés ou disparus sont touchés).
+        """
+        text = searchable_text(piste)
+        piste_id = self.ids.get(piste)
+        if piste_id is None:
+            piste_id = len(self.pistes)
+            self.ids[piste] = piste_id
+            self.pistes.append(piste)
+            self.texts.append('')
+            old_grams = set()
+        elif text == self.texts[piste_id]:
+            return
+        else:
+            old_grams = text_grams(self.texts[piste_id])
+
+        new_grams = text_grams(text)
+        for gram in old_grams - new_grams:
+            self.discard(gram, piste_id)
+        for gram in new_grams - old_grams:
+            ids = self.postings.get(gram)
+            if ids is None:
+                self.postings[gram] = array('I', (piste_id,))
+            else:
+                ids.append(piste_id)
+        self.texts[piste_id] = text
+
+    def word_candidates(self, word):
+        """
+        Numéros des pistes qui peuvent contenir le mot : la plus courte liste parmi ses
+        n-grammes, None pour un mot d'une lettre (toutes les pistes sont candidates).
+        """
+        grams = word_grams(word)
+        if not grams:
+            return None
+        return min((self.postings.get(gram, ()) for gram in grams), key=len)
+
+    def match_exact(self, words):
+        texts = self.texts
+        candidates = {word: self.word_candidates(word) for word in set(words)}
+        # On part du mot le plus sélectif ; les mots suivants ne font que filtrer
+        words = sorted(candidates, key=lambda word: len(texts) if candidates[word] is None
+                       else len(candidates[word]))
+        first = words[0]
+        if candidates[first] is None:
+            ids = [i for i, text in enumerate(texts) if first in text]
+        elif len(first) <= 3:
+            # Le n-gramme est le mot lui-même : pas de vérification
+            ids = candidates[first]
+        else:
+            ids = [i for i in candidates[first] if first in texts[i]]
+        for word in words[1:]:
+            if not ids:
+                break
+            ids = [i for i in ids if word in texts[i]]
+        return set(map(self.pistes.__getitem__, ids))
+
+    def match_fuzzy(self, word):
+        """
+        Pistes qui ont le plus de trigrammes du mot en commun, s'il y en a au moins
+        FUZZY_THRESHOLD (les trigrammes trop fréquents ne comptent pas).
+        """
+        max_posting = max(1, int(len(self.ids) * FUZZY_MAX_POSTING_RATIO))
+        useful = [gram for gram in word_grams(word) if 0 < len(self.postings.get(gram, ())) <= max_posting]
+        if not useful:
+            return set()
+        counts = Counter()
+        for gram in useful:
+            counts.update(self.postings[gram])
+        best = max(counts.values())
+        if best < len(useful) * FUZZY_THRESHOLD:
+            return set()
+        return {self.pistes[i] for i, count in counts.items() if count == best}
+
+    def search(self, query, fuzzy=True):
+        """
+        Retourne l'ensemble des pistes qui correspondent à tous les mots de la requête,
+        ou None si la requête est vide (pas de filtre).
+        """
+        words = normalize_text(query).split()
+        if not words:
+            return None
+        result = self.match_exact(words)
+        if result or not fuzzy:
+            return result
+
+        # Aucun résultat exact : chaque mot introuvable tel quel est cherché de façon approchée
+        result = None
+        for word in sorted(words, key=len, reverse=True):
+            matches = self.match_exact([word])
+            if not matches and len(word) > 3:
+                matches = self.match_fuzzy(word)
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result
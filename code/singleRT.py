@@ -1,20 +1,28 @@
 import sys
 
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import Qt, QSize, QItemSelectionModel
-from PyQt5.QtWidgets import (QApplication,
+from PyQt5.QtCore import Qt, QSize, QItemSelectionModel, QTimer
+from PyQt5.QtWidgets import (QApplication, QCheckBox,
                              QDial, QDialog, QGridLayout, QGroupBox, QHBoxLayout, QLabel, QLineEdit,
-                             QProgressBar, QPushButton, QListWidget,
+                             QProgressBar, QPushButton,
                              QTableWidget, QWidget, QTableWidgetItem, QAbstractItemView, QCompleter, QMenu, QAction,
+                             QMessageBox,
                              )
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import QBuffer
 
 import os
-import mutagen
-from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, TIT2, TPE1, TPE2, TALB, TRCK, TPOS, TCON,TDRC, TXXX, APIC
 
+from tag_reader import (TAG_FIELDS, detach_image, guess_image_mime, image_dimensions, image_hash,
+                        read_image_data, read_tag_record)
+from artwork_cache import ArtworkEncoder, artwork_cache
+from IqueMusicTag import intern_value
+from track_list_model import TrackListModel, create_track_list_view
+from catalogue import TrackCatalog
+from tag_writing import save_tag, write_stats
+from search_index import SearchIndex
+from tag_diff import NEW_IMAGE
+
 import re
 import discogs_client
 
@@ -29,19 +37,6 @@ load_dotenv()
 # Récupérer le token depuis l'environnement
 my_discogs_user_token = os.getenv("DISCOGS_USER_TOKEN")
 
-def convert_qpixmap_to_bytes(qpixmap, image_format='JPEG'):
-    # Convertir le QPixmap en bytes en utilisant QBuffer
-    buffer = QBuffer()
-    buffer.open(QBuffer.ReadWrite)
-    qpixmap.save(buffer, image_format)
-    return buffer.data().data()
-
-def extract_unitary(audio, string):
-    try:
-        return str(audio[string][0])
-    except:
-        return ''
-
 def extraire_tag_from_filename(chaine):
     """
     Traite une chaîne de texte pour extraire les informations de l'artiste, du titre,
@@ -198,13 +193,17 @@ class MyTableWidget(QTableWidget):
                 self.photo_viewer.fill_with_blank()
 
     def display_image_from_url(self, url):
-        pixmap = create_pixmap_from_url(url)
-        self.photo_viewer.update_from_pixmap(pixmap)
+        pixmap, image_data, image_mime = create_artwork_from_url(url)
+        self.photo_viewer.update_from_pixmap(pixmap, image_data, image_mime)
 
 class photoViewer:
     def __init__(self):
         self.Image = ImageLabel()
         self.pixmap_original = None
+        self.image_data = None      # octets d'origine de l'image choisie (téléchargée ou copiée), s'ils sont connus
+        self.image_mime = None
+        self.song_info = None       # piste dont l'image est affichée, décodée à la demande
+        self.modified = False       # l'image a été changée depuis update_from_song_info
         self.labelPictureInformation = QLabel("-")
         self.labelPictureInformation.setAlignment(Qt.AlignCenter)
         self.labelPictureInformation.mousePressEvent = self.on_label_click  # Connecter l'événement de clic
@@ -213,8 +212,29 @@ class photoViewer:
         self.Image.setContextMenuPolicy(Qt.CustomContextMenu)
         self.Image.customContextMenuRequested.connect(self.show_context_menu)
 
-    def update_from_pixmap(self, pixmap):
-        """Met à jour le viewer avec le pixmap téléchargé."""
+    def update_from_song_info(self, song_info):
+        """Affiche la vignette de l'image d'une piste, sans décoder l'image en taille réelle."""
+        thumbnail = song_info.get_thumbnail(300)
+        if thumbnail is None:
+            self.fill_with_blank()
+        else:
+            self.pixmap_original = None
+            self.song_info = song_info
+            self.Image.setPixmap(thumbnail)
+            image_size = song_info.get_image_size()
+            if image_size is not None:
+                self.labelPictureInformation.setText(str(image_size[1]) + "x" + str(image_size[0]))
+        self.modified = False
+
+    def is_modified(self):
+        return self.modified
+
+    def update_from_pixmap(self, pixmap, image_data=None, image_mime=None):
+        """Met à jour le viewer avec le pixmap téléchargé (et ses octets d'origine s'ils sont connus)."""
+        self.song_info = None
+        self.modified = True
+        self.image_data = image_data
+        self.image_mime = image_mime
         if pixmap is None:
             self.Image.fill_with_blank()
             self.pixmap_original = None
@@ -231,10 +251,24 @@ class photoViewer:
         self.Image.fill_with_blank()
         self.labelPictureInformation.setText("-")
         self.pixmap_original = None
+        self.image_data = None
+        self.image_mime = None
+        self.song_info = None
 
     def get_pixmap_original(self):
+        if self.pixmap_original is None and self.song_info is not None:
+            return self.song_info.Image
         return self.pixmap_original
 
+    def get_image_bytes(self):
+        """
+        Retourne (octets, type MIME) de l'image affichée, (None, None) si seuls ses pixels
+        sont connus.
+        """
+        if self.pixmap_original is None and self.song_info is not None:
+            return self.song_info.get_image_data(), self.song_info.image_mime
+        return self.image_data, self.image_mime
+
     def show_context_menu(self, pos):
         """Affiche le menu contextuel pour supprimer ou ajouter une image."""
         context_menu = QMenu(self.Image)
@@ -256,6 +290,10 @@ class photoViewer:
         """Supprime l'image affichée."""
         self.Image.fill_with_blank()
         self.pixmap_original = None
+        self.image_data = None
+        self.image_mime = None
+        self.song_info = None
+        self.modified = True
         self.labelPictureInformation.setText("-")
 
     def add_image_from_clipboard(self):
@@ -264,6 +302,14 @@ class photoViewer:
         pixmap = clipboard.pixmap()
 
         if not pixmap.isNull():
+            # Octets d'origine de l'image s'ils sont dans le presse-papier (copie depuis un navigateur...)
+            mime_data = clipboard.mimeData()
+            for image_mime in ('image/jpeg', 'image/png'):
+                if mime_data.hasFormat(image_mime):
+                    image_data = bytes(mime_data.data(image_mime))
+                    if guess_image_mime(image_data) == image_mime:
+                        self.update_from_pixmap(pixmap, image_data, image_mime)
+                        return
             self.update_from_pixmap(pixmap)
         else:
             # Si le presse-papier ne contient pas d'image, vérifier si le texte est une URL.
@@ -271,14 +317,15 @@ class photoViewer:
 
             # Vérifier si le texte du presse-papier est une URL valide
             if clipboard_text.startswith("http://") or clipboard_text.startswith("https://"):
-                pixmap_from_url = create_pixmap_from_url(clipboard_text)
-                if not pixmap_from_url.isNull():
-                    self.update_from_pixmap(pixmap_from_url)
+                pixmap_from_url, image_data, image_mime = create_artwork_from_url(clipboard_text)
+                if pixmap_from_url is not None:
+                    self.update_from_pixmap(pixmap_from_url, image_data, image_mime)
 
     def on_label_click(self, event):
         """Ouvre la fenêtre avec l'image originale lorsque le label est cliqué."""
-        if self.pixmap_original is not None:
-            self.open_image_window(self.pixmap_original)
+        pixmap = self.get_pixmap_original()
+        if pixmap is not None:
+            self.open_image_window(pixmap)
 
     def open_image_window(self, pixmap):
         """Crée une fenêtre pour afficher l'image à sa taille originale."""
@@ -331,12 +378,16 @@ class ImageLabel(QLabel):
 
 
 class MusiqueFile:
+    # Pas de __dict__ par piste : les attributs sont fixés ici
+    __slots__ = ('old_file_name', 'old_file_name_with_path', 'name_in_list', 'file_type') + TAG_FIELDS + (
+        'image_data', 'image_mime', 'image_offset', 'image_length', 'artwork_hash', 'image_pixmap', 'dirty_fields',
+        'disk_state', 'file_size', 'file_mtime_ns', 'tracks_info')
+
     def __init__(self, old_file_name, path):
         super().__init__()
-        self.audio_file = None
-        self.metadata = None
         self.old_file_name = old_file_name
         self.old_file_name_with_path = path + r'\\' + old_file_name
+        self.name_in_list = old_file_name
         self.file_type = None
         self.Artiste = None
         self.Titre = None
@@ -351,19 +402,255 @@ class MusiqueFile:
         self.Track = None
         self.Album = None
         self.ArtisteAlbum = None
-        self.Image = None        # image qu'on a choisi
+        self.image_data = None      # octets de l'image (du fichier si sa position n'est pas connue, ou choisie)
+        self.image_mime = None      # type MIME de l'image choisie
+        self.image_offset = None    # position de l'image dans le fichier
+        self.image_length = None
+        self.artwork_hash = None    # empreinte de l'image, clé du cache d'images
+        self.image_pixmap = None    # image qu'on a choisi (remplace celle du fichier)
+        self.dirty_fields = None    # champs modifiés depuis la lecture ou la dernière sauvegarde ('Image' pour l'image)
+        self.disk_state = None      # valeurs du fichier gardées à la première modification (voir keep_disk_state)
+        self.file_size = None       # taille et date du fichier lors de la lecture, pour savoir s'il a changé depuis
+        self.file_mtime_ns = None
         self.tracks_info = []    # data trouvé sur internet
 
     def get_name_in_list(self):
-        return self.old_file_name
+        return self.name_in_list
+
+    def get_folder(self):
+        # old_file_name_with_path = dossier + r'\\' + old_file_name
+        return self.old_file_name_with_path[:-len(self.old_file_name) - 2]
+
+    def extract_tag(self):
+        self.set_data_from_record(detach_image(read_tag_record(self.old_file_name_with_path, self.file_type)))
+
+    def set_data_from_record(self, record):
+        """
+        Remplit les champs à partir d'un enregistrement produit par tag_reader.
+        L'image n'est pas décodée : seuls ses octets (ou sa position dans le fichier) sont gardés.
+        """
+        for field in TAG_FIELDS:
+            setattr(self, field, intern_value(record[field]))
+        self.set_image_from_record(record)
+        self.dirty_fields = None
+        self.disk_state = None
+        self.file_size = record.get('size')
+        self.file_mtime_ns = record.get('mtime_ns')
+
+    def set_image_from_record(self, record):
+        """
+        Reprend l'image du fichier (ou sa position) d'un enregistrement produit par tag_reader.
+        L'image choisie n'est alors plus gardée en mémoire.
+        """
+        self.image_data = record['image_data']
+        self.image_mime = None
+        self.image_offset = record['image_offset']
+        self.image_length = record['image_length']
+        self.artwork_hash = intern_value(record['artwork_hash'])
+        self.image_pixmap = None
+
+    def get_image_data(self):
+        """
+        Retourne les octets de l'image du fichier, relus sur le disque si besoin.
+        """
+        if self.image_data is not None:
+            return self.image_data
+        if self.image_offset is not None:
+            return read_image_data(self.old_file_name_with_path, self.image_offset, self.image_length)
+        return None
 
-    def extract_image(self):
-        for tag in self.metadata.tags.values():
-            if tag.FrameID == 'APIC':
-                pixmap = QPixmap()
-                pixmap.loadFromData(tag.data)
-                self.Image = pixmap
-                break
+    def has_image(self):
+        return self.image_pixmap is not None or self.artwork_hash is not None
+
+    @property
+    def Image(self):
+        """
+        Image en taille réelle : celle choisie dans l'éditeur, sinon celle du fichier,
+        décodée à la demande via le cache d'images.
+        """
+        if self.image_pixmap is not None:
+            return self.image_pixmap
+        if self.artwork_hash is None:
+            return None
+        return artwork_cache.get_pixmap(self.artwork_hash, self.get_image_data)
+
+    @Image.setter
+    def Image(self, pixmap):
+        self.set_image(pixmap)
+
+    def set_image(self, pixmap, image_data=None, image_mime=None):
+        """
+        Remplace l'image de la piste (None pour la supprimer).
+
+        Si les octets d'origine de l'image sont connus (image du fichier, téléchargée ou
+        copiée), ils sont gardés et seront écrits tels quels, sans réencodage ; le QPixmap
+        va alors dans le cache d'images au lieu d'être gardé par la piste.
+        """
+        if image_data is not None:
+            image_mime = image_mime or guess_image_mime(image_data)
+            if image_mime not in ('image/jpeg', 'image/png'):
+                # Format qu'on n'écrit pas tel quel : l'image sera encodée
+                image_data = None
+        self.keep_disk_state()
+        self.image_offset = None
+        self.image_length = None
+        if image_data is None:
+            self.image_pixmap = pixmap
+            self.image_data = None
+            self.image_mime = None
+            self.artwork_hash = None
+        else:
+            self.image_pixmap = None
+            self.image_data = bytes(image_data)
+            self.image_mime = image_mime
+            self.artwork_hash = intern_value(image_hash(self.image_data))
+            if pixmap is not None:
+                artwork_cache.put((self.artwork_hash, None), pixmap)
+        self.mark_dirty('Image')
+
+    def get_image_source(self):
+        # Identifie l'image choisie, pour savoir si elle a changé pendant une écriture
+        return self.image_pixmap, self.artwork_hash
+
+    def get_new_artwork_hash(self):
+        # Empreinte de l'image à écrire : None si supprimée, NEW_IMAGE si pas encore encodée
+        if not self.has_image():
+            return None
+        if self.image_pixmap is not None:
+            return NEW_IMAGE
+        return self.artwork_hash
+
+    def keep_disk_state(self):
+        """
+        Garde les valeurs du fichier avant la première modification de la piste : elles
+        servent à comparer la piste au fichier sans le relire (voir tag_diff).
+        """
+        if self.disk_state is None:
+            self.disk_state = tuple(getattr(self, field) for field in TAG_FIELDS) + (self.artwork_hash,)
+
+    def get_disk_state(self):
+        """
+        Valeurs du fichier (champs et 'artwork_hash') lors de la lecture ou de la dernière sauvegarde.
+        """
+        if self.disk_state is None:
+            state = tuple(getattr(self, field) for field in TAG_FIELDS) + (self.artwork_hash,)
+        else:
+            state = self.disk_state
+        return dict(zip(TAG_FIELDS + ('artwork_hash',), state))
+
+    def mark_dirty(self, field):
+        if self.dirty_fields is None:
+            self.dirty_fields = set()
+        self.dirty_fields.add(field)
+
+    def mark_clean(self, field):
+        if self.dirty_fields is not None:
+            self.dirty_fields.discard(field)
+            if not self.dirty_fields:
+                # Plus rien de modifié : la piste est identique au fichier
+                self.dirty_fields = None
+                self.disk_state = None
+
+    def set_field(self, field, value):
+        """
+        Change un champ du tag ; il n'est marqué modifié que si sa valeur change.
+        """
+        value = intern_value(value)
+        if getattr(self, field) != value:
+            self.keep_disk_state()
+            setattr(self, field, value)
+            self.mark_dirty(field)
+
+    def is_modified(self):
+        return bool(self.dirty_fields)
+
+    def prepare_save(self, encoder=None):
+        """
+        Valeurs à écrire : les champs modifiés et, si elle a changé, l'image sous la forme
+        (octets, type MIME), None pour la supprimer. À appeler sur le fil de l'interface.
+
+        :param encoder: ArtworkEncoder partagé par les pistes d'une même sauvegarde, pour les
+            images sans octets d'origine (une image commune n'est encodée qu'une fois).
+        """
+        values = {field: getattr(self, field) for field in self.dirty_fields if field != 'Image'}
+        if 'Image' in self.dirty_fields:
+            if not self.has_image():
+                values['Image'] = None
+            elif self.image_mime is not None:
+                # Octets d'origine de l'image choisie, écrits tels quels s'ils sont dans les limites
+                values['Image'] = (self.image_data, self.image_mime)
+            elif self.image_pixmap is None:
+                # Image du fichier : lue par le fil d'écriture (voir parallel_saving.prepare_values),
+                # d'après sa position relevée ici (la piste peut changer pendant l'écriture)
+                values['Image'] = (None, None)
+                values['image_file'] = (self.image_data, self.old_file_name_with_path,
+                                        self.image_offset, self.image_length)
+            else:
+                if encoder is None:
+                    encoder = ArtworkEncoder()
+                values['Image'] = encoder.encode(self.image_pixmap)
+            # Pour savoir après l'écriture si l'image a été changée entre-temps (non écrit dans le fichier)
+            values['image_source'] = self.get_image_source()
+        return values
+
+    def apply_saved(self, values, record):
+        """
+        Après l'écriture de `values` (voir write_tag) : les champs écrits ne sont plus
+        modifiés, sauf s'ils ont encore changé pendant l'écriture, et la position de l'image
+        est relue (le tag a pu être réécrit et l'image déplacée dans le fichier).
+        `record` vaut None si rien n'a finalement été écrit ; sinon il devient l'état du
+        disque auquel la piste est comparée (voir tag_diff).
+        """
+        if record is not None:
+            self.disk_state = tuple(intern_value(record[field]) for field in TAG_FIELDS) + (record['artwork_hash'],)
+            self.file_size = record.get('size')
+            self.file_mtime_ns = record.get('mtime_ns')
+        for field, value in values.items():
+            if field in TAG_FIELDS and getattr(self, field) == value:
+                self.dirty_fields.discard(field)
+        source = values.get('image_source')
+        if 'Image' not in self.dirty_fields or (
+                source is not None and source[0] is self.image_pixmap and source[1] == self.artwork_hash):
+            if record is not None:
+                self.set_image_from_record(record)
+            self.dirty_fields.discard('Image')
+        if not self.dirty_fields:
+            self.dirty_fields = None
+            self.disk_state = None
+
+    def saveTag(self):
+        """
+        Écrit les champs modifiés dans le fichier (rien si la piste n'a pas été modifiée).
+        """
+        from artwork_normalization import ArtworkNormalizer
+        from parallel_saving import write_batch
+        from tag_writing import NeedsRewrite
+        from write_journal import WriteJournal
+        if self.is_modified():
+            values = self.prepare_save()
+            normalizer = ArtworkNormalizer()
+            with WriteJournal() as journal:
+                _, _, record, error = write_batch([(self, values)], map, journal, normalizer)[0]
+                if isinstance(error, NeedsRewrite):
+                    # Le tag ne tient pas dans la place réservée : réécriture complète, avec une copie entière du fichier
+                    _, _, record, error = write_batch([(self, values)], map, journal, normalizer, allow_rewrite=True)[0]
+            if error is not None:
+                raise error
+            self.apply_saved(values, record)
+
+    def get_thumbnail(self, size):
+        if self.image_pixmap is not None:
+            return self.image_pixmap.scaled(size, size, Qt.KeepAspectRatio)
+        if self.artwork_hash is None:
+            return None
+        return artwork_cache.get_thumbnail(self.artwork_hash, self.get_image_data, size)
+
+    def get_image_size(self):
+        if self.image_pixmap is not None:
+            return self.image_pixmap.width(), self.image_pixmap.height()
+        if self.artwork_hash is None:
+            return None
+        return artwork_cache.get_image_size(self.artwork_hash, self.get_image_data)
 
     def get_image_from_web(self):
         purged_name = self.old_file_name
@@ -374,6 +661,12 @@ class MusiqueFile:
         create_ImageInList_from_web(self.Images, 'beatport' + purged_name, 4)
 
     def get_tracks_info_from_web(self):
+        self.tracks_info.extend(self.get_tracks_info_from_all_bdd(*self.get_search_terms()))
+
+    def get_search_terms(self):
+        """
+        Retourne (artiste, titre) à rechercher : ceux du tag, sinon ceux tirés du nom du fichier.
+        """
         purged_name = self.old_file_name
         purged_name = purged_name.replace(purged_name[purged_name.find('myfreemp3'):purged_name.find('myfreemp3') + len('myfreemp3') + 4], '')
         purged_name = purged_name.replace('.mp3', '').replace('.flac', '')
@@ -387,185 +680,185 @@ class MusiqueFile:
             titre = song_info_from_extract["titre"]
         else:
             titre = self.Titre
-        self.tracks_info.extend(self.get_tracks_info_from_all_bdd(artiste, titre))
+        return artiste, titre
 
     def get_tracks_info_from_all_bdd(self, artiste, titre):
-        track_info = []
-        track_info.extend(self.get_tracks_info_from_discogs_query(artiste, titre))
-        track_info.extend(self.get_tracks_info_from_applemusic_query(artiste, titre))
-        track_info.extend(self.get_tracks_info_from_deezer_query(artiste, titre))
-        return track_info
+        # Toutes les sources (Discogs, iTunes, Deezer, ...) en même temps, chacune avec son délai
+        from metadata_providers import query_providers
+        return query_providers(artiste, titre)
 
     def get_tracks_info_from_discogs_query(self, artiste, titre):
-        from discogs import get_discogs_track_details
-        searched_song = artiste + " - " + titre
-        tracks_info = get_discogs_track_details(searched_song, 5)
-        return tracks_info
+        from metadata_providers import lookup_discogs
+        return lookup_discogs(artiste, titre)
 
     def get_tracks_info_from_applemusic_query(self, artiste, titre):
-        from apple_music import get_itunes_track_details
-        tracks_info = get_itunes_track_details(artiste, titre, 5)
-        return tracks_info
+        from metadata_providers import lookup_itunes
+        return lookup_itunes(artiste, titre)
 
     def get_tracks_info_from_deezer_query(self, artiste, titre):
-        from deezer import get_deezer_track_details
-        tracks_info = get_deezer_track_details(artiste, titre, 3)
-        return tracks_info
+        from metadata_providers import lookup_deezer
+        return lookup_deezer(artiste, titre)
 
     def get_image_from_url(self, url):
         create_ImageInList_from_Url(self.Images, url)
 
     def set_data_from_groupeediteurTag(self, groupeediteurTag):
-        self.Artiste = groupeediteurTag.zoneTextTitre.text()
-        self.Titre = groupeediteurTag.zoneTextTitre.text()
-        self.ArtisteDisplay = groupeediteurTag.zoneTextArtistAsDisplay.text()
-        self.ArtisteRemix = groupeediteurTag.zoneTextArtistRemix.text()
-        self.ArtisteFt = groupeediteurTag.zoneTextArtistFeaturing.text()
-        self.ArtisteAll = groupeediteurTag.zoneTextArtistAll.text()
-        self.Annee = groupeediteurTag.zoneTextAnnee.text()
-        self.Style = groupeediteurTag.zoneTextStyle.text()
-        self.Genre = groupeediteurTag.zoneTextGenre.text()
-        self.Disk = groupeediteurTag.zoneTextDisc.text()
-        self.Track = groupeediteurTag.zoneTextNum.text()
-        self.Album = groupeediteurTag.zoneTextAlbum.text()
-        self.ArtisteAlbum = groupeediteurTag.zoneTextAlbumArtist.text()
-        self.Image = groupeediteurTag.photoViewer.get_pixmap_original()
+        self.set_field('Artiste', groupeediteurTag.zoneTextArtistAsDisplay.text())
+        self.set_field('Titre', groupeediteurTag.zoneTextTitre.text())
+        self.set_field('ArtisteDisplay', groupeediteurTag.zoneTextArtistAsDisplay.text())
+        self.set_field('ArtisteRemix', groupeediteurTag.zoneTextArtistRemix.text())
+        self.set_field('ArtisteFt', groupeediteurTag.zoneTextArtistFeaturing.text())
+        self.set_field('ArtisteAll', groupeediteurTag.zoneTextArtistAll.text())
+        self.set_field('Annee', groupeediteurTag.zoneTextAnnee.text())
+        self.set_field('Style', groupeediteurTag.zoneTextStyle.text())
+        self.set_field('Genre', groupeediteurTag.zoneTextGenre.text())
+        self.set_field('Disk', groupeediteurTag.zoneTextDisc.text())
+        self.set_field('Track', groupeediteurTag.zoneTextNum.text())
+        self.set_field('Album', groupeediteurTag.zoneTextAlbum.text())
+        self.set_field('ArtisteAlbum', groupeediteurTag.zoneTextAlbumArtist.text())
+        # L'image n'est reprise que si elle a été changée dans l'éditeur
+        if groupeediteurTag.photoViewer.is_modified():
+            image_data, image_mime = groupeediteurTag.photoViewer.get_image_bytes()
+            self.set_image(groupeediteurTag.photoViewer.get_pixmap_original(), image_data, image_mime)
+
+
+# Champ -> clés Vorbis écrites dans un FLAC ('Artiste' est écrit via ArtisteDisplay)
+FLAC_KEYS = {
+    'Titre': ('title',),
+    'ArtisteDisplay': ('artist',),
+    'ArtisteAlbum': ('albumartist', 'album artist'),
+    'ArtisteAll': ('artists (All)',),
+    'ArtisteRemix': ('Artist Remix',),
+    'ArtisteFt': ('artist ft',),
+    'Album': ('album',),
+    'Track': ('tracknumber',),
+    'Disk': ('discnumber',),
+    'Genre': ('genre',),
+    'Style': ('style',),
+    'Annee': ('date',),
+}
+
+# Champ -> frame ID3 écrite dans un MP3 ('Artiste' est écrit via ArtisteDisplay)
+ID3_FRAMES_BUILDERS = {
+    'Titre': lambda value: TIT2(encoding=3, text=value),
+    'ArtisteDisplay': lambda value: TPE1(encoding=3, text=value),
+    'ArtisteAlbum': lambda value: TPE2(encoding=3, text=value),
+    'ArtisteAll': lambda value: TXXX(encoding=3, desc='Artists (All)', text=value),
+    'ArtisteRemix': lambda value: TXXX(encoding=3, desc='Artist Remix', text=value),
+    'ArtisteFt': lambda value: TXXX(encoding=3, desc='Artist ft', text=value),
+    'Album': lambda value: TALB(encoding=3, text=value),
+    'Track': lambda value: TRCK(encoding=3, text=value),
+    'Disk': lambda value: TPOS(encoding=3, text=value),
+    'Genre': lambda value: TCON(encoding=3, text=value),
+    'Style': lambda value: TXXX(encoding=3, desc='Style', text=value),
+    'Annee': lambda value: TDRC(encoding=3, text=value),
+}
 
 class FlacFile(MusiqueFile):
+    __slots__ = ()
+
     def __init__(self, old_file_name, path):
         super().__init__(old_file_name, path)
         self.old_file_name = old_file_name
         self.old_file_name_with_path = path + r'\\' + old_file_name
         self.file_type = 'flac'
 
-    def extract_tag(self):
-        from mutagen.flac import FLAC
-        audio = FLAC(self.old_file_name_with_path)
-        self.audio_file = audio
-        self.metadata = mutagen.File(self.old_file_name_with_path)
-        self.Titre = extract_unitary(audio, 'title')
-
-        self.Artiste = extract_unitary(audio, 'artist')
-        self.ArtisteAll = extract_unitary(audio, 'artists (All)')
-        self.ArtisteRemix = extract_unitary(audio, 'Artist Remix')
-        self.ArtisteFt = extract_unitary(audio, 'artist ft')
-        self.ArtisteDisplay = self.Artiste
-
-        self.ArtisteAlbum = extract_unitary(audio, 'albumartist')
-        self.Album = extract_unitary(audio, 'Album')
-        self.Track = extract_unitary(audio, 'tracknumber')
-        self.Disk = extract_unitary(audio, 'discnumber')
-        self.Genre = extract_unitary(audio, 'genre')
-        self.Style = extract_unitary(audio, 'style')
-        self.Annee = extract_unitary(audio, 'date')
-        self.extract_image()
-
-    def saveTag(self):
+    def write_tag(self, values, allow_rewrite=False):
+        """
+        Écrit les valeurs préparées par prepare_save et retourne l'enregistrement relu.
+        Ne touche ni à Qt ni à la piste : peut tourner sur un autre fil.
+        Lève NeedsRewrite (sans rien écrire) si le tag ne tient pas dans la place réservée
+        et que la réécriture complète du fichier n'est pas autorisée.
+        """
         from mutagen.flac import FLAC, Picture
         audio = FLAC(self.old_file_name_with_path)
-        audio["title"] = self.Titre
-        audio["artist"] = self.ArtisteDisplay
-        audio["albumartist"] = self.ArtisteAlbum
-        audio["album artist"] = self.ArtisteAlbum
-        audio["artists (All)"] = self.ArtisteAll
-        audio["Artist Remix"] = self.ArtisteRemix
-        audio["artist ft"] = self.ArtisteFt
-        audio["album"] = self.Album
-        audio["tracknumber"] = self.Track
-        audio["discnumber"] = self.Disk
-        audio["genre"] = self.Genre
-        audio["style"] = self.Style
-        audio["date"] = self.Annee
-
-        # Créer un objet Picture
-        #picture = Picture()
-        #picture.data = image_data
-        #picture.type = image_type  # 3 correspond à "Cover (front)"
-        #picture.mime = "image/jpeg"  # Ou "image/png" selon le type d'image
-        #picture.desc = "Cover"
-
-        # Ajouter l'image aux blocs de métadonnées du fichier FLAC
-        #audio.add_picture(picture)
-
-        audio.save()
+        changed = False
+        for field, keys in FLAC_KEYS.items():
+            if field in values:
+                changed = True
+                for key in keys:
+                    audio[key] = values[field]
+
+        # L'image n'est réécrite que si elle a changé (même contenu : bloc PICTURE laissé tel quel)
+        if 'Image' in values:
+            if values['Image'] is None:
+                changed = changed or bool(audio.pictures)
+                audio.clear_pictures()
+            else:
+                image_data, image_mime = values['Image']
+                if image_hash(image_data) not in {image_hash(picture.data) for picture in audio.pictures}:
+                    # Octets de l'image écrits directement dans le bloc, sans décodage
+                    width, height, depth = image_dimensions(image_data)
+                    picture = Picture()
+                    picture.data = image_data
+                    picture.type = 3  # 3 correspond à "Cover (front)"
+                    # Type inconnu (image du fichier ni JPEG ni PNG, non décodable) : JPEG par défaut
+                    picture.mime = image_mime or 'image/jpeg'  # "image/jpeg" ou "image/png"
+                    picture.desc = "Cover"
+                    picture.width = width
+                    picture.height = height
+                    picture.depth = depth
+
+                    # Remplace les images existantes dans les blocs de métadonnées du fichier FLAC
+                    audio.clear_pictures()
+                    audio.add_picture(picture)
+                    changed = True
+
+        if changed:
+            save_tag(audio, self.old_file_name_with_path, allow_rewrite)
+        return detach_image(read_tag_record(self.old_file_name_with_path, self.file_type))
 
 class Mp3File(MusiqueFile):
+    __slots__ = ()
+
     def __init__(self, old_file_name, path):
         super().__init__(old_file_name, path)
         self.old_file_name = old_file_name
         self.old_file_name_with_path = path + r'\\' + old_file_name
         self.file_type = 'mp3'
 
-    def extract_tag(self):
-        self.metadata = mutagen.File(self.old_file_name_with_path)
-        audio = ID3(self.old_file_name_with_path)
-        self.audio_file = audio
-        self.Titre = extract_unitary(audio, 'TIT2')
-        self.Artiste = extract_unitary(audio, 'TPE1')
-        self.ArtisteDisplay = self.Artiste
-        self.ArtisteAlbum = extract_unitary(audio, 'TPE2')
-        self.Album = extract_unitary(audio, 'TALB')
-        self.Track = extract_unitary(audio, 'TRCK')
-        self.Disk = extract_unitary(audio, 'TPOS')
-        self.Genre = extract_unitary(audio, 'TCON')
-        self.Annee = extract_unitary(audio, 'TDRC')
-
-        # TXXX
-        self.Style = ''
-        self.ArtisteAll = ''
-        self.ArtisteRemix = ''
-        self.ArtisteFt = ''
-
-        audio = MP3(self.old_file_name_with_path, ID3=ID3)
-        for tag in audio.tags.getall('TXXX'):
-            if tag.desc == 'Style':
-                self.Style = tag.text[0]
-            if tag.desc == 'Artists (All)':
-                self.ArtisteAll = tag.text[0]
-            if tag.desc == 'Artist Remix':
-               self.ArtisteRemix = tag.text[0]
-            if tag.desc == 'Artist ft':
-                self.ArtisteFt = tag.text[0]
-
-        self.extract_image()
-
-    def saveTag(self):
+    def write_tag(self, values, allow_rewrite=False):
+        """
+        Écrit les valeurs préparées par prepare_save et retourne l'enregistrement relu.
+        Ne touche ni à Qt ni à la piste : peut tourner sur un autre fil.
+        Lève NeedsRewrite (sans rien écrire) si le tag ne tient pas dans la place réservée
+        et que la réécriture complète du fichier n'est pas autorisée.
+        """
         audio = ID3(self.old_file_name_with_path)
-        audio.add(TIT2(encoding=3, text=self.Titre))
-        audio.add(TPE1(encoding=3, text=self.ArtisteDisplay))
-        audio.add(TPE2(encoding=3, text=self.ArtisteAlbum))
-        audio.add(TXXX(encoding=3, desc='Artists (All)', text=self.ArtisteAll))
-        audio.add(TXXX(encoding=3, desc='Artist Remix', text=self.ArtisteRemix))
-        audio.add(TXXX(encoding=3, desc='Artist ft', text=self.ArtisteFt))
-        audio.add(TALB(encoding=3, text=self.Album))
-        audio.add(TRCK(encoding=3, text=self.Track))
-        audio.add(TPOS(encoding=3, text=self.Disk))
-        audio.add(TCON(encoding=3, text=self.Genre))
-        audio.add(TXXX(encoding=3, desc='Style', text=self.Style))
-        audio.add(TDRC(encoding=3, text=self.Annee))
-
-        # Enleve les images existantes
-        apic_tags = [tag for tag in audio.keys() if tag.startswith('APIC')]
-        for tag in apic_tags:
-            audio.delall(tag)
-
-        # Créer un objet APIC pour l'image
-        if self.Image:
-            image_mime = 'image/jpeg'
-            image_data = convert_qpixmap_to_bytes(self.Image,
-                                                  image_format=image_mime.split('/')[1].upper())
-            apic = APIC(
-                encoding=3,  # 3 = UTF-8
-                mime=image_mime,  # 'image/jpeg' ou 'image/png'
-                type=3,  # 3 = Cover (front)
-                desc=u'Cover',
-                data=image_data
-            )
-
-            audio.add(apic)
-        audio.save()
-
-
+        for field, build_frame in ID3_FRAMES_BUILDERS.items():
+            if field in values:
+                audio.add(build_frame(values[field]))
+
+        # L'image n'est réécrite que si elle a changé
+        if 'Image' in values:
+            # Enleve les images existantes
+            audio.delall('APIC')
+
+            # Créer un objet APIC pour l'image
+            if values['Image'] is not None:
+                image_data, image_mime = values['Image']
+                # Type inconnu (image du fichier ni JPEG ni PNG, non décodable) : JPEG par défaut
+                apic = APIC(
+                    encoding=3,  # 3 = UTF-8
+                    mime=image_mime or 'image/jpeg',  # 'image/jpeg' ou 'image/png'
+                    type=3,  # 3 = Cover (front)
+                    desc=u'Cover',
+                    data=image_data
+                )
+                audio.add(apic)
+        save_tag(audio, self.old_file_name_with_path, allow_rewrite)
+        return detach_image(read_tag_record(self.old_file_name_with_path, self.file_type))
+
+
+
+def create_musique_file(file_name, path, file_type, name_in_list=None):
+    if file_type == 'flac':
+        musique_file = FlacFile(file_name, path)
+    else:
+        musique_file = Mp3File(file_name, path)
+    if name_in_list is not None:
+        musique_file.name_in_list = name_in_list
+    return musique_file
 
 
 def create_pixmap_from_url(url):
@@ -578,19 +871,34 @@ def create_pixmap_from_url(url):
     Returns:
         QPixmap | None: Le QPixmap de l'image téléchargée, ou None en cas d'erreur.
     """
+    return create_artwork_from_url(url)[0]
+
+
+def create_artwork_from_url(url):
+    """
+    Télécharge une image à partir d'une URL.
+
+    Args:
+        url (str): L'URL de l'image.
+
+    Returns:
+        tuple: (QPixmap, octets téléchargés, type MIME), ou (None, None, None) en cas d'erreur.
+            Les octets sont gardés pour être écrits tels quels dans les tags.
+    """
     from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
     from PyQt5.QtCore import QUrl, QEventLoop
     from PyQt5.QtGui import QPixmap
     if not url or not isinstance(url, str):
         print("URL invalide.")
-        return None
+        return None, None, None
 
+    reply = None
     try:
         # Vérification de l'URL
         qurl = QUrl(url)
         if not qurl.isValid() and not qurl.isLocalFile() and not qurl.isRelative():
             print(f"URL non valide : {url}")
-            return None
+            return None, None, None
 
         # Gestionnaire réseau
         network_manager = QNetworkAccessManager()
@@ -607,29 +915,31 @@ def create_pixmap_from_url(url):
         # Vérifier les erreurs de réseau
         if reply.error() != QNetworkReply.NoError:
             print(f"Erreur réseau : {reply.errorString()}")
-            return None
+            return None, None, None
 
         # Lire les données
         image_data = reply.readAll()
         if not image_data:
             print("Les données de l'image sont vides.")
-            return None
+            return None, None, None
 
         # Créer le QPixmap
         pixmap = QPixmap()
         if not pixmap.loadFromData(image_data):
             print("Impossible de charger l'image à partir des données.")
-            return None
+            return None, None, None
 
-        return pixmap
+        image_data = image_data.data()
+        return pixmap, image_data, guess_image_mime(image_data)
 
     except Exception as e:
         print(f"Une erreur inattendue s'est produite : {e}")
-        return None
+        return None, None, None
 
     finally:
         # Nettoyer
-        reply.deleteLater()
+        if reply is not None:
+            reply.deleteLater()
 
 def download_and_handle_image(url, images_list):
     pixmap = create_pixmap_from_url(url)
@@ -660,13 +970,6 @@ def create_ImageInList_from_Url(Images, url):
     except:
         pass
 
-
-def get_object_from_list(item, object_list):
-    if item is not None:
-        for Objects in object_list:
-            if item.text() == Objects.get_name_in_list():
-                return Objects
-
 class DiscogsListWindow(QWidget):
     # Constantes pour les colonnes
     COL_DISCOGS_TITRE = 0
@@ -868,8 +1171,8 @@ class DiscogsListWindow(QWidget):
                     if column != self.COL_ARTWORK_URL:
                         field.setText(cell_value)
                     else:
-                        pixmap = create_pixmap_from_url(cell_value)
-                        field.update_from_pixmap(pixmap)
+                        pixmap, image_data, image_mime = create_artwork_from_url(cell_value)
+                        field.update_from_pixmap(pixmap, image_data, image_mime)
 
 class MainWindow(QDialog):
     def clickMethodOpenBrowser(self):
@@ -877,36 +1180,140 @@ class MainWindow(QDialog):
         folderpath = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select Folder', r'C:\0Martin\Musique\renomme music v2\musique_essai\ml7')
         self.groupeParcourir.zoneText.setText(folderpath)
 
+    def add_records_to_list(self, records):
+        """
+        Crée les MusiqueFile d'un paquet d'enregistrements et les ajoute à la liste des pistes.
+        Les fichiers des sous-dossiers apparaissent avec leur chemin relatif au dossier parcouru.
+        """
+        pistes = []
+        for record in records:
+            if record['error'] is not None:
+                print(f"Erreur de lecture de {record['file_name']} : {record['error']}")
+                continue
+            folder = os.path.relpath(record['path'], self.groupeParcourir.zoneText.text())
+            name_in_list = record['file_name'] if folder == '.' else os.path.join(folder, record['file_name'])
+            musique_file = create_musique_file(record['file_name'], record['path'], record['file_type'], name_in_list)
+            musique_file.set_data_from_record(record)
+            pistes.append(musique_file)
+        self.catalogue.add_many(pistes)
+        self.search_index.add_many(pistes)
+        if self.groupeListPistes.model.filtre is not None:
+            # Recherche en cours : les nouvelles pistes n'apparaissent que si elles y correspondent
+            self.groupeListPistes.model.filtre = self.search_index.search(self.groupeListPistes.zoneRecherche.text())
+        self.groupeListPistes.model.add_pistes(pistes)
+
+        self.progress_bar.setValue(self.progress_bar.value() + len(records))
+        QApplication.processEvents()  # Permet de rafraîchir l'interface graphique
+
     def clickMethodParcourir(self):
+        from folder_scanner import iter_chunks, scan_audio_files
+        from parallel_loading import TagLoadingPipeline
+        from library_index import LibraryIndex
         path = self.groupeParcourir.zoneText.text()
-        files_in_directory = os.listdir(path)
-        for files in files_in_directory:
-            if files[-3:] == 'mp3' or files[-3:] == 'MP3' or files[-4:] == 'flac' or files[-4:] == 'FLAC':
-                if files[-3:] == 'mp3' or files[-3:] == 'MP3':
-                    musique_file = Mp3File(files, path)
-                if files[-3:] == 'flac' or files[-3:] == 'FLAC':
-                    musique_file = FlacFile(files, path)
-                musique_file.extract_tag()
-                self.groupeListPistes.Pistes.append(musique_file)
-                self.groupeListPistes.ListPistes.addItem(files)
+
+        # Nombre de fichiers inconnu pendant le parcours : barre de progression en mode "occupé"
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setMaximum(0)
+        self.progress_bar.setValue(0)
+
+        index = LibraryIndex()
+        files_by_folder = {}
+        with TagLoadingPipeline() as pipeline:
+            # Les fichiers sont traités par paquets pendant le parcours : les premiers s'affichent tout de suite
+            for files_in_directory in iter_chunks(scan_audio_files(path), 64):
+                for files, folder, _ in files_in_directory:
+                    files_by_folder.setdefault(folder, []).append(files)
+
+                # Les fichiers inchangés depuis le dernier parcours sont repris de l'index
+                records_from_index, files_to_parse = index.split_files(files_in_directory)
+                self.add_records_to_list(records_from_index)
+
+                pipeline.submit(files_to_parse)
+                for records in pipeline.iter_done():
+                    index.store(records)
+                    self.add_records_to_list(records)
+
+            for records in pipeline.iter_remaining():
+                index.store(records)
+                self.add_records_to_list(records)
+
+        for folder, file_names in files_by_folder.items():
+            index.prune(folder, file_names)
+        # Sous-dossiers supprimés ou vidés depuis le dernier parcours
+        index.prune_folders(path, files_by_folder)
+        index.close()
+
+        self.progress_bar.setMaximum(1)
+        self.progress_bar.setValue(1)
 
     def clickMethodSearchAllsongInfo(self):
-        from PyQt5.QtWidgets import QProgressBar
+        """
+        Recherche en tâche de fond les informations de toutes les pistes de la liste
+        (voir lookup_scheduler) ; l'interface reste utilisable pendant la recherche.
+        Avec la case "Par album", les pistes d'un même album sont recherchées ensemble
+        (voir album_lookup).
+        """
+        from album_lookup import group_pistes
+        from lookup_scheduler import LookupScheduler
+        if self.lookup_scheduler is not None:
+            return
+        pistes = self.groupeListPistes.model.pistes
+        if self.groupeAction.caseParAlbum.isChecked():
+            jobs, groups = group_pistes(pistes)
+        else:
+            jobs = [(song_info, *song_info.get_search_terms()) for song_info in pistes]
+            groups = []
+
         # Initialisation de la barre de progression
-        count = self.groupeListPistes.ListPistes.count()
         self.progress_bar.setMinimum(0)
-        self.progress_bar.setMaximum(count)
+        self.progress_bar.setMaximum(max(len(pistes), 1))
         self.progress_bar.setValue(0)
         self.progress_bar.show()
 
-        for index in range(count):
-            item = self.groupeListPistes.ListPistes.item(index)
-            song_info = get_object_from_list(item, self.groupeListPistes.Pistes)
-            song_info.get_tracks_info_from_web()
+        self.lookup_scheduler = LookupScheduler(parent=self)
+        self.lookup_scheduler.track_done.connect(self.lookup_track_done)
+        self.lookup_scheduler.progress.connect(self.lookup_progress)
+        self.lookup_scheduler.finished.connect(self.lookup_finished)
+        self.groupeAction.boutonRecherche.setEnabled(False)
+        self.groupeAction.boutonPause.setEnabled(True)
+        self.groupeAction.boutonAnnulerRecherche.setEnabled(True)
+        self.lookup_scheduler.start(jobs, groups)
 
-            # Mise à jour de la barre de progression
-            self.progress_bar.setValue(index + 1)
-            QApplication.processEvents()  # Permet de rafraîchir l'interface graphique
+    def lookup_track_done(self, song_info, tracks_info):
+        song_info.tracks_info.extend(tracks_info)
+
+    def lookup_progress(self, done, total):
+        self.progress_bar.setValue(done)
+
+    def lookup_finished(self):
+        if self.lookup_scheduler is None:
+            return
+        from discogs import discogs_summary
+        from provider_cache import get_provider_cache
+        from release_cache import get_release_cache
+        print(get_provider_cache().summary())
+        print(get_release_cache().summary())
+        print(discogs_summary())
+        self.lookup_scheduler.deleteLater()
+        self.lookup_scheduler = None
+        self.groupeAction.boutonRecherche.setEnabled(True)
+        self.groupeAction.boutonPause.setText('Pause')
+        self.groupeAction.boutonPause.setEnabled(False)
+        self.groupeAction.boutonAnnulerRecherche.setEnabled(False)
+
+    def clickMethodPauseRecherche(self):
+        if self.lookup_scheduler is None:
+            return
+        if self.lookup_scheduler.is_paused():
+            self.lookup_scheduler.resume()
+            self.groupeAction.boutonPause.setText('Pause')
+        else:
+            self.lookup_scheduler.pause()
+            self.groupeAction.boutonPause.setText('Reprendre')
+
+    def clickMethodAnnulerRecherche(self):
+        if self.lookup_scheduler is not None:
+            self.lookup_scheduler.cancel()
 
     def fill_groupeediteurTag_from_song_info(self, groupeediteurTag, song_info):
         groupeediteurTag.zoneTextFileName.setText(song_info.old_file_name)
@@ -923,29 +1330,233 @@ class MainWindow(QDialog):
         groupeediteurTag.zoneTextNum.setText(str(song_info.Track))
         groupeediteurTag.zoneTextAlbumArtist.setText(song_info.ArtisteAlbum)
 
-        groupeediteurTag.photoViewer.update_from_pixmap(song_info.Image)
+        groupeediteurTag.photoViewer.update_from_song_info(song_info)
+
+    def piste_changed(self, song_info):
+        """
+        Met à jour la liste, le catalogue et l'index de recherche après modification d'une piste.
+        """
+        self.groupeListPistes.model.piste_changed(song_info)
+        self.catalogue.update(song_info)
+        self.search_index.update(song_info)
+
+    def filtrer_liste_pistes(self):
+        """
+        Filtre la liste des pistes selon le texte de la zone de recherche, en gardant la
+        piste en cours d'édition sélectionnée si elle reste affichée.
+        """
+        model = self.groupeListPistes.model
+        model.set_filtre(self.search_index.search(self.groupeListPistes.zoneRecherche.text()))
+        index = model.index_of(self.groupeListPistes.previousPiste)
+        if index.isValid():
+            self.groupeListPistes.ListPistes.setCurrentIndex(index)
 
-    def clickMethodListePiste(self):
+    def get_current_piste(self):
+        return self.groupeListPistes.model.get_piste(self.groupeListPistes.ListPistes.currentIndex())
+
+    def clickMethodListePiste(self, current, previous):
 
         if self.groupeListPistes.previousPiste is not None:
             # Sauvegarde de ce qui a été rempli dans l'editeur de tag
-            song_info = get_object_from_list(self.groupeListPistes.previousPiste, self.groupeListPistes.Pistes)
+            song_info = self.groupeListPistes.previousPiste
             song_info.set_data_from_groupeediteurTag(self.groupeediteurTag)
-
-        self.groupeListPistes.previousPiste = self.groupeListPistes.ListPistes.currentItem()
+            self.piste_changed(song_info)
 
         #ecriture des infos du nouveau selectionne
-        song_info = get_object_from_list(self.groupeListPistes.ListPistes.currentItem(), self.groupeListPistes.Pistes)
-        self.fill_groupeediteurTag_from_song_info(self.groupeediteurTag, song_info)
+        song_info = self.groupeListPistes.model.get_piste(current)
+        self.groupeListPistes.previousPiste = song_info
+        if song_info is not None:
+            self.fill_groupeediteurTag_from_song_info(self.groupeediteurTag, song_info)
 
     def clickMethodValider(self):
-        if self.groupeListPistes.ListPistes.currentItem() is not None:
-            song_info = get_object_from_list(self.groupeListPistes.ListPistes.currentItem(), self.groupeListPistes.Pistes)
+        song_info = self.get_current_piste()
+        if song_info is not None:
             song_info.set_data_from_groupeediteurTag(self.groupeediteurTag)
-        for index in range(self.groupeListPistes.ListPistes.count()):
-            item = self.groupeListPistes.ListPistes.item(index)
-            song_info = get_object_from_list(item, self.groupeListPistes.Pistes)
-            song_info.saveTag()
+            self.piste_changed(song_info)
+
+        # Seules les pistes réellement différentes de leur fichier sont écrites, et seulement les champs qui changent ;
+        # une piste qui n'a pas pu être comparée est écrite entière (l'écriture signalera l'erreur si elle persiste)
+        diffs = self.compare_pistes()
+        self.save_pistes([diff.piste for diff in diffs if diff.has_changes() or diff.error is not None])
+
+    def clickMethodApercu(self):
+        """
+        Affiche, sans rien écrire, ce que Valider écrirait : fichier par fichier, les champs
+        qui changent (valeur du disque -> nouvelle valeur).
+        """
+        from tag_diff import format_report
+        song_info = self.get_current_piste()
+        if song_info is not None:
+            song_info.set_data_from_groupeediteurTag(self.groupeediteurTag)
+            self.piste_changed(song_info)
+
+        report = format_report(self.compare_pistes())
+        print(report)
+        message = QMessageBox(QMessageBox.Information, "Aperçu des modifications", report.split("\n", 1)[0], parent=self)
+        message.setDetailedText(report)
+        message.exec_()
+
+    def compare_pistes(self):
+        """
+        Compare les pistes modifiées à leurs fichiers (voir tag_diff), avec la barre de
+        progression. Les champs revenus à leur valeur du disque ne sont plus marqués modifiés.
+        Retourne les TagDiff.
+        """
+        from tag_diff import compute_diffs
+        pistes = [piste for piste in self.groupeListPistes.model.pistes if piste.is_modified()]
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setMaximum(max(len(pistes), 1))
+        self.progress_bar.setValue(0)
+
+        def progress():
+            self.progress_bar.setValue(self.progress_bar.value() + 1)
+            QApplication.processEvents()  # Permet de rafraîchir l'interface graphique
+
+        diffs = compute_diffs(pistes, progress=progress)
+        for diff in diffs:
+            diff.discard_unchanged()
+            if diff.error is not None:
+                print(f"Erreur de vérification de {diff.file_path} : {diff.error}")
+            elif not diff.has_changes():
+                self.piste_changed(diff.piste)
+        return diffs
+
+    def clickMethodNormaliserImages(self):
+        """
+        Normalise les images déjà écrites dans les fichiers de la liste (voir
+        artwork_normalization) ; seules les images hors limites sont réécrites. Les pistes
+        modifiées mais pas encore enregistrées sont laissées de côté.
+        """
+        pistes = [piste for piste in self.groupeListPistes.model.pistes if piste.has_image() and not piste.is_modified()]
+        for piste in pistes:
+            piste.mark_dirty('Image')
+        cancelled = self.save_pistes(pistes, always_report=True)
+        for piste in cancelled:
+            piste.mark_clean('Image')
+
+    def save_pistes(self, pistes, always_report=False):
+        """
+        Écrit les pistes sur le pool de fils d'écriture, avec la barre de progression et le
+        bouton Annuler, puis affiche le bilan. Retourne les pistes non écrites (annulation).
+        """
+        from artwork_normalization import ArtworkNormalizer
+        from parallel_saving import TagSavingPipeline
+        from write_journal import WriteJournal
+        if not pistes:
+            return []
+
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setMaximum(len(pistes))
+        self.progress_bar.setValue(0)
+        self.groupeValider.boutonValider.setEnabled(False)
+        self.groupeValider.boutonAnnuler.setEnabled(True)
+        self.sauvegarde_annulee = False
+
+        errors = []
+        stats_before = write_stats.snapshot()
+        # Une même image (pochette d'un album) n'est normalisée qu'une fois
+        normalizer = ArtworkNormalizer()
+        # Les écritures passent par le journal : une coupure ne laisse aucun fichier à moitié écrit
+        with WriteJournal() as journal, TagSavingPipeline(normalizer=normalizer, journal=journal) as pipeline:
+            # Une image commune à plusieurs pistes (sans octets d'origine) n'est encodée qu'une fois
+            encoder = ArtworkEncoder()
+            for piste in pistes:
+                pipeline.submit(piste, piste.prepare_save(encoder))
+            pipeline.flush()
+
+            while pipeline.pending:
+                if self.sauvegarde_annulee:
+                    pipeline.cancel()
+                for piste, values, record, error in pipeline.iter_done():
+                    if error is None:
+                        piste.apply_saved(values, record)
+                        self.piste_changed(piste)
+                    else:
+                        print(f"Erreur d'écriture de {piste.old_file_name_with_path} : {error}")
+                        errors.append((piste, error))
+                    self.progress_bar.setValue(self.progress_bar.value() + 1)
+                QApplication.processEvents()  # Permet de rafraîchir l'interface graphique (et d'annuler)
+            cancelled = pipeline.cancelled
+            failed = cancelled + [piste for piste, _ in errors]
+            rewritten = [piste for piste in pipeline.rewritten if piste not in failed]
+
+        self.groupeValider.boutonValider.setEnabled(True)
+        self.groupeValider.boutonAnnuler.setEnabled(False)
+        summary = write_stats.summary(since=stats_before) + "\n" + normalizer.summary()
+        print(summary)
+        self.show_save_report(len(pistes), errors, cancelled, rewritten, summary, always_report)
+        return cancelled
+
+    def recover_write_journal(self):
+        """
+        Au démarrage : remet dans leur état d'origine les fichiers d'une sauvegarde
+        interrompue (coupure, plantage ; voir write_journal), puis propose de la reprendre.
+        """
+        from write_journal import WriteJournal
+        with WriteJournal() as journal:
+            if not journal.has_pending():
+                return
+            to_resume, errors = journal.recover()
+        for file_path, error in errors:
+            print(f"Erreur de remise en état de {file_path} : {error}")
+        if not to_resume:
+            return
+        answer = QMessageBox.question(
+            self, "Sauvegarde interrompue",
+            f"La dernière sauvegarde a été interrompue : {len(to_resume)} fichier(s) ont été remis dans leur "
+            f"état d'origine.\nReprendre l'écriture de ces fichiers ?")
+        if answer != QMessageBox.Yes:
+            return
+        pistes = []
+        for file_name, folder, file_type, values in to_resume:
+            piste = create_musique_file(file_name, folder, file_type)
+            try:
+                # Tag remis en état relu : seuls les champs qui diffèrent des valeurs à écrire seront écrits
+                piste.extract_tag()
+            except Exception as e:
+                print(f"Erreur de lecture de {piste.old_file_name_with_path} : {e}")
+                continue
+            for field, value in values.items():
+                if field == 'Image':
+                    if value is None:
+                        piste.set_image(None)
+                    else:
+                        piste.set_image(None, *value)
+                else:
+                    piste.set_field(field, value)
+            if piste.is_modified():
+                pistes.append(piste)
+        self.save_pistes(pistes, always_report=True)
+
+    def clickMethodAnnulerSauvegarde(self):
+        self.sauvegarde_annulee = True
+
+    def show_save_report(self, count, errors, cancelled, rewritten, summary, always=False):
+        """
+        Affiche le bilan d'une sauvegarde s'il y a eu des erreurs, une annulation ou des
+        fichiers réécrits en entier (tag trop grand pour la place réservée), ou toujours si
+        `always`. Les pistes non écrites restent marquées modifiées.
+        """
+        if not errors and not cancelled and not rewritten and not always:
+            return
+        saved = count - len(errors) - len(cancelled)
+        lines = [f"{saved} fichier(s) enregistré(s) sur {count}.", summary]
+        if cancelled:
+            lines.append(f"{len(cancelled)} fichier(s) non enregistré(s) (annulation).")
+        if rewritten:
+            lines.append(f"{len(rewritten)} fichier(s) réécrit(s) en entier (de la place est maintenant réservée pour les prochaines fois) :")
+            lines.extend(piste.get_name_in_list() for piste in rewritten[:20])
+            if len(rewritten) > 20:
+                lines.append(f"... et {len(rewritten) - 20} autre(s)")
+        if errors:
+            lines.append(f"{len(errors)} erreur(s) :")
+            lines.extend(f"{piste.get_name_in_list()} : {error}" for piste, error in errors[:20])
+            if len(errors) > 20:
+                lines.append(f"... et {len(errors) - 20} autre(s)")
+        if errors or cancelled:
+            QMessageBox.warning(self, "Sauvegarde", "\n".join(lines))
+        else:
+            QMessageBox.information(self, "Sauvegarde", "\n".join(lines))
 
     def clickMethodAutoAnalyse(self):
         chaine = self.groupeediteurTag.zoneTextFileName.text()
@@ -961,7 +1572,7 @@ class MainWindow(QDialog):
 
     def open_new_window(self):
         # Créer et afficher la nouvelle fenêtre
-        song_info = get_object_from_list(self.groupeListPistes.ListPistes.currentItem(), self.groupeListPistes.Pistes)
+        song_info = self.get_current_piste()
         self.discogs_window = DiscogsListWindow(self, song_info)
         self.discogs_window.show()
 
@@ -984,23 +1595,43 @@ class MainWindow(QDialog):
 
     def createListePistes(self):
         self.groupeListPistes = QGroupBox("Liste des Pistes")
-        self.groupeListPistes.Pistes = []
+        self.groupeListPistes.model = TrackListModel(self)
         self.groupeListPistes.previousPiste = None
-        self.groupeListPistes.ListPistes = QListWidget(self)
-        self.groupeListPistes.ListPistes.selectionModel().selectionChanged.connect(self.clickMethodListePiste)
+        self.groupeListPistes.ListPistes = create_track_list_view(self.groupeListPistes.model, self)
+        self.groupeListPistes.ListPistes.selectionModel().currentChanged.connect(self.clickMethodListePiste)
+
+        # Recherche : le filtre est appliqué quand la frappe marque une pause
+        self.groupeListPistes.zoneRecherche = QLineEdit(self)
+        self.groupeListPistes.zoneRecherche.setPlaceholderText("Rechercher (titre, artiste, album, fichier)")
+        self.groupeListPistes.zoneRecherche.setClearButtonEnabled(True)
+        self.groupeListPistes.timerRecherche = QTimer(self)
+        self.groupeListPistes.timerRecherche.setSingleShot(True)
+        self.groupeListPistes.timerRecherche.setInterval(150)
+        self.groupeListPistes.timerRecherche.timeout.connect(self.filtrer_liste_pistes)
+        self.groupeListPistes.zoneRecherche.textChanged.connect(lambda text: self.groupeListPistes.timerRecherche.start())
+
         grid = QGridLayout()
-        grid.addWidget(self.groupeListPistes.ListPistes, 0, 0)
+        grid.addWidget(self.groupeListPistes.zoneRecherche, 0, 0)
+        grid.addWidget(self.groupeListPistes.ListPistes, 1, 0)
         self.groupeListPistes.setLayout(grid)
 
     def create_groupe_action(self):
         self.groupeAction = QGroupBox("Action")
 
         #Bouton pour rechercher les information
-        bouton_valider2 = QPushButton('Rech. Auto. tt Musique', self)
-        bouton_valider2.clicked.connect(self.clickMethodSearchAllsongInfo)
+        self.groupeAction.boutonRecherche = QPushButton('Rech. Auto. tt Musique', self)
+        self.groupeAction.boutonRecherche.clicked.connect(self.clickMethodSearchAllsongInfo)
 
-        grid_groupe_action = QGridLayout()
-        grid_groupe_action.addWidget(bouton_valider2, 0, 0)
+        # Pause / reprise et annulation de la recherche en cours
+        self.groupeAction.boutonPause = QPushButton('Pause', self)
+        self.groupeAction.boutonPause.setEnabled(False)
+        self.groupeAction.boutonPause.clicked.connect(self.clickMethodPauseRecherche)
+        self.groupeAction.boutonAnnulerRecherche = QPushButton('Annuler', self)
+        self.groupeAction.boutonAnnulerRecherche.setEnabled(False)
+        self.groupeAction.boutonAnnulerRecherche.clicked.connect(self.clickMethodAnnulerRecherche)
+
+        # Recherche groupée : un album entier recherché en une fois, puis chaque fichier associé à sa piste
+        self.groupeAction.caseParAlbum = QCheckBox('Par album', self)
 
         # Barre de progression
         self.progress_bar = QProgressBar(self)
@@ -1010,9 +1641,17 @@ class MainWindow(QDialog):
         self.progress_bar.setTextVisible(True)  # Affiche le pourcentage
 
         # Layout
+        # Bouton pour normaliser les images déjà écrites dans les fichiers
+        bouton_normaliser = QPushButton('Normaliser les images', self)
+        bouton_normaliser.clicked.connect(self.clickMethodNormaliserImages)
+
         grid_groupe_action = QGridLayout()
-        grid_groupe_action.addWidget(bouton_valider2, 0, 0)  # Bouton à gauche
+        grid_groupe_action.addWidget(self.groupeAction.boutonRecherche, 0, 0)  # Bouton à gauche
         grid_groupe_action.addWidget(self.progress_bar, 0, 1)  # Barre à droite
+        grid_groupe_action.addWidget(self.groupeAction.boutonPause, 0, 2)
+        grid_groupe_action.addWidget(self.groupeAction.boutonAnnulerRecherche, 0, 3)
+        grid_groupe_action.addWidget(self.groupeAction.caseParAlbum, 0, 4)
+        grid_groupe_action.addWidget(bouton_normaliser, 1, 0)
 
         self.groupeAction.setLayout(grid_groupe_action)
 
@@ -1130,11 +1769,22 @@ class MainWindow(QDialog):
     def createValider(self):
         self.groupeValider = QGroupBox("Valider")
 
-        boutonValider = QPushButton('Valider', self)
-        boutonValider.clicked.connect(self.clickMethodValider)
+        self.groupeValider.boutonValider = QPushButton('Valider', self)
+        self.groupeValider.boutonValider.clicked.connect(self.clickMethodValider)
+
+        # Compare les pistes modifiées à leurs fichiers, sans rien écrire
+        self.groupeValider.boutonApercu = QPushButton('Aperçu', self)
+        self.groupeValider.boutonApercu.clicked.connect(self.clickMethodApercu)
+
+        # Annule les écritures pas encore commencées d'une sauvegarde en cours
+        self.groupeValider.boutonAnnuler = QPushButton('Annuler', self)
+        self.groupeValider.boutonAnnuler.setEnabled(False)
+        self.groupeValider.boutonAnnuler.clicked.connect(self.clickMethodAnnulerSauvegarde)
 
         grid = QGridLayout()
-        grid.addWidget(boutonValider, 5, 4, 1, 1)
+        grid.addWidget(self.groupeValider.boutonApercu, 5, 2, 1, 1)
+        grid.addWidget(self.groupeValider.boutonAnnuler, 5, 3, 1, 1)
+        grid.addWidget(self.groupeValider.boutonValider, 5, 4, 1, 1)
 
 
         self.groupeValider.setLayout(grid)
@@ -1145,6 +1795,13 @@ class MainWindow(QDialog):
 
         self.setMinimumSize(QSize(1350, 700))
 
+        # Index des pistes chargées (par artiste, album, genre, ...)
+        self.catalogue = TrackCatalog()
+        # Index de recherche plein texte (titre, artistes, album, nom de fichier)
+        self.search_index = SearchIndex()
+        # Recherche d'informations en tâche de fond en cours (voir clickMethodSearchAllsongInfo)
+        self.lookup_scheduler = None
+
         self.createParcourir()
         self.createListePistes()
         self.create_groupe_action()
@@ -1165,6 +1822,9 @@ class MainWindow(QDialog):
 
         self.setLayout(main_layout)
 
+        # Une sauvegarde interrompue est remise en état (et reprise) une fois la fenêtre affichée
+        QTimer.singleShot(0, self.recover_write_journal)
+
 
 
 
@@ -0,0 +1,167 @@
+"""
+Comparaison, sans rien écrire, des pistes modifiées en mémoire avec leurs fichiers.
+
+L'état du disque n'est pas relu : c'est celui du chargement (ou de la dernière sauvegarde),
+gardé par la piste à sa première modification (MusiqueFile.keep_disk_state). Seul un
+os.stat vérifie que le fichier n'a pas changé depuis ; sinon ses tags sont relus. Les
+comparaisons tournent sur un pool de fils (un os.stat sur un partage réseau est lent).
+
+Le résultat est la liste exacte des écritures de la sauvegarde : un champ revenu à sa
+valeur du disque n'est plus marqué modifié (TagDiff.discard_unchanged), et un fichier sans
+différence n'est pas ouvert en écriture.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tag_reader import TAG_FIELDS, detach_image, read_tag_record
+
+# Nombre de fichiers comparés en même temps
+DIFF_WORKERS = 8
+
+# 'Artiste' n'est pas écrit dans le fichier (TPE1 / artist viennent de ArtisteDisplay)
+WRITTEN_FIELDS = tuple(field for field in TAG_FIELDS if field != 'Artiste')
+
+# Empreinte d'une image choisie sans ses octets d'origine : connue seulement à l'encodage
+NEW_IMAGE = 'nouvelle'
+
+
+def short_repr(value, width=60):
+    text = repr(value)
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def same_value(disk_value, value):
+    # Un champ absent du fichier et un champ vide de l'éditeur sont équivalents
+    return ('' if disk_value is None else str(disk_value)) == ('' if value is None else str(value))
+
+
+class TagDiff:
+    __slots__ = ('piste', 'file_path', 'file_type', 'size', 'mtime_ns', 'dirty_fields', 'values', 'disk_values',
+                 'artwork_hash', 'disk_artwork_hash', 'fields', 'image', 'stale', 'error')
+
+    def __init__(self, piste):
+        """
+        Différences entre une piste modifiée et son fichier.
+
+        Les valeurs de la piste sont relevées ici, sur le fil de l'interface ; compare()
+        peut ensuite tourner sur un autre fil sans toucher à la piste.
+
+        Après compare() :
+            fields : champ -> (valeur du disque, nouvelle valeur), pour les seuls champs qui changent
+            image : (empreinte du disque, nouvelle empreinte) si l'image change, None sinon ;
+                nouvelle empreinte None pour une suppression, NEW_IMAGE si elle n'est pas encore encodée
+            stale : le fichier a changé sur le disque depuis le chargement (tags relus)
+            error : message si le fichier n'a pas pu être vérifié
+        """
+        self.piste = piste
+        self.file_path = piste.old_file_name_with_path
+        self.file_type = piste.file_type
+        self.size = piste.file_size
+        self.mtime_ns = piste.file_mtime_ns
+        self.dirty_fields = frozenset(piste.dirty_fields or ())
+        self.values = {field: getattr(piste, field) for field in WRITTEN_FIELDS if field in self.dirty_fields}
+        self.disk_values = piste.get_disk_state()
+        self.artwork_hash = piste.get_new_artwork_hash()
+        self.disk_artwork_hash = self.disk_values['artwork_hash']
+        self.fields = {}
+        self.image = None
+        self.stale = False
+        self.error = None
+
+    def compare(self):
+        """
+        Compare la piste à son fichier ; le fichier n'est relu que s'il a changé sur le disque.
+        """
+        try:
+            stat = os.stat(self.file_path)
+            if self.size is None or stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns:
+                # Modifié par un autre programme (ou taille inconnue) : on relit l'état réel
+                self.stale = self.size is not None
+                self.disk_values = detach_image(read_tag_record(self.file_path, self.file_type))
+                self.disk_artwork_hash = self.disk_values['artwork_hash']
+        except Exception as e:
+            self.error = str(e)
+            return self
+
+        for field, value in self.values.items():
+            if not same_value(self.disk_values[field], value):
+                self.fields[field] = (self.disk_values[field], value)
+        if 'Image' in self.dirty_fields and self.artwork_hash != self.disk_artwork_hash:
+            self.image = (self.disk_artwork_hash, self.artwork_hash)
+        return self
+
+    def has_changes(self):
+        return bool(self.fields) or self.image is not None
+
+    def discard_unchanged(self):
+        """
+        Ne laisse marqués modifiés que les champs à écrire. À appeler sur le fil de l'interface ;
+        un champ encore changé depuis la comparaison reste marqué.
+        """
+        if self.error is not None:
+            return
+        piste = self.piste
+        for field in self.dirty_fields:
+            if field == 'Image':
+                if self.image is None and piste.get_new_artwork_hash() == self.artwork_hash:
+                    piste.mark_clean('Image')
+            elif field not in self.fields and getattr(piste, field) == self.values.get(field, getattr(piste, field)):
+                piste.mark_clean(field)
+
+    def describe(self):
+        """
+        Lignes du rapport pour ce fichier.
+        """
+        lines = [self.piste.get_name_in_list()]
+        if self.error is not None:
+            lines.append(f"    non vérifié : {self.error}")
+            return lines
+        if self.stale:
+            lines.append("    (modifié sur le disque depuis le chargement, relu)")
+        for field, (disk_value, value) in self.fields.items():
+            lines.append(f"    {field} : {short_repr(disk_value)} -> {short_repr(value)}")
+        if self.image is not None:
+            disk_hash, new_hash = self.image
+            before = disk_hash[:12] if disk_hash else 'aucune'
+            after = 'supprimée' if new_hash is None else new_hash if new_hash == NEW_IMAGE else new_hash[:12]
+            lines.append(f"    Image : {before} -> {after}")
+        return lines
+
+
+def compute_diffs(pistes, max_workers=DIFF_WORKERS, progress=None):
+    """
+    Compare les pistes modifiées à leurs fichiers, en parallèle, sans rien écrire.
+
+    Args:
+        pistes (list): Pistes (MusiqueFile) ; celles qui ne sont pas modifiées sont ignorées.
+        progress: Fonction appelée sur le fil appelant après chaque fichier comparé (ou None).
+
+    Returns:
+        list: Les TagDiff des pistes modifiées, dans l'ordre des pistes.
+    """
+    diffs = [TagDiff(piste) for piste in pistes if piste.is_modified()]
+    if not diffs:
+        return diffs
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in as_completed([executor.submit(diff.compare) for diff in diffs]):
+            if progress is not None:
+                progress()
+    return diffs
+
+
+def format_report(diffs, limit=200):
+    """
+    Rapport texte des différences : résumé, puis les champs qui changent fichier par fichier.
+    """
+    changed = [diff for diff in diffs if diff.has_changes()]
+    errors = [diff for diff in diffs if diff.error is not None]
+    field_count = sum(len(diff.fields) + (diff.image is not None) for diff in changed)
+    lines = [f"{len(changed)} fichier(s) à écrire, {field_count} champ(s) modifié(s) ; "
+             f"{len(diffs) - len(changed) - len(errors)} piste(s) identique(s) au disque"]
+    if errors:
+        lines.append(f"{len(errors)} fichier(s) non vérifié(s)")
+    for diff in (changed + errors)[:limit]:
+        lines.extend(diff.describe())
+    if len(changed) + len(errors) > limit:
+        lines.append(f"... et {len(changed) + len(errors) - limit} autre(s)")
+    return "\n".join(lines)
@@ -0,0 +1,247 @@
+import hashlib
+import os
+
+from mutagen.mp3 import MP3
+
+# Champs de MusiqueFile remplis à partir des tags
+TAG_FIELDS = ('Titre', 'Artiste', 'ArtisteDisplay', 'ArtisteRemix', 'ArtisteFt', 'ArtisteAll', 'Annee',
+              'Style', 'Genre', 'Disk', 'Track', 'Album', 'ArtisteAlbum')
+
+
+def get_file_type(file_name):
+    """
+    Retourne le type de fichier audio géré ('mp3' ou 'flac') d'après l'extension, None sinon.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.mp3':
+        return 'mp3'
+    if extension == '.flac':
+        return 'flac'
+    return None
+
+
+# Correspondance champ MusiqueFile -> frame ID3
+ID3_FRAMES = {
+    'Titre': 'TIT2',
+    'Artiste': 'TPE1',
+    'ArtisteAlbum': 'TPE2',
+    'Album': 'TALB',
+    'Track': 'TRCK',
+    'Disk': 'TPOS',
+    'Genre': 'TCON',
+    'Annee': 'TDRC',
+}
+
+# Correspondance champ MusiqueFile -> description des frames TXXX
+TXXX_DESCS = {
+    'Style': 'Style',
+    'ArtisteAll': 'Artists (All)',
+    'ArtisteRemix': 'Artist Remix',
+    'ArtisteFt': 'Artist ft',
+}
+
+# Correspondance champ MusiqueFile -> commentaire Vorbis (FLAC), les clés sont insensibles à la casse
+VORBIS_KEYS = {
+    'Titre': 'title',
+    'Artiste': 'artist',
+    'ArtisteAll': 'artists (all)',
+    'ArtisteRemix': 'artist remix',
+    'ArtisteFt': 'artist ft',
+    'ArtisteAlbum': 'albumartist',
+    'Album': 'album',
+    'Track': 'tracknumber',
+    'Disk': 'discnumber',
+    'Genre': 'genre',
+    'Style': 'style',
+    'Annee': 'date',
+}
+
+
+def extract_unitary(audio, string):
+    try:
+        return str(audio[string][0])
+    except:
+        return ''
+
+
+def new_record():
+    record = dict.fromkeys(TAG_FIELDS, '')
+    record['image_data'] = None
+    record['image_offset'] = None
+    record['image_length'] = None
+    return record
+
+
+def image_hash(image_data):
+    return hashlib.sha1(image_data).hexdigest()
+
+
+# Formats d'image qu'on écrit tels quels dans les tags
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+
+def guess_image_mime(image_data):
+    """
+    Type MIME d'une image d'après ses premiers octets ('image/jpeg' ou 'image/png'),
+    None pour un autre format.
+    """
+    if not image_data:
+        return None
+    start = bytes(image_data[:8])
+    for signature, mime in IMAGE_SIGNATURES:
+        if start.startswith(signature):
+            return mime
+    return None
+
+
+# Nombre de composantes par type de couleur PNG
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def image_dimensions(image_data):
+    """
+    Largeur, hauteur et bits par pixel d'une image JPEG ou PNG, lus dans son en-tête
+    sans la décoder. (0, 0, 0) si le format n'est pas reconnu.
+    """
+    image_mime = guess_image_mime(image_data)
+    if image_mime == 'image/png' and len(image_data) >= 26:
+        width = int.from_bytes(image_data[16:20], 'big')
+        height = int.from_bytes(image_data[20:24], 'big')
+        return width, height, image_data[24] * PNG_CHANNELS.get(image_data[25], 1)
+    if image_mime == 'image/jpeg':
+        position = 2
+        while position + 9 < len(image_data) and image_data[position] == 0xFF:
+            marker = image_data[position + 1]
+            if marker == 0xFF:
+                position = position + 1
+                continue
+            # Marqueurs SOF (début de trame) : C0 à CF sauf C4 (Huffman), C8 et CC (arithmétique)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height = int.from_bytes(image_data[position + 5:position + 7], 'big')
+                width = int.from_bytes(image_data[position + 7:position + 9], 'big')
+                return width, height, image_data[position + 4] * image_data[position + 9]
+            position = position + 2 + int.from_bytes(image_data[position + 2:position + 4], 'big')
+    return 0, 0, 0
+
+
+def detach_image(record):
+    """
+    Calcule l'empreinte de l'image d'un enregistrement puis le détache du fichier lu :
+    si la position de l'image dans le fichier est connue, les octets sont abandonnés (ils
+    seront relus à la demande), sinon ils sont copiés en bytes.
+    """
+    image_data = record['image_data']
+    record['artwork_hash'] = image_hash(image_data) if image_data else None
+    if record['image_offset'] is not None:
+        record['image_data'] = None
+    elif isinstance(image_data, memoryview):
+        record['image_data'] = image_data.tobytes()
+    return record
+
+
+def read_image_data(file_path, image_offset, image_length):
+    with open(file_path, 'rb') as f:
+        f.seek(image_offset)
+        return f.read(image_length)
+
+
+def read_mp3_record(file_path):
+    # Une seule lecture : MP3 charge l'ID3 complet (frames texte, TXXX et APIC)
+    audio = MP3(file_path)
+    record = new_record()
+    tags = audio.tags
+    if tags is None:
+        return record
+
+    for field, frame_id in ID3_FRAMES.items():
+        record[field] = extract_unitary(tags, frame_id)
+
+    for tag in tags.getall('TXXX'):
+        for field, desc in TXXX_DESCS.items():
+            if tag.desc == desc:
+                record[field] = tag.text[0]
+
+    apic = tags.getall('APIC')
+    if apic:
+        record['image_data'] = apic[0].data
+
+    record['ArtisteDisplay'] = record['Artiste']
+    return record
+
+
+def read_flac_record(file_path):
+    from mutagen.flac import FLAC
+    # Une seule lecture : FLAC charge les commentaires Vorbis et les blocs PICTURE
+    audio = FLAC(file_path)
+    record = new_record()
+    if audio.tags is not None:
+        for field, key in VORBIS_KEYS.items():
+            record[field] = extract_unitary(audio.tags, key)
+
+    if audio.pictures:
+        record['image_data'] = audio.pictures[0].data
+
+    record['ArtisteDisplay'] = record['Artiste']
+    return record
+
+
+def read_tag_record(file_path, file_type):
+    """
+    Lit les tags d'un fichier audio et les retourne sous forme d'enregistrement simple.
+
+    Le fichier n'est ouvert et analysé qu'une seule fois : tous les champs, y compris les
+    champs personnalisés (TXXX / commentaires Vorbis) et l'image, viennent de cette lecture.
+    L'enregistrement est un dictionnaire sans objet Qt ni mutagen : il peut donc être
+    produit dans un processus de travail et renvoyé à l'interface.
+
+    Args:
+        file_path (str): Chemin complet du fichier.
+        file_type (str): 'mp3' ou 'flac'.
+
+    Returns:
+        dict: Les champs de TAG_FIELDS, plus 'image_data' (bytes, memoryview ou None),
+        'image_offset' et 'image_length' (position de l'image dans le fichier si connue).
+    """
+    from fast_tag_reader import read_tag_record_fast
+    # Lecture rapide de la seule zone de tags, mutagen pour les cas particuliers
+    record = read_tag_record_fast(file_path, file_type)
+    if record is not None:
+        return record
+    if file_type == 'flac':
+        return read_flac_record(file_path)
+    return read_mp3_record(file_path)
+
+
+def read_tag_records(files):
+    """
+    Lit les tags d'une liste de fichiers. Fonction de travail du chargement parallèle.
+
+    Args:
+        files (list): Liste de tuples (file_name, path, file_type).
+
+    Returns:
+        list: Un enregistrement par fichier (image détachée, voir detach_image), complété
+        par 'file_name', 'path', 'file_type', 'size' et 'mtime_ns' (relevés avant lecture) et 'error' (message si la lecture a
+        échoué, None sinon).
+    """
+    records = []
+    for file_name, path, file_type in files:
+        try:
+            file_path = path + r'\\' + file_name
+            stat = os.stat(file_path)
+            record = read_tag_record(file_path, file_type)
+            record['size'] = stat.st_size
+            record['mtime_ns'] = stat.st_mtime_ns
+            # Seules l'empreinte et la position de l'image repartent vers l'interface
+            detach_image(record)
+            record['error'] = None
+        except Exception as e:
+            record = {'error': str(e)}
+        record['file_name'] = file_name
+        record['path'] = path
+        record['file_type'] = file_type
+        records.append(record)
+    return records
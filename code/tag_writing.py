@@ -0,0 +1,143 @@
+"""
+Écriture des tags sur place, dans l'espace réservé (padding) derrière le tag.
+
+Tant que le nouveau tag tient dans l'ancien tag et son padding, mutagen réécrit seulement
+le début du fichier. Sinon tout le fichier doit être réécrit (la musique est décalée), ce
+qui est très lent sur un partage réseau : save_tag refuse alors d'écrire et lève
+NeedsRewrite, pour que la réécriture passe par une file séparée (voir parallel_saving).
+Lors d'une réécriture, un padding généreux est réservé pour que les écritures suivantes
+se fassent sur place.
+
+Les octets écrits sont comptés dans write_stats.
+"""
+import os
+import threading
+
+from fast_tag_reader import synchsafe_int
+
+# Padding réservé lors d'une réécriture complète (une image un peu plus grande tient dedans)
+REWRITE_PADDING = 256 * 1024
+
+
+class NeedsRewrite(Exception):
+    """Le nouveau tag ne tient pas dans l'espace réservé : tout le fichier serait réécrit."""
+
+
+class WriteStats:
+    def __init__(self):
+        """
+        Compteurs des écritures de tags, partagés entre les fils d'écriture.
+        """
+        self.lock = threading.Lock()
+        self.in_place = 0       # écritures dans le padding
+        self.rewrites = 0       # réécritures complètes du fichier
+        self.bytes_written = 0
+        self.file_bytes = 0     # taille cumulée des fichiers écrits
+
+    def add(self, in_place, bytes_written, file_size):
+        with self.lock:
+            if in_place:
+                self.in_place += 1
+            else:
+                self.rewrites += 1
+            self.bytes_written += bytes_written
+            self.file_bytes += file_size
+
+    def snapshot(self):
+        with self.lock:
+            return self.in_place, self.rewrites, self.bytes_written, self.file_bytes
+
+    def summary(self, since=(0, 0, 0, 0)):
+        """
+        Bilan des écritures (depuis un snapshot() donné, pour le bilan d'une sauvegarde).
+        """
+        in_place, rewrites, bytes_written, file_bytes = (now - before for now, before in zip(self.snapshot(), since))
+        count = in_place + rewrites
+        if count == 0:
+            return "Aucun fichier écrit"
+        ratio = 100 * bytes_written / file_bytes if file_bytes else 0
+        return (f"{count} fichier(s) écrit(s) : {in_place} sur place, {rewrites} réécrit(s) en entier ; "
+                f"{bytes_written / 1024:.0f} Kio écrits ({ratio:.1f} % de la taille des fichiers, "
+                f"{bytes_written / count / 1024:.1f} Kio par fichier)")
+
+
+write_stats = WriteStats()
+
+
+def tag_region_size(file_path):
+    """
+    Taille du tag en tête de fichier, padding compris (ID3v2, ou blocs de métadonnées FLAC).
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(10)
+        if header[:3] == b'ID3':
+            # En-tête de 10 octets (+ 10 pour le pied de page éventuel)
+            return 10 + synchsafe_int(header[6:10]) + (10 if header[5] & 0x10 else 0)
+        if header[:4] != b'fLaC':
+            return 0
+        position = 4
+        while True:
+            f.seek(position)
+            block_header = f.read(4)
+            if len(block_header) < 4:
+                return position
+            position = position + 4 + int.from_bytes(block_header[1:4], 'big')
+            if block_header[0] & 0x80:  # dernier bloc de métadonnées
+                return position
+
+
+def keep_padding(info):
+    """
+    Fonction de padding mutagen : garde exactement la place disponible (tag écrit sur place),
+    ou refuse la réécriture complète. Appelée avant toute écriture dans le fichier.
+    """
+    if info.padding >= 0:
+        return info.padding
+    raise NeedsRewrite(f"le tag dépasse l'espace réservé de {-info.padding} octets")
+
+
+def rewrite_padding(info):
+    """
+    Fonction de padding mutagen pour une réécriture complète : réserve REWRITE_PADDING,
+    ou garde la place disponible si le tag tient finalement dedans.
+    """
+    if info.padding >= 0:
+        return info.padding
+    return REWRITE_PADDING
+
+
+def save_tag(audio, file_path, allow_rewrite=False):
+    """
+    Enregistre un tag mutagen (ID3 ou FLAC) et compte les octets écrits.
+
+    Args:
+        audio: Tag mutagen chargé depuis file_path.
+        file_path (str): Chemin du fichier.
+        allow_rewrite (bool): Autorise la réécriture complète du fichier si le tag ne tient pas.
+
+    Returns:
+        int: Nombre d'octets écrits.
+
+    Raises:
+        NeedsRewrite: Si le tag ne tient pas et que la réécriture n'est pas autorisée
+            (le fichier n'a pas été modifié).
+    """
+    infos = []
+
+    def padding(info):
+        infos.append(info)
+        return rewrite_padding(info) if allow_rewrite else keep_padding(info)
+
+    audio.save(padding=padding)
+
+    # mutagen appelle la fonction de padding une fois, ID3 comme FLAC
+    in_place = infos[0].padding >= 0
+    file_size = os.path.getsize(file_path)
+    if in_place:
+        # Seul le tag (avec son padding) a été écrit : ce qui le suit n'a pas bougé
+        bytes_written = tag_region_size(file_path)
+    else:
+        # Le tag et tout ce qui le suit ont été écrits
+        bytes_written = file_size
+    write_stats.add(in_place, bytes_written, file_size)
+    return bytes_written
@@ -0,0 +1,108 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtWidgets import QListView
+
+
+class TrackListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        """
+        Modèle de la liste des pistes : self.pistes contient toutes les pistes chargées,
+        self.visibles celles qui passent le filtre de recherche (la ligne i affiche
+        self.visibles[i]). L'accès ligne -> MusiqueFile et MusiqueFile -> ligne se fait en
+        temps constant.
+        """
+        super().__init__(parent)
+        self.pistes = []
+        self.filtre = None  # ensemble des pistes à afficher, None pour toutes
+        self.visibles = self.pistes
+        self.rows = {}  # id(MusiqueFile) -> ligne, recalculé à la demande après un filtrage
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.visibles)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+            return self.visibles[index.row()].get_name_in_list()
+        return None
+
+    def add_pistes(self, pistes):
+        """
+        Ajoute des pistes ; si un filtre est actif, seules celles du filtre sont affichées.
+        """
+        shown = pistes if self.filtre is None else [piste for piste in pistes if piste in self.filtre]
+        if not shown:
+            self.pistes.extend(pistes)
+            return
+        first = len(self.visibles)
+        self.beginInsertRows(QModelIndex(), first, first + len(shown) - 1)
+        if self.visibles is not self.pistes:
+            self.visibles.extend(shown)
+        self.pistes.extend(pistes)
+        if self.rows is not None:
+            for row, piste in enumerate(shown, first):
+                self.rows[id(piste)] = row
+        self.endInsertRows()
+
+    def set_filtre(self, filtre):
+        """
+        N'affiche que les pistes de l'ensemble `filtre` (dans l'ordre de chargement),
+        ou toutes les pistes si `filtre` vaut None.
+        """
+        self.beginResetModel()
+        self.filtre = filtre
+        if filtre is None:
+            self.visibles = self.pistes
+        else:
+            self.visibles = [piste for piste in self.pistes if piste in filtre]
+        self.rows = None
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.pistes = []
+        self.filtre = None
+        self.visibles = self.pistes
+        self.rows = {}
+        self.endResetModel()
+
+    def get_piste(self, index):
+        """
+        Retourne la MusiqueFile d'un QModelIndex (None si l'index n'est pas valide).
+        """
+        if index is None or not index.isValid():
+            return None
+        return self.visibles[index.row()]
+
+    def index_of(self, piste):
+        if self.rows is None:
+            self.rows = {id(visible): row for row, visible in enumerate(self.visibles)}
+        row = self.rows.get(id(piste))
+        if row is None:
+            return QModelIndex()
+        return self.index(row)
+
+    def piste_changed(self, piste):
+        """
+        Signale à la vue qu'une piste a été modifiée.
+        """
+        index = self.index_of(piste)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+
+def create_track_list_view(model, parent=None):
+    """
+    Crée la vue de la liste des pistes : seules les lignes visibles sont dessinées, les
+    lignes ont toutes la même hauteur et sont disposées par lots, ce qui reste fluide avec
+    des centaines de milliers de pistes.
+    """
+    view = QListView(parent)
+    view.setModel(model)
+    view.setUniformItemSizes(True)
+    view.setLayoutMode(QListView.Batched)
+    view.setBatchSize(500)
+    view.setSelectionMode(QListView.SingleSelection)
+    return view
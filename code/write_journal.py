@@ -0,0 +1,217 @@
+"""
+Journal des écritures de tags (SQLite, dans le dossier cache de l'utilisateur).
+
+Avant d'écrire un paquet de fichiers, le journal enregistre pour chacun les valeurs à écrire
+et une copie de ce que l'écriture va écraser : le début du fichier (tag et padding, seule
+zone touchée par une écriture sur place) et, pour un MP3, les 128 derniers octets (tag
+ID3v1). Pour une réécriture complète, tout le fichier est copié à côté du journal.
+
+Les fichiers sont écrits sans fsync un par un, puis synchronisés ensemble à la fin du paquet
+avant que leurs entrées soient retirées du journal : deux validations du journal par paquet
+au lieu de deux par fichier.
+
+Après une coupure, les entrées restées dans le journal sont des écritures peut-être
+inachevées : recover() remet ces fichiers dans leur état d'avant l'écriture, puis retourne
+les valeurs à écrire pour reprendre la sauvegarde.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+
+from library_index import INDEX_DIR
+from tag_reader import TAG_FIELDS
+from tag_writing import tag_region_size
+
+JOURNAL_PATH = os.path.join(INDEX_DIR, 'write_journal.sqlite')
+BACKUP_DIR = os.path.join(INDEX_DIR, 'write_journal')
+
+# Nombre de fichiers par paquet : une validation du journal et une synchronisation groupée par paquet
+JOURNAL_BATCH = 32
+
+# Tag ID3v1 en fin de MP3, mis à jour par mutagen lors d'une écriture sur place
+ID3V1_LENGTH = 128
+
+
+def fsync_file(file_path):
+    """
+    Force l'écriture sur le disque d'un fichier déjà fermé.
+    """
+    # Sous Windows, le fichier doit être ouvert en écriture pour être synchronisé
+    fd = os.open(file_path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_backup(file_path, file_type, full=False):
+    """
+    Copie de ce qu'une écriture de tag va écraser dans le fichier.
+
+    Args:
+        full (bool): Copie complète du fichier (réécriture), dans BACKUP_DIR.
+
+    Returns:
+        dict: 'size' (taille du fichier), 'head' et 'tail' (octets du début et de la fin),
+        ou 'backup_file' pour une copie complète.
+    """
+    size = os.path.getsize(file_path)
+    if full:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        backup_file = os.path.join(BACKUP_DIR, uuid.uuid4().hex + '.bak')
+        shutil.copyfile(file_path, backup_file)
+        fsync_file(backup_file)
+        return {'size': size, 'head': None, 'tail': None, 'backup_file': backup_file}
+    head_length = tag_region_size(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(head_length)
+        tail = None
+        if file_type == 'mp3' and size >= head_length + ID3V1_LENGTH:
+            f.seek(size - ID3V1_LENGTH)
+            tail = f.read(ID3V1_LENGTH)
+    return {'size': size, 'head': head, 'tail': tail, 'backup_file': None}
+
+
+def restore_backup(file_path, size, head, tail, backup_file):
+    """
+    Remet un fichier dans son état d'avant l'écriture (voir read_backup).
+    """
+    if backup_file is not None:
+        shutil.copyfile(backup_file, file_path)
+    else:
+        if os.path.getsize(file_path) != size:
+            # Une écriture sur place ne change pas la taille : ce n'est plus le fichier sauvegardé
+            raise OSError(f"taille inattendue, fichier laissé tel quel : {file_path}")
+        with open(file_path, 'r+b') as f:
+            f.write(head)
+            if tail is not None:
+                f.seek(size - ID3V1_LENGTH)
+                f.write(tail)
+    fsync_file(file_path)
+
+
+class WriteJournal:
+    def __init__(self, db_path=JOURNAL_PATH):
+        """
+        Ouvre (et crée si besoin) le journal des écritures. Utilisable depuis plusieurs fils.
+
+        :param db_path: Chemin du fichier SQLite.
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        # Une validation n'est terminée qu'une fois sur le disque
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT,
+                folder TEXT,
+                file_name TEXT,
+                file_type TEXT,
+                size INTEGER,
+                head BLOB,
+                tail BLOB,
+                backup_file TEXT,
+                fields TEXT,
+                has_image INTEGER,
+                image BLOB,
+                image_mime TEXT
+            );
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, entries):
+        """
+        Enregistre un paquet d'écritures à venir, en une seule validation.
+
+        Args:
+            entries (list): Tuples (piste, valeurs à écrire, copie produite par read_backup).
+
+        Returns:
+            list: Identifiants des entrées, dans l'ordre.
+        """
+        ids = []
+        with self.lock, self.connection:
+            for piste, values, backup in entries:
+                fields = {field: values[field] for field in TAG_FIELDS if field in values}
+                image = values.get('Image')
+                cursor = self.connection.execute(
+                    "INSERT INTO entries (file_path, folder, file_name, file_type, size, head, tail, backup_file, "
+                    "fields, has_image, image, image_mime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (piste.old_file_name_with_path, piste.get_folder(), piste.old_file_name, piste.file_type,
+                     backup['size'], backup['head'], backup['tail'], backup['backup_file'], json.dumps(fields),
+                     'Image' in values, image[0] if image else None, image[1] if image else None))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def complete(self, ids):
+        """
+        Retire du journal des écritures terminées (fichiers synchronisés), en une seule validation.
+        """
+        if not ids:
+            return
+        with self.lock:
+            backup_files = [row[0] for row in self.connection.execute(
+                f"SELECT backup_file FROM entries WHERE backup_file IS NOT NULL AND id IN ({', '.join('?' * len(ids))})",
+                ids)]
+            with self.connection:
+                self.connection.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in ids])
+        for backup_file in backup_files:
+            os.remove(backup_file)
+
+    def rollback(self, entry_id):
+        """
+        Remet le fichier d'une entrée dans son état d'avant l'écriture et retire l'entrée.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT file_path, size, head, tail, backup_file FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        restore_backup(*row)
+        self.complete([entry_id])
+
+    def has_pending(self):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is not None
+
+    def recover(self):
+        """
+        Remet dans leur état d'origine les fichiers des écritures inachevées (coupure,
+        plantage) et vide le journal.
+
+        Returns:
+            tuple: (écritures à reprendre : tuples (file_name, folder, file_type, valeurs),
+                erreurs : tuples (file_path, message))
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, file_path, folder, file_name, file_type, fields, has_image, image, image_mime "
+                "FROM entries ORDER BY id").fetchall()
+        to_resume = []
+        errors = []
+        for entry_id, file_path, folder, file_name, file_type, fields, has_image, image, image_mime in rows:
+            try:
+                self.rollback(entry_id)
+            except Exception as e:
+                errors.append((file_path, str(e)))
+                if os.path.exists(file_path):
+                    # Fichier modifié depuis : la copie ne s'applique plus, l'entrée est abandonnée
+                    self.complete([entry_id])
+                # Sinon (partage réseau absent, ...) l'entrée reste pour le prochain démarrage
+                continue
+            values = json.loads(fields)
+            if has_image:
+                values['Image'] = (image, image_mime) if image is not None else None
+            to_resume.append((file_name, folder, file_type, values))
+        return to_resume, errors